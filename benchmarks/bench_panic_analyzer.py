@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for panic_analyzer.py hot paths, run offline against the checked-in market_data/.
+Each case runs in a fresh process and records wall time, peak memory (max RSS) and CSV parses,
+then is compared against a stored baseline JSON. CLI cases count the parses their child process
+reports; a run that exits before reporting (a usage error) has no parse count.
+
+Usage:
+  python benchmarks/bench_panic_analyzer.py                  Run all cases and compare to the baseline
+  python benchmarks/bench_panic_analyzer.py CASE [CASE ...]  Run selected cases
+  python benchmarks/bench_panic_analyzer.py --update-baseline
+
+Options:
+  --baseline FILE     Baseline JSON (default: benchmarks/baseline.json)
+  --tolerance PCT     Allowed slowdown before a case counts as a regression (default: 25);
+                      slowdowns under 1 ms are treated as timer noise
+  --repeat N          Timed repetitions for warm cases; the median is reported (default: 5)
+
+Exits with status 1 when any case regressed in wall time, peak memory or CSV parse count.
+"""
+
+import sys
+import os
+import re
+import json
+import time
+import resource
+import shutil
+import atexit
+import statistics
+import subprocess
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(REPO_ROOT, 'benchmarks', 'baseline.json')
+NOISE_MS = 1.0
+
+sys.path.insert(0, REPO_ROOT)
+
+def _analyzer(cold=False, preload=True):
+    """Quiet analyzer; `cold` gives it a private store with an empty binary cache, so every CSV is parsed"""
+    # panic_analyzer imports these on first use; preloading keeps that out of the timed region
+    if preload:
+        import numpy, pandas
+    from panic_analyzer import PriceStore, VietnamesePanicAnalyzer
+    analyzer = VietnamesePanicAnalyzer()
+    analyzer.renderer = None
+    if cold:
+        cache_directory = tempfile.mkdtemp(prefix='bench_cache_')
+        atexit.register(shutil.rmtree, cache_directory, ignore_errors=True)
+        analyzer.store = PriceStore(analyzer.data_dir, cache_directory=cache_directory)
+    return analyzer
+
+def _warm(analyzer):
+    analyzer.engine
+    return analyzer
+
+class ChildRun:
+    """Outcome of a CLI case: the parse count the child process reported, or None if it printed none"""
+    
+    def __init__(self, csv_parses):
+        self.csv_parses = csv_parses
+
+def _cli(*args, check=True):
+    """Run panic_analyzer.py in a fresh interpreter, as a user would from the shell"""
+    output = subprocess.run([sys.executable, 'panic_analyzer.py', *args], stdout=subprocess.PIPE,
+                            text=True, check=check).stdout
+    reported = re.search(r"CSV files parsed this run: (\d+)", output)
+    return ChildRun(int(reported.group(1)) if reported else None)
+
+# name: (description, setup returning state, timed function of that state, repeat)
+CASES = {
+    'cold_load': (
+        "Parse every core CSV and build the indicator engine (empty binary cache)",
+        lambda: _analyzer(cold=True),
+        lambda analyzer: analyzer.engine,
+        False
+    ),
+    'cached_load': (
+        "Build the indicator engine from the binary price cache",
+        lambda: _analyzer(),
+        lambda analyzer: analyzer.engine,
+        False
+    ),
+    'warm_single_date': (
+        "get_date_data for one date on a warm engine",
+        lambda: _warm(_analyzer()),
+        lambda analyzer: analyzer.get_date_data('2022-05-13'),
+        True
+    ),
+    'warm_year_range': (
+        "analyze_date_range over 2022 on a warm engine",
+        lambda: _warm(_analyzer()),
+        lambda analyzer: analyzer.compute_date_range('2022-01-01', '2022-12-31'),
+        True
+    ),
+    'cycle_scan': (
+        "analyze_complete_cycle over the full history on a warm engine",
+        lambda: _warm(_analyzer()),
+        lambda analyzer: analyzer.compute_complete_cycle('2000-01-01', '2100-01-01'),
+        True
+    ),
+    'warm_pre_panic': (
+        "analyze_pre_panic_pattern for one panic date on a warm engine",
+        lambda: _warm(_analyzer()),
+        lambda analyzer: analyzer.compute_pre_panic_pattern('2022-05-13'),
+        True
+    ),
+    'all_pre_panic': (
+        "analyze_all_pre_panic_patterns over the detected panic days from a cold process",
+        lambda: _analyzer(),
+        lambda analyzer: analyzer.compute_all_pre_panic_patterns(),
+        False
+    ),
+    'panic_detection': (
+        "Detect and cluster panic days over the full history on a warm engine",
+        lambda: _warm(_analyzer()),
+        lambda analyzer: analyzer.compute_panic_days(),
+        True
+    ),
+    'similar_days': (
+        "Top-10 similar days for one date from the feature index on a warm engine",
+        lambda: _warm(_analyzer()),
+        lambda analyzer: analyzer.compute_similar_days('2022-05-13'),
+        True
+    ),
+    'event_study': (
+        "T-20..T+20 event study over the detected panic days on a warm engine",
+        lambda: _warm(_analyzer()),
+        lambda analyzer: analyzer.compute_event_study(),
+        True
+    ),
+    'warning_history_scan': (
+        "Vectorized warning history over the full history on a warm engine",
+        lambda: _warm(_analyzer()),
+        lambda analyzer: analyzer.compute_warning_history(),
+        True
+    ),
+    'backtest_scan': (
+        "Classifier backtest over the full history on a warm engine",
+        lambda: _warm(_analyzer()),
+        lambda analyzer: analyzer.compute_backtest(),
+        True
+    ),
+    'sector_scan': (
+        "Every ticker_group.json sector over the full history from a cold process",
+        lambda: _analyzer(),
+        lambda analyzer: analyzer.compute_sector_indicators(),
+        False
+    ),
+    'breadth_scan': (
+        "Market breadth over every market_data ticker for the full history from a cold process",
+        lambda: _analyzer(),
+        lambda analyzer: analyzer.compute_breadth(),
+        False
+    ),
+    'cli_single_date': (
+        "Cold start: `panic_analyzer.py YYYY-MM-DD` from launch to exit (compact date cache)",
+        lambda: _analyzer(preload=False),
+        lambda analyzer: _cli('2022-05-13'),
+        True
+    ),
+    'cli_usage_error': (
+        "Cold start: `panic_analyzer.py` rejecting a malformed date",
+        lambda: _analyzer(preload=False),
+        lambda analyzer: _cli('2022-13-45', check=False),
+        True
+    )
+}
+
+def run_case(name, repeat):
+    """Run one case in this process and return its measurements"""
+    _, setup, timed, warm = CASES[name]
+    state = setup()
+    store = state.store
+    parses_before = store.parse_count
+    
+    timings = []
+    for _ in range(repeat if warm else 1):
+        started = time.perf_counter()
+        outcome = timed(state)
+        timings.append((time.perf_counter() - started) * 1000)
+    
+    result = {
+        'wall_ms': round(statistics.median(timings), 3),
+        # CLI cases run the work in a child process, so take whichever peak is higher
+        'peak_rss_mb': round(max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                                 resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) / 1024, 1)
+    }
+    # CLI cases parse in the child, so this process's store saw nothing; use what the child reported
+    parses = outcome.csv_parses if isinstance(outcome, ChildRun) else store.parse_count - parses_before
+    if parses is not None:
+        result['csv_parses'] = parses
+    return result
+
+def run_isolated(name, repeat):
+    """Run one case in a fresh interpreter so cold timings and peak memory are not shared"""
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', name, '--repeat', str(repeat)],
+        cwd=REPO_ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def compare(results, baseline, tolerance):
+    """Print each case against the baseline and return the names of regressed cases"""
+    regressions = []
+    print(f"{'case':<22} {'wall ms':>10} {'base ms':>10} {'change':>8} {'RSS MB':>8} {'parses':>7}")
+    print("-" * 70)
+    for name, result in results.items():
+        base = baseline.get(name)
+        parses = result.get('csv_parses', '-')  # not measured for CLI runs that exit before reporting
+        if base is None:
+            print(f"{name:<22} {result['wall_ms']:>10.1f} {'-':>10} {'new':>8} {result['peak_rss_mb']:>8.1f} {parses:>7}")
+            continue
+        
+        change = (result['wall_ms'] - base['wall_ms']) / base['wall_ms'] * 100 if base['wall_ms'] else 0.0
+        regressed = ((change > tolerance and result['wall_ms'] - base['wall_ms'] > NOISE_MS) or
+                     result['peak_rss_mb'] > base['peak_rss_mb'] * (1 + tolerance / 100) or
+                     ('csv_parses' in result and result['csv_parses'] > base.get('csv_parses', result['csv_parses'])))
+        flag = "  ❌ REGRESSION" if regressed else ""
+        print(f"{name:<22} {result['wall_ms']:>10.1f} {base['wall_ms']:>10.1f} {change:>+7.1f}% "
+              f"{result['peak_rss_mb']:>8.1f} {parses:>7}{flag}")
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+def _pop_option(args, name, default=None):
+    if name not in args:
+        return default
+    i = args.index(name)
+    value = args[i + 1]
+    del args[i:i + 2]
+    return value
+
+def main():
+    args = sys.argv[1:]
+    os.chdir(REPO_ROOT)
+    repeat = int(_pop_option(args, '--repeat', '5'))
+    
+    if '--child' in args:
+        name = _pop_option(args, '--child')
+        print(json.dumps(run_case(name, repeat)))
+        return 0
+    
+    baseline_path = _pop_option(args, '--baseline', DEFAULT_BASELINE)
+    tolerance = float(_pop_option(args, '--tolerance', '25'))
+    update = '--update-baseline' in args
+    if update:
+        args.remove('--update-baseline')
+    
+    unknown = [name for name in args if name not in CASES]
+    if unknown:
+        print(f"❌ Error: Unknown benchmark case(s): {', '.join(unknown)} (available: {', '.join(CASES)})")
+        return 2
+    
+    # Bring market_data/.cache up to date so cached cases measure cache reads, not parses
+    subprocess.run([sys.executable, 'panic_analyzer.py', '--refresh'], cwd=REPO_ROOT, capture_output=True, check=True)
+    
+    results = {}
+    for name in args or CASES:
+        print(f"⏱️  {name}: {CASES[name][0]}", file=sys.stderr)
+        results[name] = run_isolated(name, repeat)
+    
+    baseline = {}
+    if os.path.exists(baseline_path):
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+    
+    if update:
+        baseline.update(results)
+        with open(baseline_path, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"💾 Baseline updated: {baseline_path}")
+    
+    regressions = compare(results, baseline, tolerance)
+    if regressions and not update:
+        print(f"\n❌ {len(regressions)} regression(s): {', '.join(regressions)}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
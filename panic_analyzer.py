@@ -9,17 +9,1732 @@ Usage:
   Date range:  python panic_analyzer.py YYYY-MM-DD YYYY-MM-DD
   Cycle analysis: python panic_analyzer.py --cycle YYYY-MM-DD YYYY-MM-DD
   Pre-panic analysis: python panic_analyzer.py --pre-panic YYYY-MM-DD
-  All pre-panic analysis: python panic_analyzer.py --analyze-all-pre-panic
+  Similar days: python panic_analyzer.py --similar YYYY-MM-DD [--top K]
+  All pre-panic analysis: python panic_analyzer.py --analyze-all-pre-panic [--jobs N] [--verified]
+  Panic day detection: python panic_analyzer.py --panic-days [YYYY-MM-DD YYYY-MM-DD] [--output FILE]
+  Warning history: python panic_analyzer.py --warning-history [YYYY-MM-DD YYYY-MM-DD] [--output FILE]
+  Sector indicators: python panic_analyzer.py --sectors [YYYY-MM-DD YYYY-MM-DD] [--output FILE]
+  Market breadth: python panic_analyzer.py --breadth [YYYY-MM-DD YYYY-MM-DD] [--output FILE]
+  Event study: python panic_analyzer.py --event-study [YYYY-MM-DD YYYY-MM-DD] [--panic-type TYPE] [--window N] [--output FILE]
+  Classifier backtest: python panic_analyzer.py --backtest [YYYY-MM-DD YYYY-MM-DD] [--horizon N] [--with-breadth]
+  Panel export: python panic_analyzer.py --export-panel FILE.parquet|FILE.arrow|DIR [YYYY-MM-DD YYYY-MM-DD]
+  Threshold sweep: python panic_analyzer.py --sweep warning|panic [YYYY-MM-DD YYYY-MM-DD] [--grid NAME=V1,V2|START:STOP:STEP ...]
+                   [--level LEVEL] [--rank-by METRIC] [--top N] [--horizon N] [--jobs N] [--output FILE]
+  Query server: python panic_analyzer.py --serve [--host H] [--port N] [--cache-size N]
+  Refresh cache: python panic_analyzer.py --refresh
+
+Options (any mode):
+  --format text|markdown|json   Output format (default: text)
+  --quiet                       Compute only, print nothing
+  --rebalance daily|monthly|quarterly|yearly
+                                Weight sectors by market cap over time (shares x price),
+                                rebalanced on this schedule, instead of the fixed weights
+  --profile [FILE.json]         Time each stage (load, parse, lookup, indicator, classify,
+                                render) and count cache hits; prints a table to stderr at
+                                exit, or writes a Chrome trace JSON to FILE.json.
+                                PANIC_ANALYZER_PROFILE=1 or =FILE.json does the same.
+  --threshold PCT               Panic day detection (--panic-days, --analyze-all-pre-panic):
+                                minimum absolute VNINDEX move (default: 3.0)
+  --direction both|down|up      Count moves either way, or only drops or rallies (default: both)
+  --cluster N                   Panic days within N trading days of the previous one are a
+                                single event, analyzed from its first day (default: 1, 0 = off)
+  --verified                    --analyze-all-pre-panic / --event-study on the hand-labelled panic day list
+  --panic-type TYPE             --event-study on every day classify_panic_type puts in TYPE
+  --window N                    --event-study trading days either side of each event (default: 20)
 """
 
 import sys
 import os
-import pandas as pd
-from datetime import datetime, timedelta
+import json
+import threading
+import time
+import atexit
+import functools
+import importlib
+import math
+import struct
+import warnings
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional
+from datetime import datetime
+
+class _LazyModule:
+    """Stand-in for a heavy module that imports it on first attribute access
+    
+    numpy and pandas are most of the startup time, and neither a usage error nor a single date
+    answered from DateRecordCache needs them. Once loaded, the real module replaces the stand-in.
+    """
+    
+    def __init__(self, name, alias):
+        self._name = name
+        self._alias = alias
+    
+    def __getattr__(self, attr):
+        module = importlib.import_module(self._name)
+        globals()[self._alias] = module
+        return getattr(module, attr)
+
+np = _LazyModule('numpy', 'np')
+pd = _LazyModule('pandas', 'pd')
+
+@functools.lru_cache(maxsize=None)
+def _date_dtype():
+    """Datetime resolution pandas gives the parsed 'time' column, so cached frames match CSV-parsed ones"""
+    return pd.to_datetime(pd.Series(['1970-01-01'])).dtype
+
+class _Stage:
+    """Timer for one profiled stage call; nested stages are subtracted from the parent's self time"""
+    __slots__ = ('profiler', 'name', 'started', 'child_time')
+    
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+    
+    def __enter__(self):
+        self.child_time = 0.0
+        self.profiler._stack().append(self)
+        self.started = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.started
+        stack = self.profiler._stack()
+        stack.pop()
+        if stack:
+            stack[-1].child_time += elapsed
+        self.profiler._record(self.name, self.started, elapsed, elapsed - self.child_time)
+        return False
+
+class _NoStage:
+    """Shared do-nothing context manager handed out while profiling is off"""
+    __slots__ = ()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        return False
+
+class Profiler:
+    """Opt-in per-stage timing and counters, enabled with --profile or PANIC_ANALYZER_PROFILE
+    
+    Code marks stages with `with PROFILER.stage('parse'):` and events with PROFILER.count(name).
+    While disabled both are a single flag check, so instrumentation can stay in hot paths.
+    Work done in forked --jobs workers is not included.
+    """
+    MAX_EVENTS = 100000
+    
+    def __init__(self):
+        self.enabled = False
+        self.stages = {}    # name -> [calls, total s, self s, max s]
+        self.counters = {}
+        self.events = []    # (name, start s, duration s, thread id) for the JSON trace
+        self.dropped_events = 0
+        self._origin = time.perf_counter()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+    
+    def enable(self):
+        self.enabled = True
+        self._origin = time.perf_counter()
+    
+    def stage(self, name):
+        if not self.enabled:
+            return _NO_STAGE
+        return _Stage(self, name)
+    
+    def count(self, name, n=1):
+        if self.enabled:
+            with self._lock:
+                self.counters[name] = self.counters.get(name, 0) + n
+    
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+    
+    def _record(self, name, started, elapsed, self_time):
+        with self._lock:
+            stats = self.stages.get(name)
+            if stats is None:
+                stats = self.stages[name] = [0, 0.0, 0.0, 0.0]
+            stats[0] += 1
+            stats[1] += elapsed
+            stats[2] += self_time
+            stats[3] = max(stats[3], elapsed)
+            if len(self.events) < self.MAX_EVENTS:
+                self.events.append((name, started - self._origin, elapsed, threading.get_ident()))
+            else:
+                self.dropped_events += 1
+    
+    def summary(self):
+        """{'wall_ms', 'stages': {name: {...}}, 'counters': {...}} with times in milliseconds"""
+        return {
+            'wall_ms': round((time.perf_counter() - self._origin) * 1000, 3),
+            'stages': {
+                name: {
+                    'calls': calls,
+                    'total_ms': round(total * 1000, 3),
+                    'self_ms': round(self_time * 1000, 3),
+                    'mean_ms': round(total / calls * 1000, 4),
+                    'max_ms': round(longest * 1000, 3)
+                }
+                for name, (calls, total, self_time, longest) in sorted(self.stages.items(), key=lambda item: -item[1][2])
+            },
+            'counters': dict(sorted(self.counters.items()))
+        }
+    
+    def format_table(self):
+        summary = self.summary()
+        lines = [f"\n⏱️  PROFILE (wall {summary['wall_ms']:.1f} ms)",
+                 f"   {'stage':<22} {'calls':>8} {'total ms':>10} {'self ms':>10} {'mean ms':>10} {'max ms':>10}"]
+        for name, stats in summary['stages'].items():
+            lines.append(f"   {name:<22} {stats['calls']:>8} {stats['total_ms']:>10.2f} {stats['self_ms']:>10.2f} "
+                         f"{stats['mean_ms']:>10.4f} {stats['max_ms']:>10.2f}")
+        if summary['counters']:
+            lines.append(f"   {'counter':<22} {'count':>8}")
+            for name, count in summary['counters'].items():
+                lines.append(f"   {name:<22} {count:>8}")
+        return "\n".join(lines)
+    
+    def trace(self):
+        """Chrome trace-event JSON (chrome://tracing, Perfetto) with the summary alongside"""
+        pid = os.getpid()
+        return {
+            'traceEvents': [
+                {'name': name, 'ph': 'X', 'ts': round(start * 1e6, 1), 'dur': round(duration * 1e6, 1), 'pid': pid, 'tid': tid}
+                for name, start, duration, tid in self.events
+            ],
+            'summary': self.summary(),
+            'droppedEvents': self.dropped_events
+        }
+    
+    def report(self, destination):
+        """Print the summary table to stderr, or write the JSON trace when destination is a .json path"""
+        if destination.endswith('.json'):
+            with open(destination, 'w') as f:
+                json.dump(self.trace(), f)
+            print(f"⏱️  Profile trace written to {destination}", file=sys.stderr)
+        else:
+            print(self.format_table(), file=sys.stderr)
+
+_NO_STAGE = _NoStage()
+PROFILER = Profiler()
+
+def profiled(stage):
+    """Decorator timing every call of a function as a PROFILER stage"""
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.enabled:
+                return function(*args, **kwargs)
+            with PROFILER.stage(stage):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+# Pre-panic warning levels by strength, as ranked by get_strongest_warning
+WARNING_PRIORITY = {
+    'STRONG_WARNING': 4,
+    'MODERATE_WARNING': 3,
+    'EARLY_WARNING': 2,
+    'DEVELOPING_WEAKNESS': 1,
+    'NO_WARNING': 0,
+    'INSUFFICIENT_DATA': -1
+}
+WARNING_LEVELS = {p: w for w, p in WARNING_PRIORITY.items()}
+MISSING = -2  # code for days with no data at all (absent from a pre-panic window)
+
+# Cutoffs used by classify_pre_panic_signal (all in %)
+WARNING_THRESHOLDS = {
+    'strong_rsi': -2.0,             # real estate crashes first...
+    'strong_sector': -1.5,          # ...and securities or banking follow
+    'strong_vnindex': -1.5,
+    'moderate_ssi': -1.5,           # securities weakness...
+    'moderate_bsi': -1.0,           # ...with banking holding
+    'moderate_vnindex': -1.0,
+    'early_sector': -2.0,           # any sector this weak
+    'early_vnindex': -1.0,
+    'developing_vnindex': -1.0,
+    'developing_divergence': 1.0    # gap between sector indicators
+}
+
+# Market breadth cutoffs, used by classify_pre_panic_signal when breadth is given (see market_breadth)
+BREADTH_THRESHOLDS = {
+    'selloff_pct_down': 50.0,       # half the market down 2%+ (market_breadth's default drop)...
+    'selloff_vnindex': -1.0,        # ...on a down day: at least EARLY_WARNING
+    'weak_below_ma20': 80.0         # most tickers under their 20-day average: at least DEVELOPING_WEAKNESS
+}
+
+# Cutoffs used by classify_panic_type (all in %)
+PANIC_THRESHOLDS = {
+    'vnindex': 3.0,                 # |VNINDEX change| that makes a panic day
+    'positive_bsi': -2.0,           # banking stable (above)...
+    'positive_ssi': -3.0,           # ...others oversold (below)
+    'positive_rsi': -4.0,
+    'extreme_bsi': -5.0,
+    'extreme_ssi': -7.0,
+    'extreme_rsi': -8.0,
+    'medium_bsi': -3.0,
+    'medium_ssi': -5.0,
+    'medium_rsi': -6.0
+}
+
+# Default --sweep grids around the cutoffs above (1296 warning and 972 panic combinations)
+SWEEP_GRIDS = {
+    'warning': {
+        'strong_rsi': [-3.0, -2.5, -2.0, -1.5],
+        'strong_vnindex': [-2.0, -1.5, -1.0],
+        'moderate_ssi': [-2.0, -1.5, -1.0],
+        'early_sector': [-3.0, -2.5, -2.0, -1.5],
+        'early_vnindex': [-1.5, -1.0, -0.5],
+        'developing_divergence': [0.5, 1.0, 1.5]
+    },
+    'panic': {
+        'vnindex': [2.0, 2.5, 3.0, 3.5],
+        'positive_bsi': [-3.0, -2.0, -1.0],
+        'medium_bsi': [-4.0, -3.0, -2.0],
+        'medium_ssi': [-6.0, -5.0, -4.0],
+        'medium_rsi': [-7.0, -6.0, -5.0],
+        'extreme_bsi': [-6.0, -5.0, -4.0]
+    }
+}
+
+@profiled('classify')
+def classify_pre_panic_codes(bsi, ssi, rsi, vnindex_drop, thresholds=WARNING_THRESHOLDS,
+                             breadth=None, breadth_thresholds=BREADTH_THRESHOLDS):
+    """Vectorized classify_pre_panic_signal over arrays, returning WARNING_PRIORITY codes
+    
+    Threshold values may themselves be arrays, e.g. shape (combinations, 1) against daily
+    series, to classify many parameter sets in one broadcast. `breadth` maps market_breadth
+    columns (pct_down, pct_below_ma20) to arrays aligned with the series.
+    """
+    t = thresholds
+    with np.errstate(invalid='ignore'):
+        codes = np.select(
+            [
+                np.isnan(bsi) | np.isnan(ssi) | np.isnan(rsi) | np.isnan(vnindex_drop),
+                (rsi <= t['strong_rsi']) & ((ssi <= t['strong_sector']) | (bsi <= t['strong_sector'])) & (vnindex_drop <= t['strong_vnindex']),
+                (ssi <= t['moderate_ssi']) & (bsi >= t['moderate_bsi']) & (vnindex_drop <= t['moderate_vnindex']),
+                (np.minimum(np.minimum(bsi, ssi), rsi) <= t['early_sector']) & (vnindex_drop <= t['early_vnindex']),
+                (vnindex_drop <= t['developing_vnindex']) & ((np.abs(bsi - ssi) >= t['developing_divergence']) | (np.abs(ssi - rsi) >= t['developing_divergence']))
+            ],
+            [-1, 4, 3, 2, 1],
+            default=0
+        )
+        if breadth is None:
+            return codes
+        
+        b = breadth_thresholds
+        selloff = (breadth['pct_down'] >= b['selloff_pct_down']) & (vnindex_drop <= b['selloff_vnindex'])
+        weak = breadth['pct_below_ma20'] >= b['weak_below_ma20']
+        raised = np.maximum(codes, np.select([selloff, weak], [2, 1], default=0))
+        return np.where(codes < 0, codes, raised)
+
+# Hand-labelled panic days from the workbook: the ground truth for --backtest and --sweep.
+# --analyze-all-pre-panic detects panic days from VNINDEX instead (see detect_panic_days).
+VERIFIED_PANIC_DATES = [
+    # 2018 (7 panic days)
+    '2018-02-05', '2018-02-06', '2018-02-09', '2018-04-19', 
+    '2018-05-22', '2018-05-28', '2018-10-11',
+    
+    # 2020 (9 panic days)
+    '2020-01-30', '2020-02-24', '2020-03-09', '2020-03-12',
+    '2020-03-13', '2020-03-19', '2020-03-23', '2020-03-30',
+    '2020-04-21',
+    
+    # 2021 (6 panic days)
+    '2021-01-19', '2021-01-26', '2021-01-28', '2021-02-08',
+    '2021-07-12', '2021-07-19',
+    
+    # 2022 (12 panic days)
+    '2022-04-25', '2022-05-09', '2022-05-12', '2022-05-13',
+    '2022-06-13', '2022-09-26', '2022-10-07', '2022-10-21',
+    '2022-10-24', '2022-11-04', '2022-11-10', '2022-12-06',
+    
+    # 2023 (2 panic days)
+    '2023-08-18', '2023-10-26',
+    
+    # 2024 (1 panic day)
+    '2024-04-15',
+    
+    # 2025 (4 panic days)
+    '2025-04-03', '2025-04-08', '2025-04-09', '2025-07-29'
+]
+
+PANIC_DIRECTIONS = ('both', 'down', 'up')
+
+PANIC_TYPES = ['NO_PANIC', 'UNCLEAR_PATTERN', 'POSITIVE_PANIC', 'NEGATIVE_MEDIUM', 'NEGATIVE_EXTREME']
+
+@profiled('classify')
+def classify_panic_codes(bsi, ssi, rsi, vnindex_drop, thresholds=PANIC_THRESHOLDS):
+    """Vectorized classify_panic_type over arrays, returning indexes into PANIC_TYPES
+    
+    Days without a VNINDEX change are NO_PANIC; missing indicators give UNCLEAR_PATTERN as in the scalar rule.
+    Thresholds broadcast like classify_pre_panic_codes.
+    """
+    t = thresholds
+    with np.errstate(invalid='ignore'):
+        return np.select(
+            [
+                ~(np.abs(vnindex_drop) >= t['vnindex']),
+                (bsi > t['positive_bsi']) & (ssi < t['positive_ssi']) & (rsi < t['positive_rsi']),
+                (bsi < t['extreme_bsi']) & (ssi < t['extreme_ssi']) & (rsi < t['extreme_rsi']),
+                (bsi < t['medium_bsi']) & (ssi < t['medium_ssi']) & (rsi < t['medium_rsi'])
+            ],
+            [0, 2, 4, 3],
+            default=1
+        )
+
+def detect_panic_days(vnindex_change, threshold=PANIC_THRESHOLDS['vnindex'], direction='both', cluster_days=1):
+    """Positions of panic days in a daily VNINDEX change series, grouped into clusters
+    
+    A panic day moves at least `threshold` percent: either way (the classify_panic_type rule),
+    or only 'down' or 'up'. A panic day at most `cluster_days` positions after the previous one
+    joins its cluster, so consecutive panic days are one event; 0 keeps every day on its own.
+    NaN changes are never panic days. Returns (days, onsets): the position of every panic day
+    and, for each, the position of its cluster's first day.
+    """
+    if direction not in PANIC_DIRECTIONS:
+        raise ValueError(f"Unknown panic direction: {direction} (expected: {', '.join(PANIC_DIRECTIONS)})")
+    change = np.asarray(vnindex_change, dtype=float)
+    with np.errstate(invalid='ignore'):
+        if direction == 'down':
+            panic = change <= -threshold
+        elif direction == 'up':
+            panic = change >= threshold
+        else:
+            panic = np.abs(change) >= threshold
+    
+    days = np.flatnonzero(panic)
+    starts = np.ones(len(days), dtype=bool)
+    starts[1:] = np.diff(days) > cluster_days
+    onsets = days[starts][np.cumsum(starts) - 1]
+    return days, onsets
+
+EVENT_WINDOW = 20  # trading days either side of an event day
+
+def event_windows(values, events, before=EVENT_WINDOW, after=EVENT_WINDOW):
+    """Rows events[k] - before .. events[k] + after of a date x series matrix, for every event at once
+    
+    Returns an events x (before + after + 1) x series array gathered with a single fancy index;
+    offsets that fall outside the history are NaN.
+    """
+    rows = np.asarray(events, dtype=np.intp)[:, None] + np.arange(-before, after + 1)
+    windows = values[np.clip(rows, 0, len(values) - 1)]
+    windows[(rows < 0) | (rows >= len(values))] = np.nan
+    return windows
+
+def score_warnings(alarms, panic, horizon, has_data=None):
+    """Score daily warning alarms against panic days along the last axis
+    
+    An alarm on day t is true when a panic falls on t+1..t+horizon. A panic is detected when an
+    alarm fired on one of the `horizon` trading days before it; the earliest such alarm gives its
+    lead time. Leading axes of `alarms` (e.g. one row per parameter set) are scored independently.
+    Negatives (the false-positive-rate denominator) only count days flagged in `has_data`, as the
+    panic classifier's scoring does; by default every day counts.
+    """
+    if horizon < 1:
+        raise ValueError(f"The horizon must be at least 1 trading day, got {horizon}")
+    n = panic.shape[-1]
+    days = np.arange(n)
+    panic_count = np.concatenate([[0], np.cumsum(panic)])
+    upcoming = panic_count[np.minimum(days + horizon, n - 1) + 1] - panic_count[days + 1] > 0
+    
+    # (panic, lag) grid of the days before each panic, farthest first
+    window = np.flatnonzero(panic)[:, None] - np.arange(horizon, 0, -1)
+    fired = alarms[..., np.maximum(window, 0)] & (window >= 0)
+    detected = fired.any(axis=-1)
+    lead = np.where(detected, horizon - fired.argmax(axis=-1), np.nan)
+    
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # all-NaN rows when nothing was detected
+        return {
+            'predictions': alarms.sum(axis=-1),
+            'true_positives': (alarms & upcoming).sum(axis=-1),
+            'false_positives': (alarms & ~upcoming).sum(axis=-1),
+            'negatives': (~upcoming if has_data is None else has_data & ~upcoming).sum(),
+            'detected': detected.sum(axis=-1),
+            'panics': detected.shape[-1],
+            'mean_lead_days': np.nanmean(lead, axis=-1),
+            'median_lead_days': np.nanmedian(lead, axis=-1)
+        }
+
+def sweep_scores(classifier, series, panic, params, horizon=14, level='EARLY_WARNING'):
+    """Backtest scores for a batch of threshold combinations in one broadcast
+    
+    `series` is (bsi, ssi, rsi, vnindex_change) and `params` maps threshold names to equal-length
+    arrays, one entry per combination; thresholds not in `params` keep their defaults. The
+    'warning' classifier scores alarms at `level` or stronger as in compute_backtest; the 'panic'
+    classifier scores typed panics (POSITIVE_PANIC, NEGATIVE_MEDIUM, NEGATIVE_EXTREME) day by day.
+    """
+    bsi, ssi, rsi, vnindex_change = series
+    has_data = ~np.isnan(vnindex_change)
+    combinations = len(next(iter(params.values())))
+    
+    if classifier == 'warning':
+        thresholds = dict(WARNING_THRESHOLDS, **{name: values[:, None] for name, values in params.items()})
+        codes = classify_pre_panic_codes(bsi, ssi, rsi, vnindex_change, thresholds)
+        alarms = np.broadcast_to(has_data & (codes >= WARNING_PRIORITY[level]), (combinations, len(panic)))
+        scores = score_warnings(alarms, panic, horizon, has_data)
+        true_positives, false_positives = scores['true_positives'], scores['false_positives']
+        detected, panics, negatives = scores['detected'], scores['panics'], scores['negatives']
+        lead = scores['mean_lead_days']
+    else:
+        thresholds = dict(PANIC_THRESHOLDS, **{name: values[:, None] for name, values in params.items()})
+        codes = classify_panic_codes(bsi, ssi, rsi, vnindex_change, thresholds)
+        predicted = np.broadcast_to(codes >= PANIC_TYPES.index('POSITIVE_PANIC'), (combinations, len(panic)))
+        true_positives = (predicted & panic).sum(axis=-1)
+        false_positives = (predicted & ~panic).sum(axis=-1)
+        detected, panics, negatives = true_positives, panic.sum(), (has_data & ~panic).sum()
+        lead = np.full(combinations, np.nan)
+    
+    with np.errstate(invalid='ignore', divide='ignore'):
+        precision = true_positives / (true_positives + false_positives)
+        recall = detected / panics if panics else np.full(combinations, np.nan)
+        f1 = 2 * precision * recall / (precision + recall)
+        false_positive_rate = false_positives / negatives if negatives else np.full(combinations, np.nan)
+    
+    return {
+        'predictions': true_positives + false_positives,
+        'true_positives': true_positives,
+        'false_positives': false_positives,
+        'false_negatives': panics - detected,
+        'precision': precision,
+        'recall': recall,
+        'f1': f1,
+        'false_positive_rate': false_positive_rate,
+        'mean_lead_days': lead
+    }
+
+class PriceStore:
+    """In-memory store of parsed market_data CSVs, shared by every analyzer in the process
+    
+    Parsed tickers are also written to a columnar binary cache (one .npy file per column)
+    under ``<data_directory>/.cache``. Later runs memory-map those files instead of parsing
+    the CSV. When a CSV has only had rows appended, just the new tail is parsed and added;
+    any other change to the source CSV rebuilds its entry.
+    """
+    _shared = {}
+    _shared_lock = threading.Lock()
+    
+    CACHE_COLUMNS = {
+        'date': 'int32',  # days since 1970-01-01
+        'open': 'float64',
+        'high': 'float64',
+        'low': 'float64',
+        'close': 'float64',
+        'volume': 'int64'
+    }
+    
+    def __init__(self, data_directory="market_data", cache_directory=None, use_cache=True):
+        self.data_dir = data_directory
+        self.cache_dir = cache_directory or os.path.join(data_directory, '.cache')
+        self.use_cache = use_cache
+        self.frames = {}
+        self.sources = {}  # ticker -> (mtime_ns, size) of the CSV the frame reflects
+        self.parse_count = 0
+        self.cache_reads = 0
+        self.append_count = 0
+        self.appended_rows = 0
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def shared(cls, data_directory="market_data"):
+        """Return the process-wide store for a data directory, creating it on first use"""
+        key = os.path.abspath(data_directory)
+        with cls._shared_lock:
+            store = cls._shared.get(key)
+            if store is None:
+                store = cls._shared[key] = cls(data_directory)
+            return store
+    
+    def get(self, ticker):
+        """Return the DataFrame for a ticker, parsing its CSV only the first time"""
+        frame = self.frames.get(ticker)
+        if frame is not None:
+            PROFILER.count('store.memory_hit')
+            return frame
+        
+        with self._lock, PROFILER.stage('load'):
+            frame = self.frames.get(ticker)
+            if frame is None:
+                frame = self.frames[ticker] = self._load(ticker)
+            return frame
+    
+    def _load(self, ticker):
+        """Load a ticker from the binary cache when it is fresh, otherwise parse and cache it"""
+        csv_path = os.path.join(self.data_dir, f"{ticker}.csv")
+        try:
+            source = os.stat(csv_path)
+        except FileNotFoundError:
+            print(f"⚠️  Warning: {ticker}.csv not found")
+            return pd.DataFrame()
+        
+        self.sources[ticker] = (source.st_mtime_ns, source.st_size)
+        meta = self._read_meta(ticker) if self.use_cache else None
+        if meta is not None:
+            with PROFILER.stage('cache.read'):
+                cached = self._read_cache(ticker, meta)
+            if cached is not None and self._is_fresh(meta, source):
+                self.cache_reads += 1
+                PROFILER.count('store.cache_hit')
+                return cached
+            
+            # Rows appended to the CSV since the cache was written: parse only the new tail
+            if cached is not None:
+                frame = self._append_rows(csv_path, cached, meta['source_size'], source)
+                if frame is not None:
+                    PROFILER.count('store.cache_append')
+                    with PROFILER.stage('cache.write'):
+                        self._write_cache(ticker, frame, source)
+                    return frame
+        
+        PROFILER.count('store.cache_miss')
+        with PROFILER.stage('parse'):
+            frame = self._parse_csv(csv_path)
+        if self.use_cache:
+            with PROFILER.stage('cache.write'):
+                self._write_cache(ticker, frame, source)
+        return frame
+    
+    def refresh(self):
+        """Pick up rows appended to the CSVs of loaded tickers since they were read
+        
+        Returns {ticker: first new date} for every ticker whose data changed. Appended rows are
+        parsed from the previous end of file onwards; a rewritten or truncated CSV is re-parsed
+        in full and reported with None, meaning everything derived from it must be rebuilt.
+        """
+        changed = {}
+        with self._lock:
+            for ticker, frame in list(self.frames.items()):
+                csv_path = os.path.join(self.data_dir, f"{ticker}.csv")
+                known = self.sources.get(ticker)
+                try:
+                    source = os.stat(csv_path)
+                except FileNotFoundError:
+                    continue
+                if known == (source.st_mtime_ns, source.st_size):
+                    continue
+                
+                updated = None
+                if known is not None and not frame.empty:
+                    updated = self._append_rows(csv_path, frame, known[1], source)
+                if updated is None:
+                    updated = self._parse_csv(csv_path)
+                    changed[ticker] = None
+                elif len(updated) > len(frame):
+                    changed[ticker] = updated.index[len(frame)]
+                
+                self.frames[ticker] = updated
+                self.sources[ticker] = (source.st_mtime_ns, source.st_size)
+                if self.use_cache:
+                    self._write_cache(ticker, updated, source)
+        return changed
+    
+    def _append_rows(self, csv_path, frame, offset, source):
+        """Append the rows written after byte `offset` of a CSV to a frame
+        
+        Returns None when the file was not simply appended to (not grown, rewritten mid-line,
+        last known row edited, or new rows not strictly after the last known date), so the
+        caller re-parses it. A rewrite that keeps the size is therefore always a full re-parse.
+        """
+        if source.st_size <= offset or offset == 0 or frame.empty:
+            return None
+        
+        with open(csv_path, 'rb') as f:
+            # The line ending at `offset` must still be the last row we hold
+            start = max(offset - 4096, 0)
+            f.seek(start)
+            prefix = f.read(offset - start)
+            tail = f.read()
+        if not prefix.endswith(b'\n'):
+            return None
+        lines = prefix[:-1].rsplit(b'\n', 1)
+        if len(lines) < 2 and start > 0 or not self._is_last_row(lines[-1], frame):
+            return None
+        
+        # A handful of lines: splitting them directly is far cheaper than a read_csv round trip
+        rows = [line.split(',') for line in tail.decode('utf-8').splitlines() if line.strip()]
+        if not rows:
+            return frame
+        if any(len(row) != 7 for row in rows):
+            return None
+        columns = list(zip(*rows))
+        index = pd.DatetimeIndex(np.array(columns[1], dtype='datetime64[D]').astype(_date_dtype()), name='date')
+        if not index.is_monotonic_increasing or index[0] <= frame.index[-1]:
+            return None
+        
+        new_rows = pd.DataFrame({'ticker': list(columns[0])}, index=index)
+        for name, values in zip(('open', 'high', 'low', 'close'), columns[2:6]):
+            new_rows[name] = np.array(values, dtype=np.float64)
+        new_rows['volume'] = np.array(columns[6], dtype=np.float64).astype(np.int64)
+        
+        self.append_count += 1
+        self.appended_rows += len(new_rows)
+        return pd.concat([frame, new_rows])
+    
+    @staticmethod
+    def _is_last_row(line, frame):
+        """Whether a raw CSV line holds the same date and prices as the frame's last row"""
+        fields = line.decode('utf-8', errors='replace').strip().split(',')
+        if len(fields) != 7:
+            return False
+        try:
+            date = pd.Timestamp(fields[1])
+            values = [float(v) for v in fields[2:7]]
+        except ValueError:
+            return False
+        last = frame.iloc[-1]
+        return (date == frame.index[-1] and
+                np.allclose(values, [last[name] for name in ('open', 'high', 'low', 'close', 'volume')],
+                            rtol=1e-12, atol=0))
+    
+    def _parse_csv(self, csv_path):
+        """Parse a ticker CSV into a date-indexed DataFrame"""
+        with PROFILER.stage('parse.read_csv'):
+            df = pd.read_csv(csv_path)
+        self.parse_count += 1
+        df.columns = ['ticker', 'date', 'open', 'high', 'low', 'close', 'volume']
+        with PROFILER.stage('parse.to_datetime'):
+            df['date'] = pd.to_datetime(df['date'])
+        return df.set_index('date')
+    
+    def _cache_path(self, ticker, name):
+        return os.path.join(self.cache_dir, ticker, name)
+    
+    def _read_meta(self, ticker):
+        """Cache metadata for a ticker, or None if there is no complete entry"""
+        try:
+            with open(self._cache_path(ticker, 'meta.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    @staticmethod
+    def _is_fresh(meta, source):
+        return meta['source_mtime_ns'] == source.st_mtime_ns and meta['source_size'] == source.st_size
+    
+    def _read_cache(self, ticker, meta):
+        """Memory-map a ticker's cached columns, or return None if the entry is unreadable"""
+        try:
+            arrays = {name: np.load(self._cache_path(ticker, f"{name}.npy"), mmap_mode='r')
+                      for name in self.CACHE_COLUMNS}
+        except (OSError, ValueError):
+            return None
+        
+        index = pd.DatetimeIndex(arrays['date'].astype('datetime64[D]').astype(_date_dtype()), name='date')
+        frame = pd.DataFrame({'ticker': [meta['ticker']] * len(index)}, index=index)
+        for name in ('open', 'high', 'low', 'close', 'volume'):
+            frame[name] = arrays[name]
+        return frame
+    
+    def _write_cache(self, ticker, frame, source):
+        """Write a parsed frame to the columnar cache; failures only cost the next run a re-parse"""
+        if frame.empty:
+            return
+        
+        columns = {
+            'date': frame.index.values.astype('datetime64[D]').astype(np.int64),
+            'open': frame['open'].to_numpy(),
+            'high': frame['high'].to_numpy(),
+            'low': frame['low'].to_numpy(),
+            'close': frame['close'].to_numpy(),
+            'volume': frame['volume'].to_numpy()
+        }
+        meta = {
+            'ticker': frame['ticker'].iloc[0],
+            'rows': len(frame),
+            'source_mtime_ns': source.st_mtime_ns,
+            'source_size': source.st_size
+        }
+        
+        try:
+            os.makedirs(os.path.join(self.cache_dir, ticker), exist_ok=True)
+            # meta.json is written last, so an interrupted write leaves no usable entry
+            meta_path = self._cache_path(ticker, 'meta.json')
+            if os.path.exists(meta_path):
+                os.remove(meta_path)
+            for name, dtype in self.CACHE_COLUMNS.items():
+                path = self._cache_path(ticker, f"{name}.npy")
+                tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    np.save(f, columns[name].astype(dtype))
+                os.replace(tmp_path, path)
+            tmp_path = f"{meta_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(meta, f)
+            os.replace(tmp_path, meta_path)
+        except OSError as e:
+            print(f"⚠️  Warning: could not write cache for {ticker}: {e}")
+
+class TradingCalendar:
+    """Trading days taken from VNINDEX, mapping date -> ordinal for constant-time neighbour lookups"""
+    
+    def __init__(self, dates):
+        self.dates = pd.DatetimeIndex(dates)
+        self.labels = self.dates.strftime('%Y-%m-%d').tolist()
+        self._ordinals = {label: i for i, label in enumerate(self.labels)}
+        self._days = self.dates.values.astype('datetime64[D]')
+        self._ticker_positions = {}
+    
+    def __len__(self):
+        return len(self.labels)
+    
+    def ordinal(self, date):
+        """Ordinal of a trading day, or None if the market was closed that day"""
+        if isinstance(date, str):
+            i = self._ordinals.get(date)
+            if i is not None:
+                return i
+        return self._ordinals.get(pd.Timestamp(date).strftime('%Y-%m-%d'))
+    
+    def count_before(self, date):
+        """Number of trading days strictly before a date (its ordinal when it is a trading day)"""
+        i = self.ordinal(date)
+        if i is not None:
+            return i
+        day = np.datetime64(pd.Timestamp(date).date(), 'D')
+        return int(np.searchsorted(self._days, day, side='left'))
+    
+    def shift(self, date, n):
+        """Date label of T-n, the n-th trading day before a date, or None if out of range"""
+        i = self.count_before(date) - n
+        return self.labels[i] if 0 <= i < len(self.labels) else None
+    
+    def previous(self, date):
+        """Previous trading day (T-1) as a date label"""
+        return self.shift(date, 1)
+    
+    def window(self, date, n):
+        """Up to n trading days before a date, most recent first"""
+        end = self.count_before(date)
+        return self.labels[max(0, end - n):end][::-1]
+    
+    def span(self, start_date, end_date):
+        """Ordinals [start, end) of the trading days from start_date to end_date inclusive"""
+        start = self.count_before(start_date)
+        end = self.count_before(end_date) + (self.ordinal(end_date) is not None)
+        return start, max(start, end)
+    
+    def between(self, start_date, end_date):
+        """Trading days from start_date to end_date inclusive, oldest first"""
+        start, end = self.span(start_date, end_date)
+        return self.labels[start:end]
+    
+    def extend(self, dates):
+        """Append trading days that come after the last known one"""
+        dates = pd.DatetimeIndex(dates)
+        start = len(self.labels)
+        self.dates = self.dates.append(dates)
+        self.labels.extend(dates.strftime('%Y-%m-%d'))
+        self._ordinals.update((label, i) for i, label in enumerate(self.labels[start:], start))
+        self._days = self.dates.values.astype('datetime64[D]')
+        self._ticker_positions.clear()
+    
+    def forget_tickers(self, tickers):
+        """Drop cached positions for tickers whose data was reloaded"""
+        for ticker in tickers:
+            self._ticker_positions.pop(ticker, None)
+    
+    def ticker_positions(self, ticker, frame):
+        """Row position of each calendar day in a ticker's frame (-1 where it has no row)"""
+        positions = self._ticker_positions.get(ticker)
+        if positions is None:
+            if frame.empty:
+                positions = np.full(len(self.labels), -1, dtype=np.int64)
+            else:
+                positions = frame.index.get_indexer(self.dates)
+            self._ticker_positions[ticker] = positions
+        return positions
+
+# Rebalance schedules for market-cap weights: pandas period frequency, or None to rebalance daily
+REBALANCE_SCHEDULES = {
+    'daily': None,
+    'monthly': 'M',
+    'quarterly': 'Q',
+    'yearly': 'Y'
+}
+
+def held_market_caps(dates, prev_close, close, shares, rebalance):
+    """Date x ticker market caps (shares x price) as known at each rebalance, held until the next
+    
+    Each row uses prices from before that day: the previous close for 'daily', otherwise the last
+    close of the previous period, so no weight looks ahead. Tickers without a share count or a
+    price yet have a cap of 0 and join the weighting at the first rebalance after they list.
+    """
+    # A day without a row for the ticker has no previous close; its last close before that day stands in
+    last_close = np.where(np.isnan(prev_close), pd.DataFrame(close).ffill().shift(1).to_numpy(), prev_close)
+    caps = last_close * shares
+    
+    freq = REBALANCE_SCHEDULES[rebalance]
+    if freq is not None and len(dates):
+        periods = pd.DatetimeIndex(dates).to_period(freq)
+        rebalances = np.concatenate([[True], periods[1:] != periods[:-1]])
+        caps = pd.DataFrame(np.where(rebalances[:, None], caps, np.nan)).ffill().to_numpy()
+    return np.nan_to_num(caps, nan=0.0)
+
+class SectorIndicatorEngine:
+    """Aligned date x ticker price matrix with daily changes and sector indicators for the full history"""
+    
+    def __init__(self, store, calendar, sector_weights, base_ticker='VNINDEX', shares=None, rebalance=None):
+        self.store = store
+        self.calendar = calendar
+        self.sector_weights = sector_weights
+        self.base_ticker = base_ticker
+        
+        # With a rebalance schedule, weights follow market caps over time instead of sector_weights
+        self.rebalance = rebalance
+        self.shares = shares or {}
+        # A ticker may belong to several sectors but gets a single column
+        self.tickers = list(dict.fromkeys([base_ticker] + [t for weights in sector_weights.values() for t in weights]))
+        self.columns = {ticker: j for j, ticker in enumerate(self.tickers)}
+        
+        empty = (0, len(self.tickers))
+        self.prev_close = np.empty(empty)
+        self.close = np.empty(empty)
+        self.high = np.empty(empty)
+        self.low = np.empty(empty)
+        self.volume = np.empty(empty, dtype=np.int64)
+        self.valid = np.empty(empty, dtype=bool)
+        self.change = np.empty(empty)
+        self.intraday_drop = np.empty(empty)
+        self.market_caps = None
+        self.indicators = None
+        self._risk = None
+        
+        self._fill_rows(0)
+    
+    def extend(self, start):
+        """Recompute rows from calendar ordinal `start` onwards after the calendar or store grew
+        
+        Rows before `start` are kept as they are, so appending a trading day only costs that day.
+        """
+        self._fill_rows(min(start, len(self.valid)))
+    
+    @profiled('indicator')
+    def _fill_rows(self, start):
+        """(Re)build matrix rows start..end of calendar; earlier rows are kept"""
+        n = len(self.calendar)
+        self.dates = self.calendar.dates
+        
+        def grown(array, fill):
+            resized = np.full((n, len(self.tickers)), fill, dtype=array.dtype)
+            resized[:start] = array[:start]
+            return resized
+        
+        self.prev_close = grown(self.prev_close, np.nan)
+        self.close = grown(self.close, np.nan)
+        self.high = grown(self.high, np.nan)
+        self.low = grown(self.low, np.nan)
+        self.volume = grown(self.volume, 0)
+        self.valid = grown(self.valid, False)
+        
+        for j, ticker in enumerate(self.tickers):
+            data = self.store.get(ticker)
+            if data.empty:
+                continue
+            
+            # Previous trading day is the ticker's own previous row, as in get_price_change
+            positions = self.calendar.ticker_positions(ticker, data)[start:]
+            has_row = np.zeros(n, dtype=bool)
+            has_row[start:] = positions >= 0
+            rows = positions[positions >= 0]
+            close = data['close'].to_numpy()
+            
+            self.close[has_row, j] = close[rows]
+            self.high[has_row, j] = data['high'].to_numpy()[rows]
+            self.low[has_row, j] = data['low'].to_numpy()[rows]
+            self.volume[has_row, j] = data['volume'].to_numpy()[rows]
+            self.prev_close[has_row, j] = np.where(rows > 0, close[rows - 1], np.nan)
+            self.valid[has_row, j] = rows > 0
+        
+        # Daily change and worst intraday drop for every ticker at once
+        prev_close = self.prev_close[start:]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.change = np.concatenate([self.change[:start], (self.close[start:] - prev_close) / prev_close * 100])
+            self.intraday_drop = np.concatenate([self.intraday_drop[:start], (self.low[start:] - prev_close) / prev_close * 100])
+        
+        # Held caps only depend on earlier prices, so rebuilding them leaves rows before `start` unchanged
+        if self.rebalance is not None:
+            shares = np.array([self.shares.get(t, np.nan) for t in self.tickers])
+            self.market_caps = held_market_caps(self.dates, self.prev_close, self.close, shares, self.rebalance)
+        
+        indicators = self._compute_indicators(start)
+        self.indicators = indicators if start == 0 else pd.concat([self.indicators.iloc[:start], indicators])
+        self._risk = None
+    
+    def _compute_indicators(self, start=0):
+        """Weighted sector indicators for every date from `start` in one pass over the change matrix"""
+        change = self.change[start:]
+        valid = self.valid[start:]
+        indicators = pd.DataFrame(index=self.dates[start:])
+        
+        for name, weights in self.sector_weights.items():
+            if self.rebalance is not None:
+                # Per-day dot product of returns with that day's cap weights
+                columns = [self.columns[t] for t in weights]
+                day_weights = self.weight_array(name)[start:]
+                sector_valid = valid[:, columns]
+                weighted_performance = np.einsum('ij,ij->i', np.where(sector_valid, change[:, columns], 0.0), day_weights)
+                total_weight = np.einsum('ij,ij->i', sector_valid.astype(float), day_weights)
+            else:
+                weighted_performance = np.zeros(len(change))
+                total_weight = np.zeros(len(change))
+                
+                # Accumulate in weight order so results match calculate_sector_indicator exactly
+                for ticker, weight in weights.items():
+                    j = self.columns[ticker]
+                    weighted_performance += np.where(valid[:, j], change[:, j] * weight, 0.0)
+                    total_weight += np.where(valid[:, j], weight, 0.0)
+            
+            with np.errstate(invalid='ignore', divide='ignore'):
+                indicators[name] = np.where(total_weight > 0, weighted_performance / total_weight, np.nan)
+            indicators[f"{name}_count"] = valid[:, [self.columns[t] for t in weights]].sum(axis=1)
+        
+        return indicators
+    
+    def weight_array(self, name):
+        """Date x ticker weights of a sector, in sector_weights order; each row sums to 1 (or 0)
+        
+        Fixed weights repeat the sector_weights row; with a rebalance schedule they are the held
+        market caps normalized within the sector.
+        """
+        weights = self.sector_weights[name]
+        if self.rebalance is None:
+            return np.tile(np.array(list(weights.values())), (len(self.dates), 1))
+        
+        caps = self.market_caps[:, [self.columns[t] for t in weights]]
+        total = caps.sum(axis=1, keepdims=True)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(total > 0, caps / total, 0.0)
+    
+    def weights_on(self, i):
+        """{sector: {ticker: weight}} in effect on a matrix row"""
+        if self.rebalance is None:
+            return self.sector_weights
+        return {name: dict(zip(weights, self.weight_array(name)[i].tolist()))
+                for name, weights in self.sector_weights.items()}
+    
+    def row(self, target_date):
+        """Row position of a date in the matrix, or None if it is not a trading day"""
+        return self.calendar.ordinal(target_date)
+    
+    def ticker_data(self, i, ticker):
+        """Per-ticker TickerChange for a matrix row, as get_price_change computes it"""
+        j = self.columns[ticker]
+        if not self.valid[i, j]:
+            return None
+        
+        return TickerChange(
+            prev_close=self.prev_close[i, j],
+            target_close=self.close[i, j],
+            target_low=self.low[i, j],
+            change=self.change[i, j],
+            intraday_drop=self.intraday_drop[i, j],
+            volume=int(self.volume[i, j])
+        )
+    
+    def indicator(self, i, name):
+        """Sector indicator value for a matrix row, or None if no ticker had data"""
+        value = self.indicators[name].iat[i]
+        return None if np.isnan(value) else float(value)
+    
+    def risk_features(self):
+        """({field: date x ticker}, {field: date x sector}) rolling risk features, computed on first use
+        
+        Sector columns follow sector_weights order and are measured on the indicator series.
+        """
+        if self._risk is None:
+            with np.errstate(invalid='ignore'):
+                change = np.where(self.valid & np.isfinite(self.change), self.change, np.nan)
+            tickers = rolling_risk_features(change, self.close, self.high, self.low, self.prev_close)
+            sectors = rolling_risk_features(self.indicators[list(self.sector_weights)].to_numpy(dtype=np.float64))
+            
+            # Also as date x series x field blocks, so a lookup reads one contiguous row
+            blocks = tuple(np.stack([features[field] for field in RISK_FIELDS], axis=2).astype(np.float64)
+                           for features in (tickers, sectors))
+            self._risk = (tickers, sectors, blocks)
+        return self._risk[:2]
+    
+    def risk(self, i, names):
+        """{name: RiskFeatures} for tickers and sector indicators on a matrix row"""
+        self.risk_features()
+        ticker_rows, sector_rows = (block[i].tolist() for block in self._risk[2])
+        sectors = list(self.sector_weights)
+        return {name: RiskFeatures.from_values(*(sector_rows[sectors.index(name)] if name in self.sector_weights
+                                                 else ticker_rows[self.columns[name]]))
+                for name in names}
+
+class GroupIndicatorEngine(SectorIndicatorEngine):
+    """SectorIndicatorEngine for many sectors at once, computed as a weight matrix x returns matrix product
+    
+    Sums run through a matrix product rather than in weight order, so values can differ from
+    calculate_sector_indicator in the last bits; the core bsi/ssi/rsi series keep the exact engine.
+    A change that is not finite (a zero previous close in the source data) counts as a day
+    without data, since in a matrix product it would turn every sector's value into NaN.
+    """
+    
+    def weight_matrix(self):
+        """Sector names and the (tickers x sectors) weight matrix"""
+        names = list(self.sector_weights)
+        weights = np.zeros((len(self.tickers), len(names)))
+        for k, name in enumerate(names):
+            for ticker, weight in self.sector_weights[name].items():
+                weights[self.columns[ticker], k] = weight
+        return names, weights
+    
+    def _compute_indicators(self, start=0):
+        names, weights = self.weight_matrix()
+        valid = self.valid[start:] & np.isfinite(self.change[start:])
+        returns = np.where(valid, self.change[start:], 0.0)
+        
+        # Cap weighting: a ticker's weight within any sector is proportional to its cap, so
+        # scaling the returns by the day's caps keeps this a single product with 0/1 membership
+        if self.rebalance is not None:
+            caps = self.market_caps[start:]
+            weights = (weights > 0).astype(float)
+            returns = returns * caps
+            valid = valid * caps
+        
+        weighted_performance = returns @ weights
+        total_weight = valid.astype(float) @ weights
+        counts = (valid != 0).astype(np.int64) @ (weights > 0).astype(np.int64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            values = np.where(total_weight > 0, weighted_performance / total_weight, np.nan)
+        
+        index = self.dates[start:]
+        return pd.concat([
+            pd.DataFrame(values, index=index, columns=names),
+            pd.DataFrame(counts, index=index, columns=[f"{name}_count" for name in names])
+        ], axis=1)
+
+# Lookback of the rolling risk features (trading days)
+RISK_WINDOWS = {
+    'volatility': 20,
+    'atr': 14
+}
+RISK_FIELDS = ('volatility', 'atr', 'drawdown', 'down_streak')
+
+@profiled('indicator')
+def rolling_risk_features(change, close=None, high=None, low=None, prev_close=None):
+    """Rolling risk features of date x series matrices, each a single pass over the history
+    
+    `change` holds daily % changes, NaN where a series has no value. With price matrices the
+    drawdown is measured on the closes and the average true range is added; without them (the
+    sector indicators) drawdown is measured on a level compounded from `change` and ATR is NaN.
+    Returns {RISK_FIELDS name: matrix}:
+      volatility   standard deviation of daily % changes over RISK_WINDOWS['volatility'] days
+      atr          Wilder average true range over RISK_WINDOWS['atr'] days, in price units
+      drawdown     % below the running peak (0 at a new high)
+      down_streak  consecutive down days up to and including each day; a day without data ends it
+    """
+    window = RISK_WINDOWS['volatility']
+    volatility = pd.DataFrame(change).rolling(window, min_periods=window).std().to_numpy()
+    
+    if close is None:
+        atr = np.full(change.shape, np.nan)
+        level = np.cumprod(1 + np.nan_to_num(change) / 100, axis=0)
+        level[np.isnan(change)] = np.nan
+    else:
+        with np.errstate(invalid='ignore'):
+            true_range = np.fmax(high, prev_close) - np.fmin(low, prev_close)
+        true_range[np.isnan(change)] = np.nan
+        period = RISK_WINDOWS['atr']
+        atr = pd.DataFrame(true_range).ewm(alpha=1 / period, adjust=False, min_periods=period,
+                                           ignore_na=True).mean().to_numpy()
+        atr = np.where(np.isnan(change), np.nan, atr)
+        level = close
+    
+    with np.errstate(invalid='ignore'):
+        drawdown = (level / np.fmax.accumulate(level, axis=0) - 1) * 100
+        down = change < 0
+    
+    # Down days so far minus those counted at the last day that was not one
+    seen = np.cumsum(down, axis=0)
+    down_streak = seen - np.maximum.accumulate(np.where(down, 0, seen), axis=0)
+    return {'volatility': volatility, 'atr': atr, 'drawdown': drawdown, 'down_streak': down_streak}
+
+class DateRecordCache:
+    """Compact snapshot of a SectorIndicatorEngine, read one trading day at a time without pandas
+    
+    ``<cache_directory>/dates.bin`` holds one fixed-size row of little-endian doubles per trading
+    day: the TickerChange fields and RiskFeatures of every engine ticker (TickerChange fields all
+    NaN where it has no valid row), then each sector indicator with its RiskFeatures.
+    ``dates.json`` describes the rows and records the sector weights and CSV fingerprints they
+    were built from, so a changed CSV or weight invalidates it.
+    """
+    FIELDS = ('prev_close', 'target_close', 'target_low', 'change', 'intraday_drop', 'volume')
+    SECTOR_FIELDS = ('indicator',)
+    
+    def __init__(self, data_directory="market_data", cache_directory=None):
+        self.data_dir = data_directory
+        cache_directory = cache_directory or os.path.join(data_directory, '.cache')
+        self.header_path = os.path.join(cache_directory, 'dates.json')
+        self.rows_path = os.path.join(cache_directory, 'dates.bin')
+        self.header = None
+        self._ordinals = None
+        self._row = None
+    
+    @staticmethod
+    def _weights(sector_weights):
+        # Pairs rather than a dict: weight order decides the summation order of the indicators
+        return {name: [[ticker, weight] for ticker, weight in weights.items()]
+                for name, weights in sector_weights.items()}
+    
+    def load(self, sector_weights):
+        """Open the cache if it is complete, built with these weights and newer than every CSV"""
+        try:
+            with open(self.header_path) as f:
+                header = json.load(f)
+            size = os.path.getsize(self.rows_path)
+        except (OSError, ValueError):
+            return False
+        
+        if (header.get('fields') != list(self.FIELDS + RISK_FIELDS) or
+                header.get('weights') != self._weights(sector_weights)):
+            return False
+        for ticker, fingerprint in header['sources'].items():
+            try:
+                source = os.stat(os.path.join(self.data_dir, f"{ticker}.csv"))
+            except OSError:
+                return False
+            if [source.st_mtime_ns, source.st_size] != fingerprint:
+                return False
+        
+        width = len(self.FIELDS + RISK_FIELDS)
+        sector_width = len(self.SECTOR_FIELDS + RISK_FIELDS)
+        row = struct.Struct(f"<{len(header['tickers']) * width + len(header['weights']) * sector_width}d")
+        if size != row.size * len(header['dates']):
+            return False
+        
+        self.header = header
+        self._ordinals = {label: i for i, label in enumerate(header['dates'])}
+        self._row = row
+        return True
+    
+    def ordinal(self, target_date):
+        """Row of a date: None when the market was closed, KeyError when the date is not YYYY-MM-DD"""
+        i = self._ordinals.get(target_date)
+        if i is None:
+            try:
+                target_date = datetime.strptime(target_date, '%Y-%m-%d').strftime('%Y-%m-%d')
+            except (TypeError, ValueError):
+                raise KeyError(target_date)
+            i = self._ordinals.get(target_date)
+        return i
+    
+    def read(self, i):
+        """({ticker: TickerChange}, {sector: indicator or None}, {ticker or sector: RiskFeatures}) for row i"""
+        with open(self.rows_path, 'rb') as f:
+            f.seek(i * self._row.size)
+            values = self._row.unpack(f.read(self._row.size))
+        
+        changes = {}
+        risk = {}
+        width = len(self.FIELDS + RISK_FIELDS)
+        for j, ticker in enumerate(self.header['tickers']):
+            fields = values[j * width:(j + 1) * width]
+            if not math.isnan(fields[len(self.FIELDS) - 1]):  # volume is NaN only where the ticker has no valid row
+                changes[ticker] = TickerChange(*fields[:len(self.FIELDS) - 1], volume=int(fields[len(self.FIELDS) - 1]))
+            risk[ticker] = RiskFeatures.from_values(*fields[len(self.FIELDS):])
+        
+        indicators = {}
+        offset = len(self.header['tickers']) * width
+        sector_width = len(self.SECTOR_FIELDS + RISK_FIELDS)
+        for k, name in enumerate(self.header['weights']):
+            fields = values[offset + k * sector_width:offset + (k + 1) * sector_width]
+            indicators[name] = None if math.isnan(fields[0]) else fields[0]
+            risk[name] = RiskFeatures.from_values(*fields[1:])
+        return changes, indicators, risk
+    
+    def write(self, engine, sources):
+        """Snapshot an engine built from CSVs with the given {ticker: (mtime_ns, size)}; failures only cost speed"""
+        # Without a fingerprint for every ticker, a later change to the CSV would go unnoticed
+        if any(ticker not in sources for ticker in engine.tickers):
+            return
+        
+        n = len(engine.dates)
+        fields = np.stack([engine.prev_close, engine.close, engine.low, engine.change,
+                           engine.intraday_drop, engine.volume.astype(np.float64)], axis=2)
+        fields[~engine.valid] = np.nan
+        ticker_risk, sector_risk = engine.risk_features()
+        tickers = np.concatenate([fields, np.stack([ticker_risk[f] for f in RISK_FIELDS], axis=2)], axis=2)
+        indicators = engine.indicators[list(engine.sector_weights)].to_numpy(dtype=np.float64)
+        sectors = np.stack([indicators] + [sector_risk[f] for f in RISK_FIELDS], axis=2)
+        rows = np.concatenate([tickers.reshape(n, -1), sectors.reshape(n, -1)], axis=1).astype('<f8')
+        header = {
+            'dates': engine.calendar.labels[:n],
+            'fields': list(self.FIELDS + RISK_FIELDS),
+            'tickers': engine.tickers,
+            'weights': self._weights(engine.sector_weights),
+            'sources': {ticker: list(sources[ticker]) for ticker in engine.tickers}
+        }
+        
+        try:
+            os.makedirs(os.path.dirname(self.header_path), exist_ok=True)
+            # dates.json is written last, so an interrupted write leaves no usable cache
+            if os.path.exists(self.header_path):
+                os.remove(self.header_path)
+            tmp_path = f"{self.rows_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(rows.tobytes())
+            os.replace(tmp_path, self.rows_path)
+            tmp_path = f"{self.header_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(header, f)
+            os.replace(tmp_path, self.header_path)
+        except OSError as e:
+            print(f"⚠️  Warning: could not write date cache: {e}")
+
+# Moving averages and lookback behind the market_breadth columns (trading days)
+BREADTH_MA_WINDOWS = (20, 50)
+BREADTH_LOW_WINDOW = 250  # about 52 weeks
+
+@profiled('indicator')
+def market_breadth(close, low, change, valid, drop=-2.0):
+    """Daily market breadth over dense date x ticker matrices, for every ticker at once
+    
+    Only tickers that traded on a day (a valid, finite change) count towards it. Percentages are
+    of the tickers eligible for the measure that day: traded, and for the moving averages and
+    lows also with enough history. Where a ticker has no row, the last close and low carry
+    forward, so a suspension does not blank its averages for a whole window.
+    Returns {column: array}: advances, declines, unchanged, traded, pct_down (change <= `drop`),
+    pct_below_ma20 / pct_below_ma50, new_52w_lows (low under the previous 250 days' lows) and
+    pct_new_52w_lows; percentages are NaN on days with no eligible ticker.
+    """
+    traded = valid & np.isfinite(change)
+    count = traded.sum(axis=1)
+    
+    def pct(mask, eligible):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(eligible > 0, mask.sum(axis=1) * 100.0 / eligible, np.nan)
+    
+    with np.errstate(invalid='ignore'):
+        breadth = {
+            'advances': (traded & (change > 0)).sum(axis=1),
+            'declines': (traded & (change < 0)).sum(axis=1),
+            'unchanged': (traded & (change == 0)).sum(axis=1),
+            'traded': count,
+            'pct_down': pct(traded & (change <= drop), count)
+        }
+        
+        filled_close = pd.DataFrame(close).ffill()
+        for window in BREADTH_MA_WINDOWS:
+            average = filled_close.rolling(window, min_periods=window).mean().to_numpy()
+            eligible = traded & ~np.isnan(average)
+            breadth[f"pct_below_ma{window}"] = pct(eligible & (close < average), eligible.sum(axis=1))
+        
+        prior_low = pd.DataFrame(low).ffill().rolling(BREADTH_LOW_WINDOW, min_periods=BREADTH_LOW_WINDOW).min().shift(1).to_numpy()
+        eligible = traded & ~np.isnan(prior_low)
+        new_lows = eligible & (low < prior_low)
+    breadth['new_52w_lows'] = new_lows.sum(axis=1)
+    breadth['pct_new_52w_lows'] = pct(new_lows, eligible.sum(axis=1))
+    return breadth
+
+SIMILARITY_FEATURES = ('vnindex_change', 'bsi', 'ssi', 'rsi', 'intraday_drop', 'volume_ratio')
+FORWARD_HORIZONS = (1, 5, 20)  # trading days
+VOLUME_RATIO_WINDOW = 20
+
+class SimilarDayIndex:
+    """Normalized feature matrix over every trading day of a SectorIndicatorEngine, for nearest-day search
+    
+    Features (SIMILARITY_FEATURES) are the VNINDEX change and intraday drop, the bsi/ssi/rsi
+    indicators and VNINDEX volume over its average of the previous VOLUME_RATIO_WINDOW days. Each
+    is z-scored over the whole history, so a query is one distance pass over a (days x features)
+    matrix; at a few thousand days that is faster than building and walking a tree. VNINDEX
+    returns over the next FORWARD_HORIZONS trading days are kept alongside, NaN past the data.
+    """
+    
+    def __init__(self, engine):
+        self.engine = engine
+        self.features = np.empty((0, len(SIMILARITY_FEATURES)))
+        self.forward = np.empty((0, len(FORWARD_HORIZONS)))
+        self.extend(0)
+    
+    @profiled('indicator')
+    def extend(self, start):
+        """Recompute rows from matrix row `start` onwards after the engine grew
+        
+        Earlier rows are kept, except the last max(FORWARD_HORIZONS) whose forward returns can
+        now reach the new days; the z-scores are then refreshed in one pass over the matrix.
+        """
+        engine = self.engine
+        n = len(engine.dates)
+        start = max(min(start, len(self.features)) - max(FORWARD_HORIZONS), 0)
+        j = engine.columns[engine.base_ticker]
+        
+        # Volume averages need the window before `start` as well
+        first = max(start - VOLUME_RATIO_WINDOW, 0)
+        valid = engine.valid[first:, j]
+        volume = pd.Series(np.where(valid, engine.volume[first:, j], np.nan))
+        average = volume.rolling(VOLUME_RATIO_WINDOW, min_periods=VOLUME_RATIO_WINDOW).mean().shift(1).to_numpy()
+        
+        with np.errstate(invalid='ignore', divide='ignore'):
+            columns = {
+                'vnindex_change': np.where(valid, engine.change[first:, j], np.nan),
+                'bsi': engine.indicators['bsi'].to_numpy()[first:],
+                'ssi': engine.indicators['ssi'].to_numpy()[first:],
+                'rsi': engine.indicators['rsi'].to_numpy()[first:],
+                'intraday_drop': np.where(valid, engine.intraday_drop[first:, j], np.nan),
+                'volume_ratio': np.where(average > 0, volume.to_numpy() / average, np.nan)
+            }
+            features = np.column_stack([columns[name] for name in SIMILARITY_FEATURES])[start - first:]
+            
+            close = engine.close[:, j]
+            forward = np.full((n - start, len(FORWARD_HORIZONS)), np.nan)
+            for k, horizon in enumerate(FORWARD_HORIZONS):
+                ahead = close[start + horizon:]
+                forward[:len(ahead), k] = (ahead / close[start:start + len(ahead)] - 1) * 100
+        
+        self.features = np.concatenate([self.features[:start], features])
+        self.forward = np.concatenate([self.forward[:start], forward])
+        self.complete = ~np.isnan(self.features).any(axis=1)
+        
+        reference = self.features[self.complete]
+        self.mean = reference.mean(axis=0)
+        self.scale = reference.std(axis=0)
+        self.scale[self.scale == 0] = 1.0
+        self.scaled = (self.features - self.mean) / self.scale
+    
+    def query(self, i, k=10, min_gap=FORWARD_HORIZONS[-1]):
+        """(rows, distances) of the `k` days nearest to matrix row `i`, closest first
+        
+        Candidates are earlier days with complete features whose returns over the next `min_gap`
+        trading days were already known on day `i`, so analogues never overlap the query's own
+        aftermath. Returns None if day `i` itself lacks a feature.
+        """
+        if not self.complete[i]:
+            return None
+        
+        candidates = max(i - max(min_gap, 1) + 1, 0)
+        differences = self.scaled[:candidates] - self.scaled[i]
+        distances = np.sqrt(np.einsum('ij,ij->i', differences, differences))
+        distances[~self.complete[:candidates]] = np.inf
+        
+        k = min(k, int(self.complete[:candidates].sum()))
+        if k <= 0:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+        rows = np.argpartition(distances, k - 1)[:k]
+        rows = rows[np.argsort(distances[rows], kind='stable')]
+        return rows, distances[rows]
+
+def load_market_caps(market_cap_file="stock_market_cap.csv"):
+    """{ticker: market cap} from TICKER,CAP rows"""
+    market_caps = {}
+    with open(market_cap_file) as f:
+        for line in f:
+            fields = line.strip().split(',')
+            if len(fields) == 2:
+                try:
+                    market_caps[fields[0]] = float(fields[1])
+                except ValueError:
+                    continue  # header or malformed row
+    return market_caps
+
+def estimate_shares(store, market_caps):
+    """Share counts implied by the market cap snapshot and each ticker's latest close
+    
+    Closes are split-adjusted, so shares x historical close approximates historical caps with the
+    current share count; issuance since then is not modelled.
+    """
+    shares = {}
+    for ticker, cap in market_caps.items():
+        data = store.get(ticker)
+        if not data.empty and cap > 0 and data['close'].iat[-1] > 0:
+            shares[ticker] = cap / data['close'].iat[-1]
+    return shares
+
+def load_sector_weights(group_file="ticker_group.json", market_cap_file="stock_market_cap.csv"):
+    """Market-cap weights for every sector in ticker_group.json
+    
+    Weights are each ticker's share of its sector's total market cap from stock_market_cap.csv
+    (TICKER,CAP rows). Tickers without a market cap are left out, as are sectors with none.
+    """
+    with open(group_file) as f:
+        groups = json.load(f)
+    
+    market_caps = load_market_caps(market_cap_file)
+    
+    sector_weights = {}
+    for name, tickers in groups.items():
+        caps = {t: market_caps[t] for t in dict.fromkeys(tickers) if market_caps.get(t, 0) > 0}
+        total = sum(caps.values())
+        if total > 0:
+            sector_weights[name] = {t: cap / total for t, cap in caps.items()}
+    return sector_weights
+
+def write_panel(panel, path):
+    """Write a date-indexed panel to Parquet or Arrow IPC, one row group / record batch per year
+    
+    The format follows the extension: .parquet for a single Parquet file, .arrow/.feather/.ipc for
+    an Arrow IPC file (memory-mappable for zero-copy reads), and no extension for a directory
+    dataset partitioned as year=YYYY/. Needs pyarrow, which is only imported here.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Panel export needs pyarrow: pip install pyarrow") from None
+    
+    table = pa.Table.from_pandas(panel.reset_index(), preserve_index=False)
+    years = panel['year'].to_numpy()
+    bounds = np.flatnonzero(np.diff(years)) + 1
+    slices = [table.slice(start, stop - start)
+              for start, stop in zip(np.concatenate([[0], bounds]), np.concatenate([bounds, [len(years)]]))]
+    
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.parquet':
+        with pq.ParquetWriter(path, table.schema, compression='zstd') as writer:
+            for year_table in slices:
+                writer.write_table(year_table, row_group_size=len(year_table) or None)
+    elif extension in ('.arrow', '.feather', '.ipc'):
+        with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            for year_table in slices:
+                writer.write_table(year_table, max_chunksize=len(year_table) or None)
+    elif extension == '':
+        pq.write_to_dataset(table, path, partition_cols=['year'], compression='zstd',
+                            existing_data_behavior='delete_matching')
+    else:
+        raise ValueError(f"Unknown panel format: {extension} (expected .parquet, .arrow, .feather, .ipc or a directory)")
+
+class ResultRecord:
+    """Dict-style access and JSON conversion shared by the analysis result types"""
+    __slots__ = ()
+    
+    def __getitem__(self, key):
+        return getattr(self, key)
+    
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+    
+    def to_dict(self):
+        return asdict(self)
+
+@dataclass(slots=True)
+class TickerChange(ResultRecord):
+    """One ticker's move on a date versus its previous trading day"""
+    prev_close: float
+    target_close: float
+    target_low: float
+    change: float
+    intraday_drop: float
+    volume: int
+
+@dataclass(slots=True)
+class RiskFeatures(ResultRecord):
+    """Rolling risk context of a ticker or sector indicator on one day (see rolling_risk_features)"""
+    volatility: Optional[float]
+    atr: Optional[float]
+    drawdown: Optional[float]
+    down_streak: int
+    
+    @classmethod
+    def from_values(cls, volatility, atr, drawdown, down_streak):
+        """From raw float feature values, NaN becoming None"""
+        return cls(None if volatility != volatility else volatility, None if atr != atr else atr,
+                   None if drawdown != drawdown else drawdown, int(down_streak))
+
+@dataclass(slots=True)
+class DateAnalysis(ResultRecord):
+    """VNINDEX move, sector indicators and panic classification for one trading day"""
+    date: str
+    vnindex_change: float
+    vnindex_data: TickerChange
+    bsi: Optional[float]
+    ssi: Optional[float]
+    rsi: Optional[float]
+    panic_type: str
+    all_data: Dict[str, TickerChange]
+    banking_valid: List[str]
+    securities_valid: List[str]
+    realestate_valid: List[str]
+    risk: Dict[str, RiskFeatures]  # by ticker (those in all_data) and by 'bsi'/'ssi'/'rsi'
+
+@dataclass(slots=True)
+class WarningSignal(ResultRecord):
+    """Pre-panic signal on a day before a panic (days_before is set for significant drops)"""
+    date: str
+    vnindex_change: float
+    bsi: Optional[float]
+    ssi: Optional[float]
+    rsi: Optional[float]
+    signal: str
+    days_before: Optional[int] = None
+
+@dataclass(slots=True)
+class PrePanicResult(ResultRecord):
+    """T-1/T-7/T-14 signals, 14-day significant drops and summary for one panic date"""
+    panic_date: str
+    pre_panic_signals: Dict[str, WarningSignal]
+    significant_drops: List[WarningSignal]
+    strongest_warning: str
+    pattern_analysis: str
+    has_warning_signals: bool
+    trading_advice: Dict[str, str]
+
+class DateTable:
+    """Columnar per-day results of a date range, one array per DateAnalysis scalar field
+    
+    Rows are the trading days with VNINDEX data, oldest first; a missing sector indicator is NaN.
+    Indexing a row builds its full DateAnalysis (per-ticker changes included) on demand, and
+    slicing, e.g. table[-5:], is a view over the same arrays that builds no records at all.
+    """
+    __slots__ = ('analyzer', 'ordinals', 'vnindex_change', 'bsi', 'ssi', 'rsi')
+    
+    def __init__(self, analyzer, ordinals, vnindex_change, bsi, ssi, rsi):
+        self.analyzer = analyzer
+        self.ordinals = ordinals
+        self.vnindex_change = vnindex_change
+        self.bsi = bsi
+        self.ssi = ssi
+        self.rsi = rsi
+    
+    @property
+    def dates(self):
+        """Date labels of the rows"""
+        labels = self.analyzer.calendar.labels
+        return [labels[i] for i in self.ordinals]
+    
+    def __len__(self):
+        return len(self.ordinals)
+    
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return DateTable(self.analyzer, self.ordinals[key], self.vnindex_change[key],
+                             self.bsi[key], self.ssi[key], self.rsi[key])
+        return self.analyzer.get_date_data(self.analyzer.calendar.labels[self.ordinals[key]])
+    
+    def __iter__(self):
+        for k in range(len(self)):
+            yield self[k]
+    
+    def to_dicts(self):
+        return [data.to_dict() for data in self]
+
+@dataclass(slots=True)
+class RangeAnalysis(ResultRecord):
+    """Panic, banking stabilization and securities recovery days found in a date range"""
+    start_date: str
+    end_date: str
+    panic_days: List[DateAnalysis]
+    banking_stabilization: List[DateAnalysis]
+    securities_recovery: List[DateAnalysis]
+    all_results: DateTable
+    
+    def to_dict(self):
+        # asdict cannot walk the columnar all_results, so it is expanded to per-day records here
+        return {
+            'start_date': self.start_date,
+            'end_date': self.end_date,
+            'panic_days': [data.to_dict() for data in self.panic_days],
+            'banking_stabilization': [data.to_dict() for data in self.banking_stabilization],
+            'securities_recovery': [data.to_dict() for data in self.securities_recovery],
+            'all_results': self.all_results.to_dicts()
+        }
+
+@dataclass(slots=True)
+class CompleteCycle(ResultRecord):
+    """Panic followed by banking stabilization and securities recovery"""
+    panic: DateAnalysis
+    banking_stabilization: DateAnalysis
+    securities_recovery: List[DateAnalysis]
+
+@dataclass(slots=True)
+class CycleAnalysis(ResultRecord):
+    """Complete panic-to-recovery cycles found in a date range"""
+    start_date: str
+    end_date: str
+    range_analysis: RangeAnalysis
+    cycles: List[CompleteCycle]
+    
+    def to_dict(self):
+        return {
+            'start_date': self.start_date,
+            'end_date': self.end_date,
+            'range_analysis': self.range_analysis.to_dict(),
+            'cycles': [cycle.to_dict() for cycle in self.cycles]
+        }
+
+@dataclass(slots=True)
+class AllPrePanicAnalysis(ResultRecord):
+    """Pre-panic results for a set of panic dates with warning system effectiveness"""
+    panic_dates: List[str]
+    results: Dict[str, PrePanicResult]
+    errors: Dict[str, str]
+    signal_summary: Dict[str, int]
+    total_analyzed: int
+    predictive_signals: int
+    effectiveness: float
+
+@dataclass(slots=True)
+class ClassifierScore(ResultRecord):
+    """Hit/false-alarm counts and rates for one classifier rule over a backtest period"""
+    rule: str
+    predictions: int
+    true_positives: int
+    false_positives: int
+    false_negatives: int
+    precision: Optional[float]
+    recall: Optional[float]
+    false_positive_rate: Optional[float]
+    mean_lead_days: Optional[float] = None
+    median_lead_days: Optional[float] = None
+
+@dataclass(slots=True)
+class BacktestReport(ResultRecord):
+    """Panic and pre-panic warning classifiers scored over every trading day of a period"""
+    start_date: str
+    end_date: str
+    trading_days: int
+    panic_dates: List[str]
+    horizon: int
+    panic_classifier: List[ClassifierScore]
+    warning_classifier: List[ClassifierScore]
+    missed_panics: Dict[str, List[str]]
+
+@dataclass(slots=True)
+class SimilarDay(ResultRecord):
+    """A past trading day near the query day in SimilarDayIndex feature space, and what followed it"""
+    date: str
+    distance: float
+    features: Dict[str, float]
+    panic_type: str
+    forward_returns: Dict[str, Optional[float]]  # VNINDEX % change after N trading days, keyed '1d'/'5d'/'20d'
+
+@dataclass(slots=True)
+class SimilarDaysAnalysis(ResultRecord):
+    """Nearest historical analogues of a trading day with their average forward VNINDEX returns"""
+    target_date: str
+    features: Dict[str, float]
+    forward_returns: Dict[str, Optional[float]]  # the target day's own, where already known
+    analogues: List[SimilarDay]
+    mean_forward_returns: Dict[str, Optional[float]]
+    median_forward_returns: Dict[str, Optional[float]]
 
 class VietnamesePanicAnalyzer:
-    def __init__(self, data_directory="market_data"):
+    def __init__(self, data_directory="market_data", rebalance=None):
         self.data_dir = data_directory
+        self.store = PriceStore.shared(data_directory)
+        self._calendar = None
+        self._engine = None
+        self._sector_weights = None
+        self._group_engine = None
+        self._universe_engine = None
+        self._shares = None
+        self._date_records = None
+        self._similarity_index = None
+        
+        # None keeps the fixed sector weights below; a REBALANCE_SCHEDULES key weights by market cap over time
+        if rebalance is not None and rebalance not in REBALANCE_SCHEDULES:
+            raise ValueError(f"Unknown rebalance schedule: {rebalance} (expected: {', '.join(REBALANCE_SCHEDULES)})")
+        self.rebalance = rebalance
+        
+        # Renders analyze_* results; None computes without formatting or printing
+        self.renderer = TextRenderer(self)
         
         # Market cap weighted sector compositions
         self.banking_weights = {
@@ -52,18 +1767,165 @@ class VietnamesePanicAnalyzer:
                            list(self.securities_weights.keys()) + 
                            list(self.realestate_weights.keys()))
     
+    @property
+    def calendar(self):
+        """Trading calendar built from VNINDEX dates, shared by all analysis modes"""
+        if self._calendar is None:
+            self._calendar = TradingCalendar(self.store.get('VNINDEX').index)
+        return self._calendar
+    
+    @property
+    def engine(self):
+        """Whole-history sector indicator engine, built on first use"""
+        if self._engine is None:
+            self._engine = SectorIndicatorEngine(self.store, self.calendar, self._core_weights(),
+                                                 shares=self.shares, rebalance=self.rebalance)
+            
+            # Keep the compact date cache in step, so the next single-date run can skip all of this
+            if self.rebalance is None and self.store.use_cache:
+                records = DateRecordCache(self.data_dir, self.store.cache_dir)
+                if not records.load(self._engine.sector_weights):
+                    records.write(self._engine, self.store.sources)
+        return self._engine
+    
+    def _core_weights(self):
+        return {
+            'bsi': self.banking_weights,
+            'ssi': self.securities_weights,
+            'rsi': self.realestate_weights
+        }
+    
+    @property
+    def date_records(self):
+        """Fresh DateRecordCache of the core engine, or None (missing, stale, or market-cap weights)"""
+        if self._date_records is None and self.rebalance is None and self.store.use_cache:
+            records = DateRecordCache(self.data_dir, self.store.cache_dir)
+            if records.load(self._core_weights()):
+                self._date_records = records
+        return self._date_records
+    
+    @property
+    def shares(self):
+        """Share counts for market-cap weighting over time (None with fixed weights)"""
+        if self.rebalance is None:
+            return None
+        if self._shares is None:
+            self._shares = estimate_shares(self.store, load_market_caps())
+        return self._shares
+    
+    @property
+    def sector_weights(self):
+        """Market-cap weights for every ticker_group.json sector, loaded on first use"""
+        if self._sector_weights is None:
+            self._sector_weights = load_sector_weights()
+        return self._sector_weights
+    
+    @property
+    def group_engine(self):
+        """Whole-history indicator engine for every ticker_group.json sector, built on first use"""
+        if self._group_engine is None:
+            self._group_engine = GroupIndicatorEngine(self.store, self.calendar, self.sector_weights,
+                                                      shares=self.shares, rebalance=self.rebalance)
+        return self._group_engine
+    
+    @property
+    def universe_engine(self):
+        """Whole-history engine over every ticker in market_data, with an equal-weighted 'EQUAL_WEIGHT' series"""
+        if self._universe_engine is None:
+            tickers = sorted(name[:-4] for name in os.listdir(self.data_dir)
+                             if name.endswith('.csv') and name[:-4] != 'VNINDEX')
+            self._universe_engine = GroupIndicatorEngine(self.store, self.calendar,
+                                                         {'EQUAL_WEIGHT': {t: 1 / len(tickers) for t in tickers}})
+        return self._universe_engine
+    
+    @property
+    def similarity_index(self):
+        """SimilarDayIndex over the core engine, built on first use and extended by refresh()"""
+        if self._similarity_index is None:
+            self._similarity_index = SimilarDayIndex(self.engine)
+        return self._similarity_index
+    
+    def compute_sector_indicators(self, start_date=None, end_date=None):
+        """Market-cap weighted daily change of every sector, one column per sector
+        
+        Each `<SECTOR>_count` column holds how many of the sector's tickers traded that day.
+        """
+        indicators = self.group_engine.indicators
+        indicators = indicators.rename_axis('date')
+        if start_date is not None or end_date is not None:
+            indicators = indicators.loc[start_date:end_date]
+        return indicators
+    
+    def compute_breadth(self, start_date=None, end_date=None):
+        """Market breadth over every ticker in market_data (see market_breadth), one row per trading day"""
+        engine = self.universe_engine
+        columns = [engine.columns[t] for t in engine.sector_weights['EQUAL_WEIGHT']]
+        breadth = pd.DataFrame(market_breadth(engine.close[:, columns], engine.low[:, columns],
+                                              engine.change[:, columns], engine.valid[:, columns]),
+                               index=engine.dates.rename('date'))
+        if start_date is not None or end_date is not None:
+            breadth = breadth.loc[start_date:end_date]
+        return breadth
+    
+    def weights_on(self, target_date):
+        """Banking, securities and real estate weights in effect on a date, keyed bsi/ssi/rsi"""
+        if self.rebalance is None:
+            return self._core_weights()
+        i = self.engine.row(target_date)
+        if i is None:
+            return self.engine.sector_weights
+        return self.engine.weights_on(i)
+    
+    def refresh(self):
+        """Bring the calendar and indicator series up to date with rows appended to market_data
+        
+        Returns {ticker: first new date} from PriceStore.refresh. Appended days only extend the
+        precomputed series; a rewritten CSV for one of our tickers rebuilds them from the store.
+        """
+        changed = self.store.refresh()
+        self._date_records = None
+        tracked = set(self.all_tickers)
+        for engine in (self._group_engine, self._universe_engine):
+            if engine is not None:
+                tracked.update(engine.tickers)
+        relevant = {t: date for t, date in changed.items() if t in tracked}
+        if not relevant or self._calendar is None:
+            return changed
+        
+        if None in relevant.values():
+            self._calendar = None
+            self._engine = None
+            self._group_engine = None
+            self._universe_engine = None
+            self._similarity_index = None
+            return changed
+        
+        calendar = self._calendar
+        calendar.forget_tickers(relevant)
+        if 'VNINDEX' in relevant:
+            calendar.extend(self.store.get('VNINDEX').index[len(calendar):])
+        start = min(calendar.count_before(date) for date in relevant.values())
+        for engine in (self._engine, self._group_engine, self._universe_engine):
+            if engine is not None:
+                engine.extend(start)
+        if self._similarity_index is not None:
+            self._similarity_index.extend(start)
+        return changed
+    
+    @profiled('render')
+    def render(self, kind, *args):
+        """Print a result through the configured renderer (skipped entirely in quiet mode)"""
+        if self.renderer is None:
+            return
+        text = getattr(self.renderer, f"render_{kind}")(*args)
+        if text is not None:
+            print(text)
+    
     def load_ticker_data(self, ticker):
-        """Load CSV data for a ticker"""
-        csv_path = os.path.join(self.data_dir, f"{ticker}.csv")
-        try:
-            df = pd.read_csv(csv_path)
-            df.columns = ['ticker', 'date', 'open', 'high', 'low', 'close', 'volume']
-            df['date'] = pd.to_datetime(df['date'])
-            return df.set_index('date')
-        except FileNotFoundError:
-            print(f"⚠️  Warning: {ticker}.csv not found")
-            return pd.DataFrame()
+        """Load data for a ticker from the shared price store (parsed once per process)"""
+        return self.store.get(ticker)
     
+    @profiled('lookup')
     def get_price_change(self, ticker_data, target_date):
         """Calculate percentage change for target date"""
         target_date = pd.to_datetime(target_date)
@@ -71,26 +1933,15 @@ class VietnamesePanicAnalyzer:
         if ticker_data.empty:
             return None
             
-        # Get target date data
-        target_row = ticker_data[ticker_data.index == target_date]
-        if target_row.empty:
+        # Positional lookup: the previous trading day is the row just before the target
+        position = ticker_data.index.get_indexer([target_date])[0]
+        if position <= 0:
             return None
-            
-        # Find previous trading day
-        prev_dates = ticker_data[ticker_data.index < target_date].index
-        if prev_dates.empty:
-            return None
-            
-        prev_date = prev_dates.max()
-        prev_row = ticker_data[ticker_data.index == prev_date]
         
-        if prev_row.empty:
-            return None
-            
-        prev_close = prev_row.iloc[0]['close']
-        target_close = target_row.iloc[0]['close']
-        target_low = target_row.iloc[0]['low']
-        target_volume = target_row.iloc[0]['volume']
+        prev_close = ticker_data['close'].iat[position - 1]
+        target_close = ticker_data['close'].iat[position]
+        target_low = ticker_data['low'].iat[position]
+        target_volume = ticker_data['volume'].iat[position]
         
         # Calculate change using close price
         change = ((target_close - prev_close) / prev_close) * 100
@@ -98,14 +1949,14 @@ class VietnamesePanicAnalyzer:
         # Also calculate worst intraday drop
         intraday_drop = ((target_low - prev_close) / prev_close) * 100
         
-        return {
-            'prev_close': prev_close,
-            'target_close': target_close,
-            'target_low': target_low,
-            'change': change,
-            'intraday_drop': intraday_drop,
-            'volume': target_volume
-        }
+        return TickerChange(
+            prev_close=prev_close,
+            target_close=target_close,
+            target_low=target_low,
+            change=change,
+            intraday_drop=intraday_drop,
+            volume=int(target_volume)
+        )
     
     def calculate_sector_indicator(self, sector_changes, weights):
         """Calculate weighted sector indicator"""
@@ -125,117 +1976,111 @@ class VietnamesePanicAnalyzer:
             
         return weighted_performance / total_weight, valid_tickers
     
+    @profiled('classify')
     def classify_panic_type(self, bsi, ssi, rsi, vnindex_drop):
         """Classify panic type based on sector indicators"""
-        if abs(vnindex_drop) < 3.0:
+        t = PANIC_THRESHOLDS
+        if abs(vnindex_drop) < t['vnindex']:
             return "NO_PANIC"
         
         # Positive panic: Banking stable, others oversold
         if bsi is not None and ssi is not None and rsi is not None:
-            if bsi > -2.0 and ssi < -3.0 and rsi < -4.0:
+            if bsi > t['positive_bsi'] and ssi < t['positive_ssi'] and rsi < t['positive_rsi']:
                 return "POSITIVE_PANIC"
             
             # Negative extreme: All indicators deep red
-            elif bsi < -5.0 and ssi < -7.0 and rsi < -8.0:
+            elif bsi < t['extreme_bsi'] and ssi < t['extreme_ssi'] and rsi < t['extreme_rsi']:
                 return "NEGATIVE_EXTREME"
             
             # Negative medium: Significant weakness across board
-            elif bsi < -3.0 and ssi < -5.0 and rsi < -6.0:
+            elif bsi < t['medium_bsi'] and ssi < t['medium_ssi'] and rsi < t['medium_rsi']:
                 return "NEGATIVE_MEDIUM"
         
         return "UNCLEAR_PATTERN"
     
-    def classify_pre_panic_signal(self, bsi, ssi, rsi, vnindex_drop):
-        """Classify pre-panic warning signals based on sector indicators"""
+    @profiled('classify')
+    def classify_pre_panic_signal(self, bsi, ssi, rsi, vnindex_drop, breadth=None):
+        """Classify pre-panic warning signals based on sector indicators
+        
+        With `breadth` (a market_breadth row: pct_down, pct_below_ma20), a broad selloff or a
+        market mostly under its 20-day averages raises the level as in BREADTH_THRESHOLDS.
+        """
+        signal = self._sector_warning(bsi, ssi, rsi, vnindex_drop)
+        if breadth is None or signal == "INSUFFICIENT_DATA":
+            return signal
+        
+        b = BREADTH_THRESHOLDS
+        floor = "NO_WARNING"
+        if breadth['pct_down'] >= b['selloff_pct_down'] and vnindex_drop <= b['selloff_vnindex']:
+            floor = "EARLY_WARNING"
+        elif breadth['pct_below_ma20'] >= b['weak_below_ma20']:
+            floor = "DEVELOPING_WEAKNESS"
+        return max(signal, floor, key=WARNING_PRIORITY.get)
+    
+    def _sector_warning(self, bsi, ssi, rsi, vnindex_drop):
         # Pre-panic signals look for specific sector weakness patterns
         # that historically precede major panic days
         
         if vnindex_drop is None or bsi is None or ssi is None or rsi is None:
             return "INSUFFICIENT_DATA"
+        
+        t = WARNING_THRESHOLDS
             
         # Strong warning: Real estate crashes first (-2%+), others follow
-        if rsi <= -2.0 and (ssi <= -1.5 or bsi <= -1.5) and vnindex_drop <= -1.5:
+        if rsi <= t['strong_rsi'] and (ssi <= t['strong_sector'] or bsi <= t['strong_sector']) and vnindex_drop <= t['strong_vnindex']:
             return "STRONG_WARNING"
         
         # Moderate warning: Securities weakness with banking holding
-        if ssi <= -1.5 and bsi >= -1.0 and vnindex_drop <= -1.0:
+        if ssi <= t['moderate_ssi'] and bsi >= t['moderate_bsi'] and vnindex_drop <= t['moderate_vnindex']:
             return "MODERATE_WARNING"
             
         # Early warning: Any sector showing -2%+ weakness
-        if min(bsi, ssi, rsi) <= -2.0 and vnindex_drop <= -1.0:
+        if min(bsi, ssi, rsi) <= t['early_sector'] and vnindex_drop <= t['early_vnindex']:
             return "EARLY_WARNING"
             
         # Developing weakness: VNINDEX -1%+ with sector divergence
-        if vnindex_drop <= -1.0 and (abs(bsi - ssi) >= 1.0 or abs(ssi - rsi) >= 1.0):
+        if vnindex_drop <= t['developing_vnindex'] and (abs(bsi - ssi) >= t['developing_divergence'] or abs(ssi - rsi) >= t['developing_divergence']):
             return "DEVELOPING_WEAKNESS"
             
         return "NO_WARNING"
     
     def get_trading_days_before(self, target_date, days_back):
         """Get trading days before target date, skipping weekends"""
-        target_dt = pd.to_datetime(target_date)
-        
-        # Load VNINDEX data to find actual trading days
-        vnindex_data = self.load_ticker_data('VNINDEX')
-        if vnindex_data.empty:
-            return []
-        
-        # Get all trading days before target date
-        trading_days = vnindex_data[vnindex_data.index < target_dt].index
-        
-        if trading_days.empty:
-            return []
-        
-        # Get the most recent trading days (up to days_back)
-        recent_days = trading_days[-days_back:] if len(trading_days) >= days_back else trading_days
-        return [day.strftime('%Y-%m-%d') for day in reversed(recent_days)]
+        return self.calendar.window(target_date, days_back)
     
-    def analyze_pre_panic_pattern(self, panic_date):
-        """Comprehensive pre-panic analysis for a specific panic date"""
-        print(f"🚨 PRE-PANIC ANALYSIS for {panic_date}")
-        print("=" * 80)
-        
+    def _warning_signal(self, date, data, days_before=None):
+        """Classify a day's data as a pre-panic WarningSignal"""
+        return WarningSignal(
+            date=date,
+            vnindex_change=data.vnindex_change,
+            bsi=data.bsi,
+            ssi=data.ssi,
+            rsi=data.rsi,
+            signal=self.classify_pre_panic_signal(data.bsi, data.ssi, data.rsi, data.vnindex_change),
+            days_before=days_before
+        )
+    
+    def compute_pre_panic_pattern(self, panic_date):
+        """Pre-panic signals, significant drops and pattern summary for a panic date, without printing"""
         # Get T-1, T-7, T-14 days before panic
-        t1_days = self.get_trading_days_before(panic_date, 1)
-        t7_days = self.get_trading_days_before(panic_date, 7) 
-        t14_days = self.get_trading_days_before(panic_date, 14)
-        
         pre_dates = {
-            'T-1': t1_days[:1] if t1_days else [],
-            'T-7': [t7_days[6]] if len(t7_days) > 6 else [],
-            'T-14': [t14_days[13]] if len(t14_days) > 13 else []
+            timeframe: [date] if date else []
+            for timeframe, date in (
+                ('T-1', self.calendar.shift(panic_date, 1)),
+                ('T-7', self.calendar.shift(panic_date, 7)),
+                ('T-14', self.calendar.shift(panic_date, 14))
+            )
         }
         
         # SCAN ALL 14 DAYS for any 2%+ drops
         all_14_days = self.get_trading_days_before(panic_date, 14)
         significant_drops = []
         
-        print(f"\n📊 SCANNING ALL 14 DAYS BEFORE PANIC FOR ≥2% DROPS:")
-        print("=" * 60)
-        
-        for i, date in enumerate(reversed(all_14_days), 1):
+        # all_14_days is most recent first, so T-n is at position n; report oldest first
+        for days_before, date in reversed(list(enumerate(all_14_days, 1))):
             data = self.get_date_data(date)
-            if data and data['vnindex_change'] <= -2.0:
-                days_before = i
-                signal = self.classify_pre_panic_signal(
-                    data['bsi'], data['ssi'], data['rsi'], data['vnindex_change']
-                )
-                significant_drops.append({
-                    'date': date,
-                    'days_before': days_before,
-                    'vnindex_change': data['vnindex_change'],
-                    'bsi': data['bsi'],
-                    'ssi': data['ssi'], 
-                    'rsi': data['rsi'],
-                    'signal': signal
-                })
-                print(f"   📉 T-{days_before} ({date}): VNINDEX {data['vnindex_change']:+.2f}% → {signal}")
-                print(f"       🏦 Banking: {data['bsi']:+.2f}% | 📊 Securities: {data['ssi']:+.2f}% | 🏠 Real Estate: {data['rsi']:+.2f}%")
-        
-        if not significant_drops:
-            print(f"   ✅ No significant drops (≥2%) found in 14 days before panic")
-        else:
-            print(f"   🚨 Found {len(significant_drops)} significant drop(s) in pre-panic period")
+            if data and data.vnindex_change <= -2.0:
+                significant_drops.append(self._warning_signal(date, data, days_before=days_before))
         
         # Analyze each pre-panic timeframe
         pre_panic_signals = {}
@@ -248,48 +2093,28 @@ class VietnamesePanicAnalyzer:
             data = self.get_date_data(date)
             
             if data:
-                signal = self.classify_pre_panic_signal(
-                    data['bsi'], data['ssi'], data['rsi'], data['vnindex_change']
-                )
-                pre_panic_signals[timeframe] = {
-                    'date': date,
-                    'vnindex_change': data['vnindex_change'],
-                    'bsi': data['bsi'],
-                    'ssi': data['ssi'], 
-                    'rsi': data['rsi'],
-                    'signal': signal
-                }
-                
-                print(f"\n📅 {timeframe} ({date}): VNINDEX {data['vnindex_change']:+.2f}%")
-                print(f"   🏦 Banking: {data['bsi']:+.2f}% | 📊 Securities: {data['ssi']:+.2f}% | 🏠 Real Estate: {data['rsi']:+.2f}%")
-                print(f"   🚨 Pre-Panic Signal: {signal}")
-        
-        # Analyze pre-panic pattern development
-        print(f"\n" + "=" * 80)
-        print(f"📊 PRE-PANIC PATTERN SUMMARY")
-        print("=" * 80)
+                pre_panic_signals[timeframe] = self._warning_signal(date, data)
         
         # Combine T-1/T-7/T-14 signals with significant drops analysis
         all_warning_signals = []
         if pre_panic_signals:
-            all_warning_signals.extend([data['signal'] for data in pre_panic_signals.values()])
+            all_warning_signals.extend([data.signal for data in pre_panic_signals.values()])
         if significant_drops:
-            all_warning_signals.extend([drop['signal'] for drop in significant_drops])
+            all_warning_signals.extend([drop.signal for drop in significant_drops])
         
+        strongest_warning = 'NO_WARNING'
+        pattern_analysis = 'NO_SIGNALS_DETECTED'
         if all_warning_signals:
             strongest_warning = self.get_strongest_warning(all_warning_signals)
-            print(f"🎯 STRONGEST WARNING: {strongest_warning}")
             
             # Enhanced pattern analysis including significant drops
             if significant_drops:
-                print(f"📉 SIGNIFICANT DROPS DETECTED: {len(significant_drops)} drops ≥2% in 14-day period")
-                most_recent_drop = min(significant_drops, key=lambda x: x['days_before'])
-                print(f"   Most Recent: T-{most_recent_drop['days_before']} ({most_recent_drop['date']}) {most_recent_drop['vnindex_change']:+.2f}%")
+                most_recent_drop = min(significant_drops, key=lambda x: x.days_before)
                 
                 # Check if significant drops show escalating pattern
                 if len(significant_drops) >= 2:
                     pattern_analysis = "MULTIPLE_WEAKNESS_EVENTS"
-                elif most_recent_drop['days_before'] <= 3:
+                elif most_recent_drop.days_before <= 3:
                     pattern_analysis = "RECENT_WEAKNESS_ESCALATION"
                 else:
                     pattern_analysis = "HISTORICAL_WEAKNESS_DETECTED"
@@ -297,44 +2122,26 @@ class VietnamesePanicAnalyzer:
                 pattern_analysis = self.analyze_warning_progression(pre_panic_signals)
             else:
                 pattern_analysis = "ISOLATED_SIGNALS"
-                
-            print(f"📈 PATTERN DEVELOPMENT: {pattern_analysis}")
-            
-            # Enhanced trading recommendations considering all signals
-            trading_advice = self.get_pre_panic_trading_advice(strongest_warning, pre_panic_signals)
-            print(f"\n💡 TRADING RECOMMENDATIONS:")
-            print(f"   🎯 Action: {trading_advice['action']}")
-            print(f"   ⚠️  Risk Level: {trading_advice['risk_level']}")
-            print(f"   📊 Position Size: {trading_advice['position_size']}")
-            print(f"   🛡️  Defensive Stocks: {trading_advice['defensive_stocks']}")
-            
-            if significant_drops:
-                print(f"\n⚡ ENHANCED ANALYSIS:")
-                print(f"   📊 Pre-Panic Drops: Found {len(significant_drops)} significant weakness event(s)")
-                print(f"   🎯 Risk Elevation: Significant drops increase panic probability")
-        else:
-            print(f"🎯 STRONGEST WARNING: NO_WARNING")
-            print(f"📈 PATTERN DEVELOPMENT: NO_SIGNALS_DETECTED")
-            print(f"\n💡 TRADING RECOMMENDATIONS:")
-            print(f"   🎯 Action: Normal trading strategies")
-            print(f"   ⚠️  Risk Level: LOW - No warning signals detected")
         
-        return {
-            'pre_panic_signals': pre_panic_signals,
-            'significant_drops': significant_drops,
-            'strongest_warning': strongest_warning if all_warning_signals else 'NO_WARNING'
-        }
+        return PrePanicResult(
+            panic_date=panic_date,
+            pre_panic_signals=pre_panic_signals,
+            significant_drops=significant_drops,
+            strongest_warning=strongest_warning,
+            pattern_analysis=pattern_analysis,
+            has_warning_signals=bool(all_warning_signals),
+            trading_advice=self.get_pre_panic_trading_advice(strongest_warning, pre_panic_signals)
+        )
+    
+    def analyze_pre_panic_pattern(self, panic_date):
+        """Comprehensive pre-panic analysis for a specific panic date"""
+        result = self.compute_pre_panic_pattern(panic_date)
+        self.render('pre_panic', result)
+        return result
     
     def get_strongest_warning(self, warning_levels):
         """Determine the strongest warning level from a list"""
-        priority = {
-            'STRONG_WARNING': 4,
-            'MODERATE_WARNING': 3,
-            'EARLY_WARNING': 2,
-            'DEVELOPING_WEAKNESS': 1,
-            'NO_WARNING': 0,
-            'INSUFFICIENT_DATA': -1
-        }
+        priority = WARNING_PRIORITY
         
         max_priority = max([priority.get(w, -1) for w in warning_levels])
         for warning, p in priority.items():
@@ -400,450 +2207,1814 @@ class VietnamesePanicAnalyzer:
     
     def analyze_date(self, target_date):
         """Complete analysis for a given date"""
-        print(f"🔍 Analyzing Vietnamese Market for {target_date}")
-        print("=" * 60)
+        data = self.get_date_data(target_date)
+        self.render('date', target_date, data)
+        return data
+    
+    @profiled('lookup')
+    def get_date_data(self, target_date):
+        """Get market data for a single date without printing"""
+        # Until the engine is built, one row of the compact date cache answers without loading any prices
+        records = self.date_records if self._engine is None else None
+        if records is not None:
+            try:
+                i = records.ordinal(target_date)
+            except KeyError:
+                pass
+            else:
+                if i is None:
+                    return None
+                changes, indicators, risk = records.read(i)
+                all_data = {ticker: changes[ticker] for ticker in self.all_tickers if ticker in changes}
+                return self._date_analysis(target_date, all_data, indicators, risk)
+        
+        engine = self.engine
+        i = engine.row(target_date)
+        if i is None:
+            return None
         
-        # Load all ticker data
         all_data = {}
         for ticker in self.all_tickers:
-            data = self.load_ticker_data(ticker)
-            if not data.empty:
-                change = self.get_price_change(data, target_date)
-                if change:
-                    all_data[ticker] = change
-        
-        # Check if we have VNINDEX data
+            change = engine.ticker_data(i, ticker)
+            if change:
+                all_data[ticker] = change
+        
+        # Sector indicators and risk features are precomputed for the whole history
+        indicators = {name: engine.indicator(i, name) for name in ('bsi', 'ssi', 'rsi')}
+        risk = engine.risk(i, list(all_data) + list(indicators))
+        return self._date_analysis(target_date, all_data, indicators, risk)
+    
+    def _date_analysis(self, target_date, all_data, indicators, risk):
+        """DateAnalysis from a date's valid TickerChanges, sector indicators and risk features"""
         if 'VNINDEX' not in all_data:
-            print("❌ ERROR: VNINDEX data not found for this date")
-            return
+            return None
         
+        bsi, ssi, rsi = indicators['bsi'], indicators['ssi'], indicators['rsi']
         vnindex_data = all_data['VNINDEX']
-        vnindex_drop = vnindex_data['change']
+        vnindex_drop = vnindex_data.change
         
-        print(f"📊 VNINDEX: {vnindex_data['prev_close']:.2f} → {vnindex_data['target_close']:.2f} ({vnindex_drop:+.2f}%)")
-        print(f"📉 Intraday Low: {vnindex_data['target_low']:.2f} ({vnindex_data['intraday_drop']:+.2f}%)")
-        print(f"📈 Volume: {vnindex_data['volume']:,}")
+        banking_valid = [t for t in self.banking_weights if t in all_data]
+        securities_valid = [t for t in self.securities_weights if t in all_data]
+        realestate_valid = [t for t in self.realestate_weights if t in all_data]
         
-        if abs(vnindex_drop) >= 3.0:
-            print(f"🚨 PANIC DAY DETECTED: {vnindex_drop:.2f}% drop!")
-        else:
-            print(f"✅ Normal trading day: {vnindex_drop:.2f}% change")
+        panic_type = self.classify_panic_type(bsi, ssi, rsi, vnindex_drop)
         
-        print("\n" + "=" * 60)
-        print("📈 SECTOR ANALYSIS")
-        print("=" * 60)
+        return DateAnalysis(
+            date=target_date,
+            vnindex_change=vnindex_drop,
+            vnindex_data=vnindex_data,
+            bsi=bsi,
+            ssi=ssi,
+            rsi=rsi,
+            panic_type=panic_type,
+            all_data=all_data,
+            banking_valid=banking_valid,
+            securities_valid=securities_valid,
+            realestate_valid=realestate_valid,
+            risk={name: risk[name] for name in list(all_data) + ['bsi', 'ssi', 'rsi']}
+        )
+    
+    def iter_date_range(self, start_date, end_date):
+        """Yield get_date_data results for each trading day in a range as they are computed"""
+        for date_str in self.calendar.between(start_date, end_date):
+            data = self.get_date_data(date_str)
+            if data:
+                yield data
+    
+    def date_table(self, start_date, end_date):
+        """DateTable of the trading days in a range, sliced straight out of the engine arrays"""
+        engine = self.engine
+        start, end = self.calendar.span(start_date, end_date)
+        j = engine.columns['VNINDEX']
+        ordinals = np.arange(start, end)[engine.valid[start:end, j]]
+        return DateTable(self, ordinals, engine.change[ordinals, j],
+                         *(engine.indicators[name].to_numpy()[ordinals] for name in ('bsi', 'ssi', 'rsi')))
+    
+    def compute_date_range(self, start_date, end_date):
+        """Find panic, banking stabilization and securities recovery days in a range"""
+        results = self.date_table(start_date, end_date)
+        vnindex_change, bsi, ssi = results.vnindex_change, results.bsi, results.ssi
+        ordinals = results.ordinals
+        
+        def seen_within(flags, days):
+            """Whether any flagged day falls in the `days` trading days before each row"""
+            counts = np.concatenate([[0], np.cumsum(flags)])
+            first = np.searchsorted(ordinals, ordinals - days, side='left')
+            return counts[np.arange(len(flags))] > counts[first]
+        
+        # Panic days
+        panic = np.abs(vnindex_change) >= 3.0
+        
+        # Banking stabilization: BSI positive with a panic in the previous 4 trading days
+        banking_strong = bsi > 1.0  # NaN (no indicator) compares False
+        stabilization = ~panic & banking_strong & seen_within(panic, 4)
+        
+        # Securities recovery: SSI outperforming with a strong banking day in the previous 2 trading days
+        outperforming = (vnindex_change > 0) & (ssi > vnindex_change + 1.0)
+        recovery = ~panic & ~banking_strong & outperforming & seen_within(banking_strong, 2)
+        
+        return RangeAnalysis(
+            start_date=start_date,
+            end_date=end_date,
+            panic_days=[results[k] for k in np.flatnonzero(panic)],
+            banking_stabilization=[results[k] for k in np.flatnonzero(stabilization)],
+            securities_recovery=[results[k] for k in np.flatnonzero(recovery)],
+            all_results=results
+        )
         
-        # Banking Sector Analysis
-        print("\n🏦 BANKING SECTOR:")
-        banking_changes = {k: all_data.get(k) for k in self.banking_weights.keys()}
-        bsi, banking_valid = self.calculate_sector_indicator(banking_changes, self.banking_weights)
+    def analyze_date_range(self, start_date, end_date):
+        """Analyze a range of dates and identify market patterns"""
+        result = self.compute_date_range(start_date, end_date)
+        self.render('range', result)
+        return result
+    
+    def compute_complete_cycle(self, start_date, end_date, stabilization_days=5, recovery_days=3):
+        """Find complete panic-to-recovery cycles in a range
+        
+        A cycle is a panic, the first banking stabilization within `stabilization_days` trading
+        days after it, and every securities recovery within `recovery_days` trading days after
+        that. Windows count trading days, so a cycle running over a weekend or holiday is found.
+        """
+        cycle_data = self.compute_date_range(start_date, end_date)
+        ordinal = self.calendar.ordinal
+        stabilization_ordinals = np.array([ordinal(d.date) for d in cycle_data.banking_stabilization], dtype=np.int64)
+        recovery_ordinals = np.array([ordinal(d.date) for d in cycle_data.securities_recovery], dtype=np.int64)
+        
+        # Each list is sorted by date, so every window is a binary search instead of a rescan
+        cycles = []
+        for panic in cycle_data.panic_days:
+            p = ordinal(panic.date)
+            k = np.searchsorted(stabilization_ordinals, p, side='right')
+            if k == len(stabilization_ordinals) or stabilization_ordinals[k] > p + stabilization_days:
+                continue
+            
+            s = stabilization_ordinals[k]
+            first, last = np.searchsorted(recovery_ordinals, [s, s + recovery_days], side='right')
+            if first < last:
+                cycles.append(CompleteCycle(
+                    panic=panic,
+                    banking_stabilization=cycle_data.banking_stabilization[k],
+                    securities_recovery=cycle_data.securities_recovery[first:last]
+                ))
+                    
+        return CycleAnalysis(
+            start_date=start_date,
+            end_date=end_date,
+            range_analysis=cycle_data,
+            cycles=cycles
+        )
         
-        for ticker in self.banking_weights.keys():
-            weight = self.banking_weights[ticker]
-            if ticker in all_data:
-                change = all_data[ticker]['change']
-                contribution = change * weight
-                print(f"  {ticker}: {change:+.2f}% (weight: {weight:.2f}, contrib: {contribution:+.3f}%)")
-            else:
-                print(f"  {ticker}: NO DATA (weight: {weight:.2f})")
+    def analyze_complete_cycle(self, start_date, end_date):
+        """Identify complete panic-to-recovery cycles"""
+        result = self.compute_complete_cycle(start_date, end_date)
+        self.render('cycle', result)
+        return result
+    
+    def compute_pre_panic_batch(self, panic_dates, jobs=1):
+        """Compute pre-panic results for many dates as (result, error) pairs in input order
+        
+        With jobs > 1 the dates are fanned out over a process pool. Workers are forked after
+        the price data and indicator engine are loaded, so they share that memory instead of
+        re-reading CSVs. Where fork is unavailable a thread pool is used instead.
+        """
+        # Build the shared data before any worker starts
+        self.engine
+        
+        if jobs <= 1 or len(panic_dates) <= 1:
+            return [self._compute_pre_panic_safely(date) for date in panic_dates]
+        
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+        if 'fork' in multiprocessing.get_all_start_methods():
+            global _batch_analyzer
+            _batch_analyzer = self
+            try:
+                context = multiprocessing.get_context('fork')
+                with ProcessPoolExecutor(max_workers=jobs, mp_context=context) as pool:
+                    return list(pool.map(_compute_pre_panic_in_worker, panic_dates))
+            finally:
+                _batch_analyzer = None
+        
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            return list(pool.map(self._compute_pre_panic_safely, panic_dates))
+    
+    def _compute_pre_panic_safely(self, panic_date):
+        try:
+            return self.compute_pre_panic_pattern(panic_date), None
+        except Exception as e:
+            return None, str(e)
+    
+    def compute_panic_days(self, start_date=None, end_date=None, threshold=PANIC_THRESHOLDS['vnindex'],
+                           direction='both', cluster_days=1):
+        """Panic days detected from the VNINDEX change series (see detect_panic_days), one row per day
+        
+        Clusters are formed over the whole history, so a cluster can start before `start_date`.
+        Columns: vnindex_change, cluster_start (date of the cluster's first day), cluster_day
+        (1-based position within the cluster) and cluster_size.
+        """
+        engine = self.engine
+        calendar = self.calendar
+        j = engine.columns['VNINDEX']
+        days, onsets = detect_panic_days(np.where(engine.valid[:, j], engine.change[:, j], np.nan),
+                                         threshold, direction, cluster_days)
+        
+        _, first_day, cluster, sizes = np.unique(onsets, return_index=True, return_inverse=True, return_counts=True)
+        table = pd.DataFrame({
+            'vnindex_change': engine.change[days, j],
+            'cluster_start': [calendar.labels[i] for i in onsets],
+            'cluster_day': np.arange(len(days)) - first_day[cluster] + 1,
+            'cluster_size': sizes[cluster]
+        }, index=calendar.dates[days].rename('date'))
+        
+        start, end = calendar.span(start_date if start_date is not None else calendar.labels[0],
+                                   end_date if end_date is not None else calendar.labels[-1])
+        return table[(days >= start) & (days < end)]
+    
+    def detect_panic_dates(self, start_date=None, end_date=None, threshold=PANIC_THRESHOLDS['vnindex'],
+                           direction='both', cluster_days=1):
+        """First day of every detected panic cluster in a range, as date labels"""
+        table = self.compute_panic_days(start_date, end_date, threshold, direction, cluster_days)
+        return table.index[table['cluster_day'] == 1].strftime('%Y-%m-%d').tolist()
+    
+    def compute_all_pre_panic_patterns(self, jobs=1, panic_dates=None):
+        """Pre-panic results and warning system effectiveness for a list of panic days
         
-        if bsi is not None:
-            print(f"  🎯 Banking Indicator: {bsi:+.2f}%")
-        else:
-            print(f"  ❌ Banking Indicator: Cannot calculate (insufficient data)")
+        Defaults to the first day of every panic cluster detect_panic_dates finds in the whole history.
+        """
+        if panic_dates is None:
+            panic_dates = self.detect_panic_dates()
         
-        # Securities Sector Analysis
-        print("\n📊 SECURITIES SECTOR:")
-        securities_changes = {k: all_data.get(k) for k in self.securities_weights.keys()}
-        ssi, securities_valid = self.calculate_sector_indicator(securities_changes, self.securities_weights)
+        results = {}
+        errors = {}
+        signal_summary = {
+            'STRONG_WARNING': 0,
+            'MODERATE_WARNING': 0, 
+            'EARLY_WARNING': 0,
+            'DEVELOPING_WEAKNESS': 0,
+            'NO_WARNING': 0,
+            'INSUFFICIENT_DATA': 0
+        }
         
-        for ticker in self.securities_weights.keys():
-            weight = self.securities_weights[ticker]
-            if ticker in all_data:
-                change = all_data[ticker]['change']
-                contribution = change * weight
-                print(f"  {ticker}: {change:+.2f}% (weight: {weight:.2f}, contrib: {contribution:+.3f}%)")
-            else:
-                print(f"  {ticker}: NO DATA (weight: {weight:.2f})")
+        # Compute every date first (possibly in parallel), then merge in input order
+        batch = self.compute_pre_panic_batch(panic_dates, jobs)
         
-        if ssi is not None:
-            print(f"  🎯 Securities Indicator: {ssi:+.2f}%")
-        else:
-            print(f"  ❌ Securities Indicator: Cannot calculate (insufficient data)")
+        for panic_date, (result, error) in zip(panic_dates, batch):
+            if error is not None:
+                errors[panic_date] = error
+                signal_summary['INSUFFICIENT_DATA'] += 1
+                continue
         
-        # Real Estate Sector Analysis
-        print("\n🏠 REAL ESTATE SECTOR:")
-        realestate_changes = {k: all_data.get(k) for k in self.realestate_weights.keys()}
-        rsi, realestate_valid = self.calculate_sector_indicator(realestate_changes, self.realestate_weights)
+            results[panic_date] = result
         
-        for ticker in self.realestate_weights.keys():
-            weight = self.realestate_weights[ticker]
-            if ticker in all_data:
-                change = all_data[ticker]['change']
-                contribution = change * weight
-                print(f"  {ticker}: {change:+.2f}% (weight: {weight:.2f}, contrib: {contribution:+.3f}%)")
+            # Count the strongest T-1/T-7/T-14 warning signal
+            if result.pre_panic_signals:
+                warning_levels = [data.signal for data in result.pre_panic_signals.values()]
+                strongest_warning = self.get_strongest_warning(warning_levels)
+                signal_summary[strongest_warning] += 1
             else:
-                print(f"  {ticker}: NO DATA (weight: {weight:.2f})")
-        
-        if rsi is not None:
-            print(f"  🎯 Real Estate Indicator: {rsi:+.2f}%")
-        else:
-            print(f"  ❌ Real Estate Indicator: Cannot calculate (insufficient data)")
-        
-        # Panic Classification
-        print("\n" + "=" * 60)
-        print("🎯 PANIC CLASSIFICATION")
-        print("=" * 60)
+                signal_summary['INSUFFICIENT_DATA'] += 1
         
-        panic_type = self.classify_panic_type(bsi, ssi, rsi, vnindex_drop)
+        # Calculate warning system effectiveness
+        total_analyzed = sum(signal_summary.values())
+        predictive_signals = signal_summary['STRONG_WARNING'] + signal_summary['MODERATE_WARNING'] + signal_summary['EARLY_WARNING']
+        effectiveness = (predictive_signals / total_analyzed) * 100 if total_analyzed > 0 else 0
         
-        print(f"\n📊 SECTOR INDICATORS SUMMARY:")
-        if bsi is not None:
-            print(f"  Banking Indicator: {bsi:+.2f}% (based on {len(banking_valid)} tickers)")
-        if ssi is not None:
-            print(f"  Securities Indicator: {ssi:+.2f}% (based on {len(securities_valid)} tickers)")
-        if rsi is not None:
-            print(f"  Real Estate Indicator: {rsi:+.2f}% (based on {len(realestate_valid)} tickers)")
+        return AllPrePanicAnalysis(
+            panic_dates=panic_dates,
+            results=results,
+            errors=errors,
+            signal_summary=signal_summary,
+            total_analyzed=total_analyzed,
+            predictive_signals=predictive_signals,
+            effectiveness=effectiveness
+        )
+    
+    def compute_warning_history(self, start_date=None, end_date=None, window=14):
+        """Pre-panic warning table for every trading day, computed in one vectorized pass
+        
+        Each row treats its date as a potential panic day and reproduces what
+        compute_pre_panic_pattern reports for it: the T-1/T-7/T-14 signals, the number of
+        ≥2% VNINDEX drops in the trailing `window` trading days, the strongest warning, the
+        pattern development and analyze_warning_progression's verdict.
+        """
+        engine = self.engine
+        n = len(engine.dates)
+        vnindex_change = np.where(engine.valid[:, engine.columns['VNINDEX']], engine.change[:, engine.columns['VNINDEX']], np.nan)
+        bsi = engine.indicators['bsi'].to_numpy()
+        ssi = engine.indicators['ssi'].to_numpy()
+        rsi = engine.indicators['rsi'].to_numpy()
+        
+        # Days get_date_data returns nothing for are absent from every window
+        has_data = ~np.isnan(vnindex_change)
+        signal = np.where(has_data, classify_pre_panic_codes(bsi, ssi, rsi, vnindex_change), MISSING)
+        
+        def lagged(values, lag, fill):
+            out = np.full(n, fill, dtype=values.dtype)
+            out[lag:] = values[:n - lag]
+            return out
+        
+        t1, t7, t14 = lagged(signal, 1, MISSING), lagged(signal, 7, MISSING), lagged(signal, 14, MISSING)
+        
+        # Trailing-window drop statistics over the `window` days strictly before each date
+        with np.errstate(invalid='ignore'):
+            drop = has_data & (vnindex_change <= -2.0)
+        drop_count = np.convolve(drop, np.ones(window, dtype=np.int64))[:n]
+        drop_count = lagged(drop_count, 1, 0)
+        drop_signal = np.where(drop, signal, MISSING)
+        padded = np.concatenate([np.full(window - 1, MISSING), drop_signal])
+        drop_strongest = lagged(np.lib.stride_tricks.sliding_window_view(padded, window).max(axis=1), 1, MISSING)
+        last_drop = np.maximum.accumulate(np.where(drop, np.arange(n), -1))
+        most_recent = np.arange(n) - lagged(last_drop, 1, -1)
+        
+        strongest = np.maximum.reduce([t1, t7, t14, drop_strongest])
+        has_signals = strongest > MISSING
+        strongest = np.where(has_signals, strongest, 0)
+        
+        # analyze_warning_progression over the present timeframes, ordered T-14, T-7, T-1
+        present = [t14 > MISSING, t7 > MISSING, t1 > MISSING]
+        present_count = present[0].astype(int) + present[1] + present[2]
+        first = np.select(present, [t14, t7, t1], default=MISSING)
+        last = np.select(present[::-1], [t1, t7, t14], default=MISSING)
+        any_strong_or_moderate = np.zeros(n, dtype=bool)
+        for flag, codes in zip(present, (t14, t7, t1)):
+            any_strong_or_moderate |= flag & ((codes == 4) | (codes == 3))
+        progression = np.select(
+            [
+                (present_count >= 2) & (last == 4),
+                (present_count >= 2) & any_strong_or_moderate,
+                (present_count >= 2) & (first != 0) & (last != 0)
+            ],
+            ['ESCALATING_TO_CRISIS', 'PERSISTENT_WEAKNESS', 'SUSTAINED_DETERIORATION'],
+            default='ISOLATED_SIGNALS'
+        )
+        
+        pattern = np.select(
+            [
+                ~has_signals,
+                drop_count >= 2,
+                (drop_count == 1) & (most_recent <= 3),
+                drop_count == 1,
+                present_count >= 2
+            ],
+            ['NO_SIGNALS_DETECTED', 'MULTIPLE_WEAKNESS_EVENTS', 'RECENT_WEAKNESS_ESCALATION',
+             'HISTORICAL_WEAKNESS_DETECTED', progression],
+            default='ISOLATED_SIGNALS'
+        )
+        
+        def labels(codes):
+            return np.array([WARNING_LEVELS.get(int(c)) for c in codes], dtype=object)
+        
+        history = pd.DataFrame({
+            'vnindex_change': vnindex_change,
+            'bsi': bsi,
+            'ssi': ssi,
+            'rsi': rsi,
+            'signal': labels(signal),
+            'signal_t1': labels(t1),
+            'signal_t7': labels(t7),
+            'signal_t14': labels(t14),
+            f"drops_{window}d": drop_count,
+            'strongest_warning': labels(strongest),
+            'pattern_analysis': pattern,
+            'warning_progression': progression
+        }, index=pd.DatetimeIndex(engine.dates, name='date'))
+        
+        if start_date is not None or end_date is not None:
+            history = history.loc[start_date:end_date]
+        return history
+    
+    def backtest_arrays(self, start_date=None, end_date=None, panic_dates=None):
+        """Calendar labels, VNINDEX change, bsi/ssi/rsi and panic flags for a backtest period"""
+        engine = self.engine
+        calendar = self.calendar
+        start = calendar.count_before(start_date) if start_date is not None else 0
+        end = calendar.count_before(end_date) + (calendar.ordinal(end_date) is not None) if end_date is not None else len(calendar)
+        
+        j = engine.columns['VNINDEX']
+        vnindex_change = np.where(engine.valid[start:end, j], engine.change[start:end, j], np.nan)
+        indicators = engine.indicators.iloc[start:end]
+        
+        panic = np.zeros(end - start, dtype=bool)
+        for date in (VERIFIED_PANIC_DATES if panic_dates is None else panic_dates):
+            i = calendar.ordinal(date)
+            if i is not None and start <= i < end:
+                panic[i - start] = True
+        
+        return (calendar.labels[start:end], vnindex_change, indicators['bsi'].to_numpy(),
+                indicators['ssi'].to_numpy(), indicators['rsi'].to_numpy(), panic)
+    
+    def compute_backtest(self, start_date=None, end_date=None, panic_dates=None, horizon=14, breadth=False):
+        """Score classify_panic_type and classify_pre_panic_signal on every trading day
+        
+        Ground truth is the verified panic day list unless `panic_dates` is given. The panic
+        classifier is scored day by day; warning levels at or above each threshold are scored as
+        alarms for a panic within the next `horizon` trading days (see score_warnings).
+        With `breadth`, the warning classifier also takes market breadth as input.
+        """
+        if horizon < 1:
+            raise ValueError(f"The horizon must be at least 1 trading day, got {horizon}")
+        labels, vnindex_change, bsi, ssi, rsi, panic = self.backtest_arrays(start_date, end_date, panic_dates)
+        breadth = self.compute_breadth(start_date, end_date) if breadth else None
+        has_data = ~np.isnan(vnindex_change)
+        
+        def rate(numerator, denominator):
+            return float(numerator / denominator) if denominator else None
+        
+        def lead(value):
+            return None if np.isnan(value) else float(value)
+        
+        # Panic classifier: every non-NO_PANIC day, then each panic type on its own
+        panic_codes = classify_panic_codes(bsi, ssi, rsi, vnindex_change)
+        negatives = int((has_data & ~panic).sum())
+        panic_rules = [('ANY_PANIC', panic_codes > 0)] + [(name, panic_codes == code) for code, name in enumerate(PANIC_TYPES) if code > 0]
+        panic_scores = []
+        for rule, predicted in panic_rules:
+            true_positives = int((predicted & panic).sum())
+            false_positives = int((predicted & ~panic).sum())
+            panic_scores.append(ClassifierScore(
+                rule=rule,
+                predictions=int(predicted.sum()),
+                true_positives=true_positives,
+                false_positives=false_positives,
+                false_negatives=int(panic.sum()) - true_positives,
+                precision=rate(true_positives, true_positives + false_positives),
+                recall=rate(true_positives, panic.sum()),
+                false_positive_rate=rate(false_positives, negatives)
+            ))
+        
+        # Warning classifier: alarms at or above each warning level
+        warning_codes = np.where(has_data, classify_pre_panic_codes(bsi, ssi, rsi, vnindex_change, breadth=breadth), MISSING)
+        levels = [code for code in sorted(WARNING_LEVELS, reverse=True) if code > 0]
+        alarms = warning_codes[None, :] >= np.array(levels)[:, None]
+        scores = score_warnings(alarms, panic, horizon, has_data)
+        
+        warning_scores = []
+        missed_panics = {}
+        panic_positions = np.flatnonzero(panic)
+        for k, code in enumerate(levels):
+            rule = f"{WARNING_LEVELS[code]}+"
+            true_positives = int(scores['true_positives'][k])
+            false_positives = int(scores['false_positives'][k])
+            detected = int(scores['detected'][k])
+            warning_scores.append(ClassifierScore(
+                rule=rule,
+                predictions=int(scores['predictions'][k]),
+                true_positives=true_positives,
+                false_positives=false_positives,
+                false_negatives=int(scores['panics']) - detected,
+                precision=rate(true_positives, true_positives + false_positives),
+                recall=rate(detected, scores['panics']),
+                false_positive_rate=rate(false_positives, scores['negatives']),
+                mean_lead_days=lead(scores['mean_lead_days'][k]),
+                median_lead_days=lead(scores['median_lead_days'][k])
+            ))
+            
+            # Panic days with no alarm at this level in the preceding window
+            missed_panics[rule] = [labels[p] for p in panic_positions
+                                   if not alarms[k, max(p - horizon, 0):p].any()]
+        
+        return BacktestReport(
+            start_date=labels[0] if labels else start_date,
+            end_date=labels[-1] if labels else end_date,
+            trading_days=int(has_data.sum()),
+            panic_dates=[labels[p] for p in panic_positions],
+            horizon=horizon,
+            panic_classifier=panic_scores,
+            warning_classifier=warning_scores,
+            missed_panics=missed_panics
+        )
+    
+    def analyze_backtest(self, start_date=None, end_date=None, panic_dates=None, horizon=14, breadth=False):
+        """Backtest the panic and warning classifiers and render the scores"""
+        result = self.compute_backtest(start_date, end_date, panic_dates, horizon, breadth)
+        self.render('backtest', result)
+        return result
+    
+    def compute_similar_days(self, target_date, k=10, min_gap=FORWARD_HORIZONS[-1]):
+        """The `k` earlier trading days whose sector profile is closest to a date, with their forward returns
+        
+        See SimilarDayIndex.query for which days qualify. Returns None when the date is not a
+        trading day or lacks one of the SIMILARITY_FEATURES.
+        """
+        index = self.similarity_index
+        i = self.engine.row(target_date)
+        found = index.query(i, k, min_gap) if i is not None else None
+        if found is None:
+            return None
+        rows, distances = found
+        labels = self.calendar.labels
+        horizons = [f"{horizon}d" for horizon in FORWARD_HORIZONS]
+        
+        def values(names, row):
+            return {name: None if value != value else value for name, value in zip(names, row.tolist())}
+        
+        def summary(reduce):
+            forward = index.forward[rows]
+            known = ~np.isnan(forward)
+            return {name: float(reduce(forward[known[:, h], h])) if known[:, h].any() else None
+                    for h, name in enumerate(horizons)}
+        
+        analogues = []
+        for row, distance in zip(rows.tolist(), distances.tolist()):
+            features = values(SIMILARITY_FEATURES, index.features[row])
+            analogues.append(SimilarDay(
+                date=labels[row],
+                distance=distance,
+                features=features,
+                panic_type=self.classify_panic_type(features['bsi'], features['ssi'], features['rsi'],
+                                                    features['vnindex_change']),
+                forward_returns=values(horizons, index.forward[row])
+            ))
+        
+        return SimilarDaysAnalysis(
+            target_date=target_date,
+            features=values(SIMILARITY_FEATURES, index.features[i]),
+            forward_returns=values(horizons, index.forward[i]),
+            analogues=analogues,
+            mean_forward_returns=summary(np.mean),
+            median_forward_returns=summary(np.median)
+        )
+    
+    def compute_event_study(self, start_date=None, end_date=None, event_dates=None, panic_type=None,
+                            before=EVENT_WINDOW, after=EVENT_WINDOW):
+        """Mean, median and dispersion paths of VNINDEX and sector returns around a set of event days
+        
+        Events are `event_dates`, every trading day classify_panic_type puts in `panic_type`, or by
+        default the first day of every detected panic cluster (detect_panic_dates); only those from
+        `start_date` to `end_date` count, though their windows may reach outside. All windows are
+        cut from the calendar in one go (see event_windows), then summarized for all events ('ALL')
+        and for each panic type found on the event days.
+        Returns one row per (panic_type, offset) with offset -before..after trading days from the
+        event: `events` in the group, then for vnindex/bsi/ssi/rsi the mean, median and standard
+        deviation of the daily % change and of the cumulative % change since the close before the
+        event day (`<series>_cum_*`, 0 at offset -1; days without data count as unchanged).
+        """
+        engine = self.engine
+        calendar = self.calendar
+        j = engine.columns['VNINDEX']
+        vnindex_change = np.where(engine.valid[:, j], engine.change[:, j], np.nan)
+        bsi, ssi, rsi = (engine.indicators[name].to_numpy() for name in ('bsi', 'ssi', 'rsi'))
+        codes = classify_panic_codes(bsi, ssi, rsi, vnindex_change)
+        
+        if panic_type is not None:
+            if panic_type not in PANIC_TYPES:
+                raise ValueError(f"Unknown panic type: {panic_type} (expected: {', '.join(PANIC_TYPES)})")
+            events = np.flatnonzero(codes == PANIC_TYPES.index(panic_type))
+        else:
+            dates = self.detect_panic_dates() if event_dates is None else event_dates
+            events = np.array([i for i in map(calendar.ordinal, dates) if i is not None], dtype=np.intp)
+        start, end = calendar.span(start_date if start_date is not None else calendar.labels[0],
+                                   end_date if end_date is not None else calendar.labels[-1])
+        events = events[(events >= start) & (events < end)]
+        
+        windows = event_windows(np.column_stack([vnindex_change, bsi, ssi, rsi]), events, before, after)
+        
+        # Compound through each window from a level of 1 just before it, then re-anchor at T-1
+        levels = np.cumprod(1 + np.nan_to_num(windows) / 100, axis=1)
+        levels = np.concatenate([np.ones_like(levels[:, :1]), levels], axis=1)
+        cumulative = (levels[:, 1:] / levels[:, before:before + 1] - 1) * 100
+        cumulative[np.isnan(windows)] = np.nan
+        
+        groups = [('ALL', np.ones(len(events), dtype=bool))]
+        groups += [(name, codes[events] == code) for code, name in enumerate(PANIC_TYPES) if (codes[events] == code).any()]
+        
+        offsets = np.arange(-before, after + 1)
+        frames = []
+        for name, members in groups:
+            columns = {'events': np.full(len(offsets), members.sum())}
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning)  # offsets where no event in the group has data
+                for k, series in enumerate(('vnindex', 'bsi', 'ssi', 'rsi')):
+                    for suffix, values in (('', windows[members, :, k]), ('_cum', cumulative[members, :, k])):
+                        columns[f"{series}{suffix}_mean"] = np.nanmean(values, axis=0)
+                        columns[f"{series}{suffix}_median"] = np.nanmedian(values, axis=0)
+                        columns[f"{series}{suffix}_std"] = np.nanstd(values, axis=0, ddof=1)
+            frames.append(pd.DataFrame(columns, index=pd.MultiIndex.from_product([[name], offsets],
+                                                                                 names=['panic_type', 'offset'])))
+        return pd.concat(frames)
+    
+    def analyze_similar_days(self, target_date, k=10):
+        """Find and render the nearest historical analogues of a date"""
+        result = self.compute_similar_days(target_date, k)
+        self.render('similar_days', target_date, result)
+        return result
+    
+    def compute_threshold_sweep(self, classifier='warning', grid=None, start_date=None, end_date=None,
+                                panic_dates=None, horizon=14, level='EARLY_WARNING', rank_by='f1',
+                                jobs=1, chunk_size=512):
+        """Backtest every combination of a threshold grid and rank the results
+        
+        `grid` maps WARNING_THRESHOLDS (classifier='warning') or PANIC_THRESHOLDS ('panic') names
+        to candidate values; it defaults to SWEEP_GRIDS. Combinations are scored in chunks of
+        broadcast comparisons (see sweep_scores), fanned out over forked processes with jobs > 1.
+        Returns one row per combination, best first by `rank_by` then lowest false-positive rate.
+        """
+        if classifier not in ('warning', 'panic'):
+            raise ValueError(f"Unknown classifier: {classifier} (expected 'warning' or 'panic')")
+        defaults = WARNING_THRESHOLDS if classifier == 'warning' else PANIC_THRESHOLDS
+        grid = SWEEP_GRIDS[classifier] if grid is None else grid
+        unknown = [name for name in grid if name not in defaults]
+        if unknown:
+            raise ValueError(f"Unknown {classifier} thresholds: {', '.join(unknown)} (expected: {', '.join(defaults)})")
+        if not grid:
+            raise ValueError("The threshold grid is empty: give at least one threshold and its values")
+        empty = [name for name, values in grid.items() if len(values) == 0]
+        if empty:
+            raise ValueError(f"No values to sweep for: {', '.join(empty)}")
+        if level not in WARNING_PRIORITY or WARNING_PRIORITY[level] <= 0:
+            raise ValueError(f"Unknown warning level: {level}")
+        if rank_by not in ('precision', 'recall', 'f1', 'false_positive_rate', 'mean_lead_days'):
+            raise ValueError(f"Cannot rank by: {rank_by}")
+        if horizon < 1:
+            raise ValueError(f"The horizon must be at least 1 trading day, got {horizon}")
+        
+        _, vnindex_change, bsi, ssi, rsi, panic = self.backtest_arrays(start_date, end_date, panic_dates)
+        names = list(grid)
+        mesh = np.meshgrid(*[np.asarray(grid[name], dtype=float) for name in names], indexing='ij')
+        params = {name: values.ravel() for name, values in zip(names, mesh)}
+        combinations = len(params[names[0]]) if names else 0
+        
+        inputs = (classifier, (bsi, ssi, rsi, vnindex_change), panic, params, horizon, level)
+        bounds = [(i, min(i + chunk_size, combinations)) for i in range(0, combinations, chunk_size)]
+        import multiprocessing
+        if jobs > 1 and len(bounds) > 1 and 'fork' in multiprocessing.get_all_start_methods():
+            from concurrent.futures import ProcessPoolExecutor
+            global _sweep_inputs
+            _sweep_inputs = inputs
+            try:
+                context = multiprocessing.get_context('fork')
+                with ProcessPoolExecutor(max_workers=jobs, mp_context=context) as pool:
+                    chunks = list(pool.map(_sweep_chunk_in_worker, bounds))
+            finally:
+                _sweep_inputs = None
+        else:
+            chunks = [_sweep_chunk(inputs, bound) for bound in bounds]
+        
+        table = pd.DataFrame(params)
+        for metric in chunks[0] if chunks else ():
+            table[metric] = np.concatenate([chunk[metric] for chunk in chunks])
+        if classifier == 'panic':
+            table = table.drop(columns='mean_lead_days')
+        
+        ascending = rank_by == 'false_positive_rate'
+        table = table.sort_values([rank_by, 'false_positive_rate'], ascending=[ascending, True],
+                                  na_position='last', kind='stable', ignore_index=True)
+        table.index = pd.RangeIndex(1, len(table) + 1, name='rank')
+        return table
+    
+    def compute_panel(self, start_date=None, end_date=None):
+        """One row per trading day with everything the analyzer derives from market_data
+        
+        Columns: VNINDEX change and intraday drop, bsi/ssi/rsi, panic_type, pre_panic_signal,
+        `sector_<NAME>` for every ticker_group.json sector and `<TICKER>_change` /
+        `<TICKER>_intraday_drop` for every ticker, plus `year` for partitioning.
+        """
+        engine = self.engine
+        universe = self.universe_engine
+        j = engine.columns['VNINDEX']
+        vnindex_change = np.where(engine.valid[:, j], engine.change[:, j], np.nan)
+        bsi, ssi, rsi = (engine.indicators[name].to_numpy() for name in ('bsi', 'ssi', 'rsi'))
+        has_data = ~np.isnan(vnindex_change)
+        
+        panic_codes = classify_panic_codes(bsi, ssi, rsi, vnindex_change)
+        warning_codes = classify_pre_panic_codes(bsi, ssi, rsi, vnindex_change)
+        columns = {
+            'year': engine.dates.year.astype(np.int16),
+            'vnindex_change': vnindex_change,
+            'vnindex_intraday_drop': np.where(engine.valid[:, j], engine.intraday_drop[:, j], np.nan),
+            'bsi': bsi,
+            'ssi': ssi,
+            'rsi': rsi,
+            'panic_type': pd.Categorical.from_codes(panic_codes, PANIC_TYPES),
+            'pre_panic_signal': pd.Categorical(np.where(has_data, [WARNING_LEVELS[c] for c in warning_codes], None),
+                                               categories=list(WARNING_PRIORITY))
+        }
         
-        print(f"\n🎯 PANIC TYPE: {panic_type}")
+        sectors = self.group_engine.indicators
+        for name in self.sector_weights:
+            columns[f"sector_{name}"] = sectors[name].to_numpy()
         
-        # Trading Recommendations
-        trading_signals = {
-            "POSITIVE_PANIC": {
-                "signal": "🟢 BUY OPPORTUNITY",
-                "action": "Buy quality dips: VIC, SHS, TCB",
-                "avoid": "Avoid: NVL, MBS (high volatility)",
-                "watch": "Watch: VCB for stability confirmation"
-            },
-            "NEGATIVE_EXTREME": {
-                "signal": "🔴 EXTREME CAUTION", 
-                "action": "VCB ONLY + Maximum cash preservation",
-                "avoid": "Avoid: All other positions",
-                "watch": "Watch: Government intervention signals"
-            },
-            "NEGATIVE_MEDIUM": {
-                "signal": "🟡 DEFENSIVE MODE",
-                "action": "Hold cash + VCB defensive positions",
-                "avoid": "Avoid: Securities and Real Estate",
-                "watch": "Watch: Banking stabilization signals"
-            },
-            "NO_PANIC": {
-                "signal": "✅ NORMAL TRADING",
-                "action": "Normal sector rotation strategies",
-                "avoid": "No specific avoidance",
-                "watch": "Monitor for sector leadership changes"
-            }
-        }
+        valid = universe.valid
+        for ticker, k in universe.columns.items():
+            if ticker == universe.base_ticker:
+                continue
+            columns[f"{ticker}_change"] = np.where(valid[:, k], universe.change[:, k], np.nan)
+            columns[f"{ticker}_intraday_drop"] = np.where(valid[:, k], universe.intraday_drop[:, k], np.nan)
         
-        if panic_type in trading_signals:
-            signal_data = trading_signals[panic_type]
-            print(f"\n{signal_data['signal']}")
-            print(f"  Action: {signal_data['action']}")
-            print(f"  Avoid: {signal_data['avoid']}")
-            print(f"  Watch: {signal_data['watch']}")
-        
-        print("\n" + "=" * 60)
-        print("📋 WORKBOOK UPDATE DATA")
-        print("=" * 60)
-        print(f"""
-**Sector Performance (VERIFIED DATA):**
-- **VNINDEX:** {vnindex_data['prev_close']:.2f} → {vnindex_data['target_close']:.2f} ({vnindex_drop:+.2f}%)
-- **Intraday Low:** {vnindex_data['target_low']:.2f} ({vnindex_data['intraday_drop']:+.2f}%)
-
-**Market Cap-Based Sector Indicators:**
-- **Banking Indicator:** {bsi:+.2f}% ({len(banking_valid)}/5 tickers)
-- **Securities Indicator:** {ssi:+.2f}% ({len(securities_valid)}/5 tickers)  
-- **Real Estate Indicator:** {rsi:+.2f}% ({len(realestate_valid)}/5 tickers)
+        panel = pd.DataFrame(columns, index=pd.DatetimeIndex(engine.dates, name='date'))
+        if start_date is not None or end_date is not None:
+            panel = panel.loc[start_date:end_date]
+        return panel
+    
+    def analyze_all_pre_panic_patterns(self, jobs=1, panic_dates=None):
+        """Analyze pre-panic patterns for all detected (or the given) panic days, using up to `jobs` workers"""
+        result = self.compute_all_pre_panic_patterns(jobs, panic_dates)
+        self.render('all_pre_panic', result)
+        return result
 
-**Panic Classification:** {panic_type}
+# Trading recommendations shown for each panic type
+PANIC_TRADING_SIGNALS = {
+    "POSITIVE_PANIC": {
+        "signal": "🟢 BUY OPPORTUNITY",
+        "action": "Buy quality dips: VIC, SHS, TCB",
+        "avoid": "Avoid: NVL, MBS (high volatility)",
+        "watch": "Watch: VCB for stability confirmation"
+    },
+    "NEGATIVE_EXTREME": {
+        "signal": "🔴 EXTREME CAUTION",
+        "action": "VCB ONLY + Maximum cash preservation",
+        "avoid": "Avoid: All other positions",
+        "watch": "Watch: Government intervention signals"
+    },
+    "NEGATIVE_MEDIUM": {
+        "signal": "🟡 DEFENSIVE MODE",
+        "action": "Hold cash + VCB defensive positions",
+        "avoid": "Avoid: Securities and Real Estate",
+        "watch": "Watch: Banking stabilization signals"
+    },
+    "NO_PANIC": {
+        "signal": "✅ NORMAL TRADING",
+        "action": "Normal sector rotation strategies",
+        "avoid": "No specific avoidance",
+        "watch": "Monitor for sector leadership changes"
+    }
+}
 
-**Individual Stock Performance:**
-Banking: {', '.join([f"{t} {all_data[t]['change']:+.1f}%" for t in banking_valid])}
-Securities: {', '.join([f"{t} {all_data[t]['change']:+.1f}%" for t in securities_valid])}
-Real Estate: {', '.join([f"{t} {all_data[t]['change']:+.1f}%" for t in realestate_valid])}
-""")
+class TextRenderer:
+    """Console report with the emoji layout used since the first version of this tool"""
+    
+    def __init__(self, analyzer):
+        self.analyzer = analyzer
+    
+    def _sector_lines(self, title, indicator_name, weights, all_data, value):
+        lines = [f"\n{title}"]
+        for ticker, weight in weights.items():
+            if ticker in all_data:
+                change = all_data[ticker].change
+                contribution = change * weight
+                lines.append(f"  {ticker}: {change:+.2f}% (weight: {weight:.2f}, contrib: {contribution:+.3f}%)")
+            else:
+                lines.append(f"  {ticker}: NO DATA (weight: {weight:.2f})")
+        
+        if value is not None:
+            lines.append(f"  🎯 {indicator_name} Indicator: {value:+.2f}%")
+        else:
+            lines.append(f"  ❌ {indicator_name} Indicator: Cannot calculate (insufficient data)")
+        return lines
     
-    def get_date_data(self, target_date):
-        """Get market data for a single date without printing"""
-        all_data = {}
-        for ticker in self.all_tickers:
-            data = self.load_ticker_data(ticker)
-            if not data.empty:
-                change = self.get_price_change(data, target_date)
-                if change:
-                    all_data[ticker] = change
+    @staticmethod
+    def _risk_line(label, risk):
+        def value(x, fmt):
+            return "n/a" if x is None else format(x, fmt)
+        return (f"  {label}: {value(risk.volatility, '.2f')}% | {value(risk.atr, '.2f')} | "
+                f"{value(risk.drawdown, '+.2f')}% | {risk.down_streak} days")
+    
+    def render_date(self, target_date, data):
+        analyzer = self.analyzer
+        lines = [f"🔍 Analyzing Vietnamese Market for {target_date}", "=" * 60]
         
-        if 'VNINDEX' not in all_data:
-            return None
-            
-        vnindex_data = all_data['VNINDEX']
-        vnindex_drop = vnindex_data['change']
+        # Check if we have VNINDEX data
+        if data is None:
+            lines.append("❌ ERROR: VNINDEX data not found for this date")
+            return "\n".join(lines)
+        
+        all_data = data.all_data
+        vnindex_data = data.vnindex_data
+        vnindex_drop = data.vnindex_change
+        bsi, banking_valid = data.bsi, data.banking_valid
+        ssi, securities_valid = data.ssi, data.securities_valid
+        rsi, realestate_valid = data.rsi, data.realestate_valid
+        panic_type = data.panic_type
+        
+        lines.append(f"📊 VNINDEX: {vnindex_data.prev_close:.2f} → {vnindex_data.target_close:.2f} ({vnindex_drop:+.2f}%)")
+        lines.append(f"📉 Intraday Low: {vnindex_data.target_low:.2f} ({vnindex_data.intraday_drop:+.2f}%)")
+        lines.append(f"📈 Volume: {vnindex_data.volume:,}")
         
-        # Calculate sector indicators
-        banking_changes = {k: all_data.get(k) for k in self.banking_weights.keys()}
-        bsi, banking_valid = self.calculate_sector_indicator(banking_changes, self.banking_weights)
+        if abs(vnindex_drop) >= 3.0:
+            lines.append(f"🚨 PANIC DAY DETECTED: {vnindex_drop:.2f}% drop!")
+        else:
+            lines.append(f"✅ Normal trading day: {vnindex_drop:.2f}% change")
         
-        securities_changes = {k: all_data.get(k) for k in self.securities_weights.keys()}
-        ssi, securities_valid = self.calculate_sector_indicator(securities_changes, self.securities_weights)
+        lines += ["\n" + "=" * 60, "📈 SECTOR ANALYSIS", "=" * 60]
+        weights = analyzer.weights_on(target_date)
+        lines += self._sector_lines("🏦 BANKING SECTOR:", "Banking", weights['bsi'], all_data, bsi)
+        lines += self._sector_lines("📊 SECURITIES SECTOR:", "Securities", weights['ssi'], all_data, ssi)
+        lines += self._sector_lines("🏠 REAL ESTATE SECTOR:", "Real Estate", weights['rsi'], all_data, rsi)
         
-        realestate_changes = {k: all_data.get(k) for k in self.realestate_weights.keys()}
-        rsi, realestate_valid = self.calculate_sector_indicator(realestate_changes, self.realestate_weights)
+        # Panic Classification
+        lines += ["\n" + "=" * 60, "🎯 PANIC CLASSIFICATION", "=" * 60]
         
-        panic_type = self.classify_panic_type(bsi, ssi, rsi, vnindex_drop)
+        lines.append(f"\n📊 SECTOR INDICATORS SUMMARY:")
+        if bsi is not None:
+            lines.append(f"  Banking Indicator: {bsi:+.2f}% (based on {len(banking_valid)} tickers)")
+        if ssi is not None:
+            lines.append(f"  Securities Indicator: {ssi:+.2f}% (based on {len(securities_valid)} tickers)")
+        if rsi is not None:
+            lines.append(f"  Real Estate Indicator: {rsi:+.2f}% (based on {len(realestate_valid)} tickers)")
         
-        return {
-            'date': target_date,
-            'vnindex_change': vnindex_drop,
-            'vnindex_data': vnindex_data,
-            'bsi': bsi,
-            'ssi': ssi,
-            'rsi': rsi,
-            'panic_type': panic_type,
-            'all_data': all_data,
-            'banking_valid': banking_valid,
-            'securities_valid': securities_valid,
-            'realestate_valid': realestate_valid
-        }
-    
-    def analyze_date_range(self, start_date, end_date):
-        """Analyze a range of dates and identify market patterns"""
-        print(f"🔍 Analyzing Vietnamese Market from {start_date} to {end_date}")
-        print("=" * 80)
+        lines.append(f"\n📉 RISK CONTEXT ({RISK_WINDOWS['volatility']}-day volatility | {RISK_WINDOWS['atr']}-day ATR | drawdown | down streak):")
+        for name, label in (('VNINDEX', 'VNINDEX'), ('bsi', 'Banking'), ('ssi', 'Securities'), ('rsi', 'Real Estate')):
+            lines.append(self._risk_line(label, data.risk[name]))
+        
+        lines.append(f"\n🎯 PANIC TYPE: {panic_type}")
         
-        current_date = pd.to_datetime(start_date)
-        end_date = pd.to_datetime(end_date)
+        # Trading Recommendations
+        if panic_type in PANIC_TRADING_SIGNALS:
+            signal_data = PANIC_TRADING_SIGNALS[panic_type]
+            lines.append(f"\n{signal_data['signal']}")
+            lines.append(f"  Action: {signal_data['action']}")
+            lines.append(f"  Avoid: {signal_data['avoid']}")
+            lines.append(f"  Watch: {signal_data['watch']}")
+        
+        lines += ["\n" + "=" * 60, "📋 WORKBOOK UPDATE DATA", "=" * 60]
+        lines.append(workbook_update_block(data))
+        return "\n".join(lines)
+    
+    def render_pre_panic(self, result):
+        pre_panic_signals = result.pre_panic_signals
+        significant_drops = result.significant_drops
         
-        results = []
-        panic_days = []
-        banking_stabilization_days = []
-        securities_recovery_days = []
+        lines = [f"🚨 PRE-PANIC ANALYSIS for {result.panic_date}", "=" * 80]
+        lines += [f"\n📊 SCANNING ALL 14 DAYS BEFORE PANIC FOR ≥2% DROPS:", "=" * 60]
         
-        # Analyze each date
-        while current_date <= end_date:
-            date_str = current_date.strftime('%Y-%m-%d')
-            data = self.get_date_data(date_str)
-            
-            if data:
-                results.append(data)
-                
-                # Identify panic days
-                if abs(data['vnindex_change']) >= 3.0:
-                    panic_days.append(data)
-                    print(f"🚨 PANIC DAY: {date_str} ({data['vnindex_change']:+.2f}%)")
-                
-                # Identify banking stabilization (BSI positive after recent panic)
-                elif data['bsi'] is not None and data['bsi'] > 1.0:
-                    # Check if there was a panic in the last 5 days
-                    recent_panic = any(
-                        abs(r['vnindex_change']) >= 3.0 
-                        for r in results[-5:] 
-                        if r['date'] != date_str
-                    )
-                    if recent_panic:
-                        banking_stabilization_days.append(data)
-                        print(f"🏦 BANKING STABILIZATION: {date_str} (BSI: {data['bsi']:+.2f}%)")
-                
-                # Identify securities recovery (SSI outperforming after banking stabilization)
-                elif data['ssi'] is not None and data['vnindex_change'] > 0 and data['ssi'] > data['vnindex_change'] + 1.0:
-                    # Check if there was banking stabilization in the last 3 days
-                    recent_banking_stab = any(
-                        r['bsi'] is not None and r['bsi'] > 1.0 
-                        for r in results[-3:] 
-                        if r['date'] != date_str
-                    )
-                    if recent_banking_stab:
-                        securities_recovery_days.append(data)
-                        print(f"📈 SECURITIES RECOVERY: {date_str} (SSI: {data['ssi']:+.2f}% vs VNINDEX: {data['vnindex_change']:+.2f}%)")
-            
-            current_date += timedelta(days=1)
+        for drop in significant_drops:
+            lines.append(f"   📉 T-{drop.days_before} ({drop.date}): VNINDEX {drop.vnindex_change:+.2f}% → {drop.signal}")
+            lines.append(f"       🏦 Banking: {drop.bsi:+.2f}% | 📊 Securities: {drop.ssi:+.2f}% | 🏠 Real Estate: {drop.rsi:+.2f}%")
         
-        print("\n" + "=" * 80)
-        print("📊 CYCLE ANALYSIS SUMMARY")
-        print("=" * 80)
-        print(f"📅 Period: {start_date} to {end_date}")
-        print(f"🚨 Panic Days Found: {len(panic_days)}")
-        print(f"🏦 Banking Stabilization Days: {len(banking_stabilization_days)}")
-        print(f"📈 Securities Recovery Days: {len(securities_recovery_days)}")
+        if not significant_drops:
+            lines.append(f"   ✅ No significant drops (≥2%) found in 14 days before panic")
+        else:
+            lines.append(f"   🚨 Found {len(significant_drops)} significant drop(s) in pre-panic period")
         
-        return {
-            'panic_days': panic_days,
-            'banking_stabilization': banking_stabilization_days,
-            'securities_recovery': securities_recovery_days,
-            'all_results': results
-        }
-    
-    def analyze_complete_cycle(self, start_date, end_date):
-        """Identify complete panic-to-recovery cycles"""
-        print(f"🔄 COMPLETE CYCLE ANALYSIS: {start_date} to {end_date}")
-        print("=" * 80)
+        for timeframe, data in pre_panic_signals.items():
+            lines.append(f"\n📅 {timeframe} ({data.date}): VNINDEX {data.vnindex_change:+.2f}%")
+            lines.append(f"   🏦 Banking: {data.bsi:+.2f}% | 📊 Securities: {data.ssi:+.2f}% | 🏠 Real Estate: {data.rsi:+.2f}%")
+            lines.append(f"   🚨 Pre-Panic Signal: {data.signal}")
         
-        cycle_data = self.analyze_date_range(start_date, end_date)
+        # Analyze pre-panic pattern development
+        lines += [f"\n" + "=" * 80, f"📊 PRE-PANIC PATTERN SUMMARY", "=" * 80]
         
-        # Find complete cycles
-        cycles = []
-        for panic in cycle_data['panic_days']:
-            panic_date = pd.to_datetime(panic['date'])
-            
-            # Look for banking stabilization within 5 days
-            banking_stab = None
-            for stab in cycle_data['banking_stabilization']:
-                stab_date = pd.to_datetime(stab['date'])
-                if panic_date < stab_date <= panic_date + timedelta(days=5):
-                    banking_stab = stab
-                    break
-            
-            if banking_stab:
-                stab_date = pd.to_datetime(banking_stab['date'])
-                
-                # Look for securities recovery within 3 days of banking stabilization
-                securities_recovery = []
-                for recovery in cycle_data['securities_recovery']:
-                    recovery_date = pd.to_datetime(recovery['date'])
-                    if stab_date < recovery_date <= stab_date + timedelta(days=3):
-                        securities_recovery.append(recovery)
-                
-                if securities_recovery:
-                    cycles.append({
-                        'panic': panic,
-                        'banking_stabilization': banking_stab,
-                        'securities_recovery': securities_recovery
-                    })
-                    
-                    print(f"\n🔄 COMPLETE CYCLE FOUND:")
-                    print(f"   🚨 Panic: {panic['date']} ({panic['vnindex_change']:+.2f}%)")
-                    print(f"   🏦 Banking Stabilization: {banking_stab['date']} (BSI: {banking_stab['bsi']:+.2f}%)")
-                    print(f"   📈 Securities Recovery: {len(securities_recovery)} days")
-                    for recovery in securities_recovery:
-                        print(f"      📈 {recovery['date']} (SSI: {recovery['ssi']:+.2f}%)")
-        
-        print(f"\n🎯 FOUND {len(cycles)} COMPLETE CYCLES")
-        return cycles
-    
-    def analyze_all_pre_panic_patterns(self):
-        """Analyze pre-panic patterns for all 46 verified panic days"""
-        # All 46 verified panic days from workbook
-        panic_dates = [
-            # 2018 (6 panic days)
-            '2018-02-05', '2018-02-06', '2018-02-09', '2018-04-19', 
-            '2018-05-22', '2018-05-28', '2018-10-11',
-            
-            # 2020 (10 panic days) 
-            '2020-01-30', '2020-02-24', '2020-03-09', '2020-03-12',
-            '2020-03-13', '2020-03-19', '2020-03-23', '2020-03-30',
-            '2020-04-21',
+        if result.has_warning_signals:
+            lines.append(f"🎯 STRONGEST WARNING: {result.strongest_warning}")
             
-            # 2021 (4 panic days)
-            '2021-01-19', '2021-01-26', '2021-01-28', '2021-02-08',
-            '2021-07-12', '2021-07-19',
-            
-            # 2022 (8 panic days)
-            '2022-04-25', '2022-05-09', '2022-05-12', '2022-05-13',
-            '2022-06-13', '2022-09-26', '2022-10-07', '2022-10-21',
-            '2022-10-24', '2022-11-04', '2022-11-10', '2022-12-06',
+            if significant_drops:
+                lines.append(f"📉 SIGNIFICANT DROPS DETECTED: {len(significant_drops)} drops ≥2% in 14-day period")
+                most_recent_drop = min(significant_drops, key=lambda x: x.days_before)
+                lines.append(f"   Most Recent: T-{most_recent_drop.days_before} ({most_recent_drop.date}) {most_recent_drop.vnindex_change:+.2f}%")
             
-            # 2023 (2 panic days)
-            '2023-08-18', '2023-10-26',
+            lines.append(f"📈 PATTERN DEVELOPMENT: {result.pattern_analysis}")
             
-            # 2024 (1 panic day)
-            '2024-04-15',
+            # Enhanced trading recommendations considering all signals
+            trading_advice = result.trading_advice
+            lines.append(f"\n💡 TRADING RECOMMENDATIONS:")
+            lines.append(f"   🎯 Action: {trading_advice['action']}")
+            lines.append(f"   ⚠️  Risk Level: {trading_advice['risk_level']}")
+            lines.append(f"   📊 Position Size: {trading_advice['position_size']}")
+            lines.append(f"   🛡️  Defensive Stocks: {trading_advice['defensive_stocks']}")
             
-            # 2025 (4 panic days)
-            '2025-04-03', '2025-04-08', '2025-04-09', '2025-07-29'
-        ]
-        
-        print(f"🚨 COMPREHENSIVE PRE-PANIC ANALYSIS")
-        print(f"Analyzing warning patterns for all {len(panic_dates)} verified panic days")
-        print("=" * 100)
-        
-        all_pre_panic_data = {}
-        signal_summary = {
-            'STRONG_WARNING': 0,
-            'MODERATE_WARNING': 0, 
-            'EARLY_WARNING': 0,
-            'DEVELOPING_WEAKNESS': 0,
-            'NO_WARNING': 0,
-            'INSUFFICIENT_DATA': 0
-        }
+            if significant_drops:
+                lines.append(f"\n⚡ ENHANCED ANALYSIS:")
+                lines.append(f"   📊 Pre-Panic Drops: Found {len(significant_drops)} significant weakness event(s)")
+                lines.append(f"   🎯 Risk Elevation: Significant drops increase panic probability")
+        else:
+            lines.append(f"🎯 STRONGEST WARNING: NO_WARNING")
+            lines.append(f"📈 PATTERN DEVELOPMENT: NO_SIGNALS_DETECTED")
+            lines.append(f"\n💡 TRADING RECOMMENDATIONS:")
+            lines.append(f"   🎯 Action: Normal trading strategies")
+            lines.append(f"   ⚠️  Risk Level: LOW - No warning signals detected")
+        return "\n".join(lines)
+    
+    def render_range(self, result):
+        lines = [f"🔍 Analyzing Vietnamese Market from {result.start_date} to {result.end_date}", "=" * 80]
+        
+        # Each day is in at most one list, so merging by date restores the scan order
+        events = ([(d.date, 'panic', d) for d in result.panic_days] +
+                  [(d.date, 'banking', d) for d in result.banking_stabilization] +
+                  [(d.date, 'securities', d) for d in result.securities_recovery])
+        for date_str, kind, data in sorted(events, key=lambda event: event[0]):
+            if kind == 'panic':
+                lines.append(f"🚨 PANIC DAY: {date_str} ({data.vnindex_change:+.2f}%)")
+            elif kind == 'banking':
+                lines.append(f"🏦 BANKING STABILIZATION: {date_str} (BSI: {data.bsi:+.2f}%)")
+            else:
+                lines.append(f"📈 SECURITIES RECOVERY: {date_str} (SSI: {data.ssi:+.2f}% vs VNINDEX: {data.vnindex_change:+.2f}%)")
+        
+        lines += ["\n" + "=" * 80, "📊 CYCLE ANALYSIS SUMMARY", "=" * 80]
+        lines.append(f"📅 Period: {result.start_date} to {result.end_date}")
+        lines.append(f"🚨 Panic Days Found: {len(result.panic_days)}")
+        lines.append(f"🏦 Banking Stabilization Days: {len(result.banking_stabilization)}")
+        lines.append(f"📈 Securities Recovery Days: {len(result.securities_recovery)}")
+        return "\n".join(lines)
+    
+    def render_cycle(self, result):
+        lines = [f"🔄 COMPLETE CYCLE ANALYSIS: {result.start_date} to {result.end_date}", "=" * 80]
+        lines.append(self.render_range(result.range_analysis))
+        
+        for cycle in result.cycles:
+            lines.append(f"\n🔄 COMPLETE CYCLE FOUND:")
+            lines.append(f"   🚨 Panic: {cycle.panic.date} ({cycle.panic.vnindex_change:+.2f}%)")
+            lines.append(f"   🏦 Banking Stabilization: {cycle.banking_stabilization.date} (BSI: {cycle.banking_stabilization.bsi:+.2f}%)")
+            lines.append(f"   📈 Securities Recovery: {len(cycle.securities_recovery)} days")
+            for recovery in cycle.securities_recovery:
+                lines.append(f"      📈 {recovery.date} (SSI: {recovery.ssi:+.2f}%)")
+        
+        lines.append(f"\n🎯 FOUND {len(result.cycles)} COMPLETE CYCLES")
+        return "\n".join(lines)
+    
+    def render_all_pre_panic(self, result):
+        panic_dates = result.panic_dates
+        lines = [f"🚨 COMPREHENSIVE PRE-PANIC ANALYSIS",
+                 f"Analyzing warning patterns for all {len(panic_dates)} panic days",
+                 "=" * 100]
         
         for i, panic_date in enumerate(panic_dates, 1):
-            print(f"\n[{i}/{len(panic_dates)}] Analyzing {panic_date}...")
+            lines.append(f"\n[{i}/{len(panic_dates)}] Analyzing {panic_date}...")
+            if panic_date in result.errors:
+                lines.append(f"❌ Error analyzing {panic_date}: {result.errors[panic_date]}")
+                continue
             try:
-                pre_panic_signals = self.analyze_pre_panic_pattern(panic_date)
-                all_pre_panic_data[panic_date] = pre_panic_signals
-                
-                # Count warning signals
-                if pre_panic_signals:
-                    warning_levels = [data['signal'] for data in pre_panic_signals.values()]
-                    strongest_warning = self.get_strongest_warning(warning_levels)
-                    signal_summary[strongest_warning] += 1
-                
+                lines.append(self.render_pre_panic(result.results[panic_date]))
             except Exception as e:
-                print(f"❌ Error analyzing {panic_date}: {e}")
-                signal_summary['INSUFFICIENT_DATA'] += 1
-                continue
+                lines.append(f"❌ Error analyzing {panic_date}: {e}")
         
         # Generate comprehensive summary
-        print(f"\n" + "=" * 100)
-        print(f"📊 COMPREHENSIVE PRE-PANIC WARNING SYSTEM ANALYSIS")
-        print("=" * 100)
+        lines += [f"\n" + "=" * 100, f"📊 COMPREHENSIVE PRE-PANIC WARNING SYSTEM ANALYSIS", "=" * 100]
         
-        print(f"\n🎯 WARNING SIGNAL DISTRIBUTION:")
-        total_analyzed = sum(signal_summary.values())
-        for signal, count in signal_summary.items():
+        lines.append(f"\n🎯 WARNING SIGNAL DISTRIBUTION:")
+        total_analyzed = result.total_analyzed
+        for signal, count in result.signal_summary.items():
             percentage = (count / total_analyzed) * 100 if total_analyzed > 0 else 0
-            print(f"   {signal}: {count} occurrences ({percentage:.1f}%)")
-        
-        # Calculate warning system effectiveness
-        predictive_signals = signal_summary['STRONG_WARNING'] + signal_summary['MODERATE_WARNING'] + signal_summary['EARLY_WARNING']
-        effectiveness = (predictive_signals / total_analyzed) * 100 if total_analyzed > 0 else 0
+            lines.append(f"   {signal}: {count} occurrences ({percentage:.1f}%)")
         
-        print(f"\n📈 PRE-PANIC WARNING SYSTEM EFFECTIVENESS:")
-        print(f"   Total Panic Days Analyzed: {total_analyzed}")
-        print(f"   Days with Predictive Warnings: {predictive_signals}")
-        print(f"   Warning System Effectiveness: {effectiveness:.1f}%")
+        effectiveness = result.effectiveness
+        lines.append(f"\n📈 PRE-PANIC WARNING SYSTEM EFFECTIVENESS:")
+        lines.append(f"   Total Panic Days Analyzed: {total_analyzed}")
+        lines.append(f"   Days with Predictive Warnings: {result.predictive_signals}")
+        lines.append(f"   Warning System Effectiveness: {effectiveness:.1f}%")
         
         # Trading system recommendations
-        print(f"\n💡 PRE-PANIC TRADING SYSTEM INSIGHTS:")
+        lines.append(f"\n💡 PRE-PANIC TRADING SYSTEM INSIGHTS:")
         if effectiveness >= 70:
-            print(f"   🟢 EXCELLENT: {effectiveness:.1f}% effectiveness - Highly reliable warning system")
+            lines.append(f"   🟢 EXCELLENT: {effectiveness:.1f}% effectiveness - Highly reliable warning system")
         elif effectiveness >= 50:
-            print(f"   🟡 GOOD: {effectiveness:.1f}% effectiveness - Reliable with careful monitoring")
+            lines.append(f"   🟡 GOOD: {effectiveness:.1f}% effectiveness - Reliable with careful monitoring")
+        else:
+            lines.append(f"   🔴 LIMITED: {effectiveness:.1f}% effectiveness - Use with other indicators")
+        return "\n".join(lines)
+    
+    def render_backtest(self, result):
+        lines = [f"🧪 CLASSIFIER BACKTEST: {result.start_date} to {result.end_date}",
+                 f"{result.trading_days} trading days, {len(result.panic_dates)} panic days, "
+                 f"{result.horizon}-day warning horizon",
+                 "=" * 100]
+        
+        lines.append(f"\n🚨 PANIC CLASSIFIER (day of panic):")
+        for score in result.panic_classifier:
+            lines.append(f"   {score.rule:<22} {score.predictions:>4} days | hits {score.true_positives:>3} | "
+                         f"false alarms {score.false_positives:>3} | precision {_ratio(score.precision)} | "
+                         f"recall {_ratio(score.recall)} | FPR {_ratio(score.false_positive_rate)}")
+        
+        lines.append(f"\n⚠️ PRE-PANIC WARNING CLASSIFIER (alarm within {result.horizon} trading days before a panic):")
+        for score in result.warning_classifier:
+            lead = "n/a" if score.mean_lead_days is None else f"{score.mean_lead_days:.1f}d (median {score.median_lead_days:.1f}d)"
+            lines.append(f"   {score.rule:<22} {score.predictions:>4} alarms | true {score.true_positives:>3} | "
+                         f"false {score.false_positives:>3} | precision {_ratio(score.precision)} | "
+                         f"recall {_ratio(score.recall)} | FPR {_ratio(score.false_positive_rate)} | lead {lead}")
+        
+        lines.append(f"\n❌ PANICS WITHOUT A PRIOR ALARM:")
+        for rule, dates in result.missed_panics.items():
+            lines.append(f"   {rule}: {', '.join(dates) if dates else 'none'}")
+        return "\n".join(lines)
+    
+    def render_similar_days(self, target_date, result):
+        lines = [f"🔎 SIMILAR DAYS: {target_date}", "=" * 100]
+        if result is None:
+            lines.append("❌ ERROR: No trading day with complete VNINDEX, sector and volume data on this date")
+            return "\n".join(lines)
+        
+        features = result.features
+        lines.append(f"📊 VNINDEX {_pct(features['vnindex_change'])} (intraday {_pct(features['intraday_drop'])}) | "
+                     f"Banking {_pct(features['bsi'])} | Securities {_pct(features['ssi'])} | "
+                     f"Real Estate {_pct(features['rsi'])} | Volume {features['volume_ratio']:.2f}x "
+                     f"its {VOLUME_RATIO_WINDOW}-day average")
+        lines.append("📅 VNINDEX afterwards: " + " | ".join(f"{horizon} {_pct(value)}"
+                                                              for horizon, value in result.forward_returns.items()))
+        
+        lines.append(f"\n🕰️ NEAREST {len(result.analogues)} HISTORICAL ANALOGUES:")
+        for rank, day in enumerate(result.analogues, 1):
+            f = day.features
+            forward = " ".join(f"{horizon} {_pct(value):>8}" for horizon, value in day.forward_returns.items())
+            lines.append(f"   {rank:>2}. {day.date} (distance {day.distance:.2f}) VNINDEX {_pct(f['vnindex_change']):>7} | "
+                         f"BSI {_pct(f['bsi']):>7} | SSI {_pct(f['ssi']):>7} | RSI {_pct(f['rsi']):>7} | "
+                         f"Vol {f['volume_ratio']:.2f}x | {day.panic_type:<16} → {forward}")
+        
+        lines.append(f"\n📈 VNINDEX AFTER THE ANALOGUES (mean | median):")
+        for horizon, mean in result.mean_forward_returns.items():
+            lines.append(f"   {horizon:>3}: {_pct(mean)} | {_pct(result.median_forward_returns[horizon])}")
+        return "\n".join(lines)
+            
+def workbook_update_block(data):
+    """The 'WORKBOOK UPDATE DATA' Markdown block for one analyzed date"""
+    all_data = data.all_data
+    vnindex_data = data.vnindex_data
+    return f"""
+**Sector Performance (VERIFIED DATA):**
+- **VNINDEX:** {vnindex_data.prev_close:.2f} → {vnindex_data.target_close:.2f} ({data.vnindex_change:+.2f}%)
+- **Intraday Low:** {vnindex_data.target_low:.2f} ({vnindex_data.intraday_drop:+.2f}%)
+
+**Market Cap-Based Sector Indicators:**
+- **Banking Indicator:** {data.bsi:+.2f}% ({len(data.banking_valid)}/5 tickers)
+- **Securities Indicator:** {data.ssi:+.2f}% ({len(data.securities_valid)}/5 tickers)  
+- **Real Estate Indicator:** {data.rsi:+.2f}% ({len(data.realestate_valid)}/5 tickers)
+
+**Panic Classification:** {data.panic_type}
+
+**Individual Stock Performance:**
+Banking: {', '.join([f"{t} {all_data[t].change:+.1f}%" for t in data.banking_valid])}
+Securities: {', '.join([f"{t} {all_data[t].change:+.1f}%" for t in data.securities_valid])}
+Real Estate: {', '.join([f"{t} {all_data[t].change:+.1f}%" for t in data.realestate_valid])}
+"""
+
+def _pct(value):
+    return "n/a" if value is None else f"{value:+.2f}%"
+
+def _ratio(value):
+    return "  n/a" if value is None else f"{value * 100:5.1f}%"
+
+class MarkdownRenderer:
+    """Workbook-ready Markdown, built around the 'WORKBOOK UPDATE DATA' block"""
+    
+    def __init__(self, analyzer):
+        self.analyzer = analyzer
+    
+    def render_date(self, target_date, data):
+        if data is None:
+            return f"### {target_date}\n\nNo VNINDEX data for this date."
+        return f"### {target_date}\n" + workbook_update_block(data)
+    
+    def render_pre_panic(self, result):
+        lines = [f"### Pre-Panic Analysis: {result.panic_date}", "",
+                 "| Day | Date | VNINDEX | Banking | Securities | Real Estate | Signal |",
+                 "|---|---|---|---|---|---|---|"]
+        for timeframe, data in result.pre_panic_signals.items():
+            lines.append(f"| {timeframe} | {data.date} | {_pct(data.vnindex_change)} | {_pct(data.bsi)} | "
+                         f"{_pct(data.ssi)} | {_pct(data.rsi)} | {data.signal} |")
+        for drop in result.significant_drops:
+            lines.append(f"| ≥2% drop T-{drop.days_before} | {drop.date} | {_pct(drop.vnindex_change)} | {_pct(drop.bsi)} | "
+                         f"{_pct(drop.ssi)} | {_pct(drop.rsi)} | {drop.signal} |")
+        lines += ["",
+                  f"**Strongest Warning:** {result.strongest_warning}",
+                  f"**Pattern Development:** {result.pattern_analysis}",
+                  f"**Action:** {result.trading_advice['action']}"]
+        return "\n".join(lines)
+    
+    def _day_rows(self, days, label):
+        return [f"| {d.date} | {label} | {_pct(d.vnindex_change)} | {_pct(d.bsi)} | {_pct(d.ssi)} | {_pct(d.rsi)} | {d.panic_type} |"
+                for d in days]
+    
+    def render_range(self, result):
+        rows = (self._day_rows(result.panic_days, 'Panic') +
+                self._day_rows(result.banking_stabilization, 'Banking stabilization') +
+                self._day_rows(result.securities_recovery, 'Securities recovery'))
+        lines = [f"### Market Cycle: {result.start_date} to {result.end_date}", "",
+                 "| Date | Event | VNINDEX | Banking | Securities | Real Estate | Panic Type |",
+                 "|---|---|---|---|---|---|---|"]
+        lines += sorted(rows)
+        lines += ["",
+                  f"**Panic Days:** {len(result.panic_days)} | "
+                  f"**Banking Stabilization Days:** {len(result.banking_stabilization)} | "
+                  f"**Securities Recovery Days:** {len(result.securities_recovery)}"]
+        return "\n".join(lines)
+    
+    def render_cycle(self, result):
+        lines = [self.render_range(result.range_analysis), "", f"**Complete Cycles:** {len(result.cycles)}"]
+        for cycle in result.cycles:
+            recoveries = ", ".join(f"{r.date} (SSI {_pct(r.ssi)})" for r in cycle.securities_recovery)
+            lines.append(f"- Panic {cycle.panic.date} ({_pct(cycle.panic.vnindex_change)}) → "
+                         f"banking stabilization {cycle.banking_stabilization.date} (BSI {_pct(cycle.banking_stabilization.bsi)}) → "
+                         f"securities recovery {recoveries}")
+        return "\n".join(lines)
+    
+    def render_all_pre_panic(self, result):
+        lines = ["### Pre-Panic Warning System", "",
+                 "| Panic Date | Strongest Warning | Pattern | ≥2% Drops |",
+                 "|---|---|---|---|"]
+        for panic_date in result.panic_dates:
+            if panic_date in result.errors:
+                lines.append(f"| {panic_date} | ERROR | {result.errors[panic_date]} | |")
+                continue
+            r = result.results[panic_date]
+            lines.append(f"| {panic_date} | {r.strongest_warning} | {r.pattern_analysis} | {len(r.significant_drops)} |")
+        lines += ["", "**Warning Signal Distribution:**"]
+        for signal, count in result.signal_summary.items():
+            lines.append(f"- {signal}: {count}")
+        lines.append(f"\n**Warning System Effectiveness:** {result.effectiveness:.1f}% "
+                     f"({result.predictive_signals}/{result.total_analyzed} panic days)")
+        return "\n".join(lines)
+    
+    def render_backtest(self, result):
+        lines = [f"### Classifier Backtest: {result.start_date} to {result.end_date}", "",
+                 f"{result.trading_days} trading days, {len(result.panic_dates)} panic days, "
+                 f"{result.horizon}-day warning horizon.", "",
+                 "| Rule | Predictions | True | False | Precision | Recall | FPR | Mean Lead |",
+                 "|---|---|---|---|---|---|---|---|"]
+        for score in result.panic_classifier + result.warning_classifier:
+            lead = "" if score.mean_lead_days is None else f"{score.mean_lead_days:.1f}d"
+            lines.append(f"| {score.rule} | {score.predictions} | {score.true_positives} | {score.false_positives} | "
+                         f"{_ratio(score.precision).strip()} | {_ratio(score.recall).strip()} | "
+                         f"{_ratio(score.false_positive_rate).strip()} | {lead} |")
+        lines += ["", "**Panics without a prior alarm:**"]
+        for rule, dates in result.missed_panics.items():
+            lines.append(f"- {rule}: {', '.join(dates) if dates else 'none'}")
+        return "\n".join(lines)
+    
+    def render_similar_days(self, target_date, result):
+        if result is None:
+            return f"### Similar Days: {target_date}\n\nNo complete feature data for this date."
+        horizons = list(result.forward_returns)
+        lines = [f"### Similar Days: {target_date}", "",
+                 "| Date | Distance | VNINDEX | Banking | Securities | Real Estate | Volume | Panic Type | "
+                 + " | ".join(f"+{h}" for h in horizons) + " |",
+                 "|---|---|---|---|---|---|---|---|" + "---|" * len(horizons)]
+        for day in [None] + result.analogues:
+            date, distance, f, panic_type, forward = (
+                (f"**{target_date}**", "", result.features, "", result.forward_returns) if day is None else
+                (day.date, f"{day.distance:.2f}", day.features, day.panic_type, day.forward_returns))
+            lines.append(f"| {date} | {distance} | {_pct(f['vnindex_change'])} | {_pct(f['bsi'])} | {_pct(f['ssi'])} | "
+                         f"{_pct(f['rsi'])} | {f['volume_ratio']:.2f}x | {panic_type} | "
+                         + " | ".join(_pct(forward[h]) for h in horizons) + " |")
+        lines += ["",
+                  "**VNINDEX after the analogues:** " + ", ".join(
+                      f"{h} mean {_pct(result.mean_forward_returns[h])} / median {_pct(result.median_forward_returns[h])}"
+                      for h in horizons)]
+        return "\n".join(lines)
+
+class JsonRenderer:
+    """Machine-readable output: the result dataclasses serialized as JSON"""
+    
+    def __init__(self, analyzer):
+        self.analyzer = analyzer
+    
+    def _dump(self, result):
+        return json.dumps(result.to_dict() if result is not None else None, ensure_ascii=False, indent=2)
+    
+    def render_date(self, target_date, data):
+        return self._dump(data)
+    
+    def render_pre_panic(self, result):
+        return self._dump(result)
+    
+    def render_range(self, result):
+        return self._dump(result)
+    
+    def render_cycle(self, result):
+        return self._dump(result)
+    
+    def render_all_pre_panic(self, result):
+        return self._dump(result)
+    
+    def render_backtest(self, result):
+        return self._dump(result)
+    
+    def render_similar_days(self, target_date, result):
+        return self._dump(result)
+
+RENDERERS = {
+    'text': TextRenderer,
+    'markdown': MarkdownRenderer,
+    'json': JsonRenderer
+}
+
+class LRUCache:
+    """Thread-safe bounded least-recently-used cache"""
+    
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def __len__(self):
+        return len(self._items)
+    
+    def get(self, key):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                PROFILER.count('server_cache.hit')
+                return self._items[key]
+            self.misses += 1
+            PROFILER.count('server_cache.miss')
+            return None
+    
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+class ReadWriteLock:
+    """Any number of concurrent readers or a single writer; a waiting writer holds off new readers"""
+    
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writing = False
+        self._writers_waiting = 0
+    
+    @contextmanager
+    def reading(self):
+        with self._condition:
+            while self._writing or self._writers_waiting:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+    
+    @contextmanager
+    def writing(self):
+        with self._condition:
+            self._writers_waiting += 1
+            while self._writing or self._readers:
+                self._condition.wait()
+            self._writers_waiting -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writing = False
+                self._condition.notify_all()
+
+class PanicQueryServer:
+    """Answers analyzer queries as JSON from warm memory over HTTP
+    
+    Endpoints (dates are YYYY-MM-DD):
+      GET /date/<date>
+      GET /range?start=<date>&end=<date>
+      GET /cycle?start=<date>&end=<date>
+      GET /pre-panic/<date>
+      GET /similar/<date>?k=<count>
+      GET /all-pre-panic
+      GET /health
+      POST /refresh   (pick up rows appended to market_data, then drop cached results)
+    
+    Queries run under the read side of a ReadWriteLock and /refresh under the write side, so no
+    query sees the analyzer half updated. Everything the queries read is built up front (see
+    _warm), and cached answers are keyed by a data generation that every refresh bumps.
+    """
+    
+    def __init__(self, analyzer, cache_size=256):
+        self.analyzer = analyzer
+        self.cache = LRUCache(cache_size)
+        self.generation = 0
+        self._lock = ReadWriteLock()
+        
+        # Load market_data and build the indicator engine once, before the first request
+        self._warm()
+    
+    def _warm(self):
+        """Build the analyzer state the endpoints read, so queries never build it concurrently"""
+        self.analyzer.engine.risk_features()
+        self.analyzer.similarity_index
+    
+    def handle(self, path, query, method='GET'):
+        """Return (HTTP status, JSON body bytes) for a request method, path and parsed query string"""
+        try:
+            return self._handle(method, path, query)
+        except Exception as e:
+            return 500, self._encode({'error': f"{type(e).__name__}: {e}"})
+    
+    def _handle(self, method, path, query):
+        parts = [p for p in path.split('/') if p]
+        if parts == ['refresh']:
+            if method != 'POST':
+                return 405, self._encode({'error': "Use POST /refresh"})
+            return 200, self._encode(self.refresh())
+        if method != 'GET':
+            return 405, self._encode({'error': f"Use GET {path}"})
+        if parts == ['health']:
+            with self._lock.reading():
+                return 200, self._encode({
+                    'status': 'ok',
+                    'trading_days': len(self.analyzer.calendar),
+                    'generation': self.generation,
+                    'csv_parses': self.analyzer.store.parse_count,
+                    'cache_size': len(self.cache),
+                    'cache_hits': self.cache.hits,
+                    'cache_misses': self.cache.misses
+                })
+        
+        try:
+            if len(parts) == 2 and parts[0] in ('date', 'pre-panic'):
+                args = (self._date(parts[1]),)
+            elif len(parts) == 2 and parts[0] == 'similar':
+                k = query.get('k', ['10'])[0]
+                if not k.isdigit() or int(k) < 1:
+                    raise ValueError(f"k must be a positive number, got '{k}'")
+                args = (self._date(parts[1]), int(k))
+            elif parts in (['range'], ['cycle']):
+                args = (self._date(query.get('start', [''])[0]), self._date(query.get('end', [''])[0]))
+            elif parts == ['all-pre-panic']:
+                args = ()
+            else:
+                return 404, self._encode({'error': f"Unknown endpoint: {path}"})
+        except ValueError as e:
+            return 400, self._encode({'error': str(e)})
+        
+        with self._lock.reading():
+            key = (self.generation, parts[0]) + args
+            body = self.cache.get(key)
+            if body is None:
+                body = self._encode(self._compute(parts[0], args))
+                self.cache.put(key, body)
+        return 200, body
+    
+    def refresh(self):
+        """Extend the warm data with appended rows and invalidate cached answers"""
+        with self._lock.writing():
+            started = time.perf_counter()
+            changed = self.analyzer.refresh()
+            if changed:
+                self.generation += 1
+                self.cache.clear()
+                self._warm()
+            return {
+                'changed': {t: date.strftime('%Y-%m-%d') if date is not None else None
+                            for t, date in changed.items()},
+                'trading_days': len(self.analyzer.calendar),
+                'generation': self.generation,
+                'elapsed_ms': round((time.perf_counter() - started) * 1000, 3)
+            }
+    
+    def _compute(self, endpoint, args):
+        analyzer = self.analyzer
+        if endpoint == 'date':
+            result = analyzer.get_date_data(*args)
+        elif endpoint == 'pre-panic':
+            result = analyzer.compute_pre_panic_pattern(*args)
+        elif endpoint == 'similar':
+            result = analyzer.compute_similar_days(*args)
+        elif endpoint == 'range':
+            result = analyzer.compute_date_range(*args)
+        elif endpoint == 'cycle':
+            result = analyzer.compute_complete_cycle(*args)
         else:
-            print(f"   🔴 LIMITED: {effectiveness:.1f}% effectiveness - Use with other indicators")
+            result = analyzer.compute_all_pre_panic_patterns()
+        return result.to_dict() if result is not None else None
+    
+    @staticmethod
+    def _date(value):
+        try:
+            datetime.strptime(value, '%Y-%m-%d')
+        except ValueError:
+            raise ValueError(f"Dates must be in YYYY-MM-DD format, got '{value}'")
+        return value
+    
+    @staticmethod
+    def _encode(payload):
+        return json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    
+    def serve(self, host='127.0.0.1', port=8765):
+        """Serve requests until interrupted, one thread per connection"""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        from urllib.parse import parse_qs, urlparse
+        query_server = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self._respond('GET')
+            
+            def do_POST(self):
+                self._respond('POST')
             
-        return all_pre_panic_data
+            def _respond(self, method):
+                url = urlparse(self.path)
+                status, body = query_server.handle(url.path, parse_qs(url.query), method)
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('Access-Control-Allow-Origin', '*')
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        httpd = ThreadingHTTPServer((host, port), Handler)
+        print(f"🌐 Panic analyzer server listening on http://{host}:{port}")
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            httpd.server_close()
+
+# Analyzer inherited by forked batch workers (see compute_pre_panic_batch)
+_batch_analyzer = None
+
+def _compute_pre_panic_in_worker(panic_date):
+    return _batch_analyzer._compute_pre_panic_safely(panic_date)
+
+# Threshold sweep inputs inherited by forked workers (see compute_threshold_sweep)
+_sweep_inputs = None
+
+def _sweep_chunk(inputs, bounds):
+    classifier, series, panic, params, horizon, level = inputs
+    start, stop = bounds
+    return sweep_scores(classifier, series, panic, {name: values[start:stop] for name, values in params.items()},
+                        horizon, level)
+
+def _sweep_chunk_in_worker(bounds):
+    return _sweep_chunk(_sweep_inputs, bounds)
+
+def _pop_option(args, name, takes_value=False):
+    """Remove an option (and its value) from an argument list and return it"""
+    if name not in args:
+        return None
+    i = args.index(name)
+    if not takes_value:
+        del args[i]
+        return True
+    if i + 1 >= len(args):
+        print(f"❌ Error: {name} requires a value")
+        sys.exit(1)
+    value = args[i + 1]
+    del args[i:i + 2]
+    return value
+
+def _write_table(table, output_format, output_file, quiet, description, unit="trading days"):
+    """Write a table as CSV, or as JSON records with --format json"""
+    if output_format == "json":
+        records = table.reset_index()
+        if 'date' in records:
+            records['date'] = records['date'].dt.strftime('%Y-%m-%d')
+        content = records.to_json(orient='records', indent=2, force_ascii=False)
+    else:
+        content = table.to_csv(date_format='%Y-%m-%d', float_format='%.4f')
+    
+    if output_file:
+        with open(output_file, 'w') as f:
+            f.write(content)
+        if not quiet:
+            print(f"💾 Wrote {description} for {len(table)} {unit} to {output_file}")
+    elif not quiet:
+        sys.stdout.write(content)
+
+def _parse_grid(specs):
+    """--grid NAME=V1,V2,... or NAME=START:STOP:STEP (inclusive) options as {name: values}"""
+    grid = {}
+    for spec in specs:
+        name, _, values = spec.partition('=')
+        if not values:
+            raise ValueError(f"--grid expects NAME=VALUES, got: {spec}")
+        if ':' in values:
+            start, stop, step = (float(v) for v in values.split(':'))
+            grid[name] = list(np.round(np.arange(start, stop + step / 2, step), 10))
+        else:
+            grid[name] = [float(v) for v in values.split(',')]
+    return grid
+
+def _date_range_args(args, usage):
+    """Optional START END dates following a mode flag, validated as YYYY-MM-DD"""
+    if len(args) not in (1, 3):
+        print(f"❌ Error: Usage: {usage}")
+        sys.exit(1)
+    
+    start_date, end_date = (args[1], args[2]) if len(args) == 3 else (None, None)
+    try:
+        for date in (start_date, end_date):
+            if date is not None:
+                datetime.strptime(date, '%Y-%m-%d')
+    except ValueError:
+        print("❌ Error: Dates must be in YYYY-MM-DD format")
+        sys.exit(1)
+    return start_date, end_date
+
+def _enable_profiling(args):
+    """Turn on PROFILER from --profile [FILE.json] or PANIC_ANALYZER_PROFILE and report at exit"""
+    destination = os.environ.get('PANIC_ANALYZER_PROFILE', '')
+    if destination.lower() in ('', '0', 'false', 'no', 'off'):
+        destination = None
+    if "--profile" in args:
+        i = args.index("--profile")
+        if i + 1 < len(args) and args[i + 1].endswith('.json'):
+            destination = args.pop(i + 1)
+        else:
+            destination = destination or 'table'
+        del args[i]
+    
+    if destination is not None:
+        PROFILER.enable()
+        atexit.register(PROFILER.report, destination)
 
 def main():
-    if len(sys.argv) < 2:
+    args = sys.argv[1:]
+    _enable_profiling(args)
+    quiet = _pop_option(args, "--quiet")
+    output_format = _pop_option(args, "--format", takes_value=True) or "text"
+    jobs = _pop_option(args, "--jobs", takes_value=True)
+    host = _pop_option(args, "--host", takes_value=True) or "127.0.0.1"
+    port = _pop_option(args, "--port", takes_value=True) or "8765"
+    cache_size = _pop_option(args, "--cache-size", takes_value=True) or "256"
+    output_file = _pop_option(args, "--output", takes_value=True)
+    horizon = _pop_option(args, "--horizon", takes_value=True) or "14"
+    level = _pop_option(args, "--level", takes_value=True) or "EARLY_WARNING"
+    rank_by = _pop_option(args, "--rank-by", takes_value=True) or "f1"
+    top = _pop_option(args, "--top", takes_value=True)
+    rebalance = _pop_option(args, "--rebalance", takes_value=True)
+    threshold = _pop_option(args, "--threshold", takes_value=True) or str(PANIC_THRESHOLDS['vnindex'])
+    direction = _pop_option(args, "--direction", takes_value=True) or "both"
+    cluster_days = _pop_option(args, "--cluster", takes_value=True) or "1"
+    verified = _pop_option(args, "--verified")
+    with_breadth = _pop_option(args, "--with-breadth")
+    panic_type = _pop_option(args, "--panic-type", takes_value=True)
+    window = _pop_option(args, "--window", takes_value=True) or str(EVENT_WINDOW)
+    grid_specs = []
+    while "--grid" in args:
+        grid_specs.append(_pop_option(args, "--grid", takes_value=True))
+    
+    if len(args) < 1:
         print("Usage:")
         print("  Single date: python panic_analyzer.py YYYY-MM-DD")
         print("  Date range:  python panic_analyzer.py YYYY-MM-DD YYYY-MM-DD")
         print("  Cycle analysis: python panic_analyzer.py --cycle YYYY-MM-DD YYYY-MM-DD")
         print("  Pre-panic analysis: python panic_analyzer.py --pre-panic YYYY-MM-DD")
-        print("  All pre-panic analysis: python panic_analyzer.py --analyze-all-pre-panic")
+        print("  Similar days: python panic_analyzer.py --similar YYYY-MM-DD [--top K]")
+        print("  All pre-panic analysis: python panic_analyzer.py --analyze-all-pre-panic [--jobs N] [--verified]")
+        print("  Panic day detection: python panic_analyzer.py --panic-days [YYYY-MM-DD YYYY-MM-DD] [--output FILE]")
+        print("  Warning history: python panic_analyzer.py --warning-history [YYYY-MM-DD YYYY-MM-DD] [--output FILE]")
+        print("  Sector indicators: python panic_analyzer.py --sectors [YYYY-MM-DD YYYY-MM-DD] [--output FILE]")
+        print("  Market breadth: python panic_analyzer.py --breadth [YYYY-MM-DD YYYY-MM-DD] [--output FILE]")
+        print("  Event study: python panic_analyzer.py --event-study [YYYY-MM-DD YYYY-MM-DD] [--panic-type TYPE] [--window N] [--output FILE]")
+        print("  Classifier backtest: python panic_analyzer.py --backtest [YYYY-MM-DD YYYY-MM-DD] [--horizon N] [--with-breadth]")
+        print("  Panel export: python panic_analyzer.py --export-panel FILE.parquet|FILE.arrow|DIR [YYYY-MM-DD YYYY-MM-DD]")
+        print("  Threshold sweep: python panic_analyzer.py --sweep warning|panic [YYYY-MM-DD YYYY-MM-DD] [--grid NAME=V1,V2|START:STOP:STEP ...]")
+        print("                   [--level LEVEL] [--rank-by METRIC] [--top N] [--horizon N] [--jobs N] [--output FILE]")
+        print("  Query server: python panic_analyzer.py --serve [--host H] [--port N] [--cache-size N]")
+        print("  Refresh cache: python panic_analyzer.py --refresh")
+        print("")
+        print("Options:")
+        print("  --format text|markdown|json   Output format (default: text)")
+        print("  --quiet                       Compute only, print nothing")
+        print("  --rebalance daily|monthly|quarterly|yearly")
+        print("                                Market-cap weights over time instead of fixed weights")
+        print("  --profile [FILE.json]         Per-stage timings at exit (table on stderr, or Chrome trace JSON)")
+        print("  --threshold PCT               Panic day detection: minimum VNINDEX move (default: 3.0)")
+        print("  --direction both|down|up      Panic day detection: which moves count (default: both)")
+        print("  --cluster N                   Panic days within N trading days form one event (default: 1, 0 = off)")
+        print("  --verified                    All pre-panic analysis / event study of the hand-labelled panic days instead")
+        print("  --panic-type TYPE             Event study: every day classified as TYPE instead of detected panic days")
+        print("  --window N                    Event study: trading days either side of each event (default: 20)")
         print("")
         print("Examples:")
         print("  python panic_analyzer.py 2018-02-05")
         print("  python panic_analyzer.py 2018-02-01 2018-02-15")
         print("  python panic_analyzer.py --cycle 2022-05-10 2022-05-25")
         print("  python panic_analyzer.py --pre-panic 2022-05-13")
-        print("  python panic_analyzer.py --analyze-all-pre-panic")
+        print("  python panic_analyzer.py --similar 2022-05-13 --top 5")
+        print("  python panic_analyzer.py --analyze-all-pre-panic --jobs 4")
+        print("  python panic_analyzer.py --panic-days --direction down --cluster 3")
+        print("  python panic_analyzer.py --warning-history --output warning_history.csv")
+        print("  python panic_analyzer.py --sectors 2022-05-01 2022-05-31 --format json")
+        print("  python panic_analyzer.py --breadth 2022-05-01 2022-05-31")
+        print("  python panic_analyzer.py --event-study --panic-type NEGATIVE_MEDIUM --output event_study.csv")
+        print("  python panic_analyzer.py --backtest --horizon 10")
+        print("  python panic_analyzer.py --backtest --with-breadth")
+        print("  python panic_analyzer.py --export-panel panel.parquet")
+        print("  python panic_analyzer.py --sweep warning --grid strong_rsi=-3:-1:0.25 --grid early_vnindex=-1.5,-1,-0.5 --top 10")
+        print("  python panic_analyzer.py 2022-05-13 --format json")
+        print("  python panic_analyzer.py --serve --port 8765")
+        sys.exit(1)
+    
+    if output_format not in RENDERERS:
+        print(f"❌ Error: --format must be one of: {', '.join(RENDERERS)}")
+        sys.exit(1)
+    
+    if rebalance is not None and rebalance not in REBALANCE_SCHEDULES:
+        print(f"❌ Error: --rebalance must be one of: {', '.join(REBALANCE_SCHEDULES)}")
+        sys.exit(1)
+    
+    if direction not in PANIC_DIRECTIONS:
+        print(f"❌ Error: --direction must be one of: {', '.join(PANIC_DIRECTIONS)}")
         sys.exit(1)
     
-    analyzer = VietnamesePanicAnalyzer()
+    try:
+        threshold = float(threshold)
+        cluster_days = int(cluster_days)
+    except ValueError:
+        print("❌ Error: --threshold and --cluster require numbers")
+        sys.exit(1)
+    
+    analyzer = VietnamesePanicAnalyzer(rebalance=rebalance)
+    analyzer.renderer = None if quiet else RENDERERS[output_format](analyzer)
+    
+    # Long-running JSON query server
+    if args[0] == "--serve":
+        try:
+            port = int(port)
+            cache_size = int(cache_size)
+        except ValueError:
+            print("❌ Error: --port and --cache-size require numbers")
+            sys.exit(1)
+        
+        PanicQueryServer(analyzer, cache_size=cache_size).serve(host, port)
+        sys.exit(0)
+    
+    # Bring the binary cache up to date with every CSV in market_data
+    elif args[0] == "--refresh":
+        store = analyzer.store
+        started = time.perf_counter()
+        tickers = sorted(name[:-4] for name in os.listdir(store.data_dir) if name.endswith('.csv'))
+        for ticker in tickers:
+            store.get(ticker)
+        analyzer.engine  # rewrites the compact date cache when a core CSV changed
+        elapsed = (time.perf_counter() - started) * 1000
+        print(f"🔄 Refreshed {len(tickers)} tickers in {elapsed:.1f} ms")
+        print(f"   📦 Up to date in cache: {store.cache_reads}")
+        print(f"   ➕ Appended: {store.appended_rows} new rows from {store.append_count} files")
+        print(f"   📂 Full CSV parses: {store.parse_count}")
+        sys.exit(0)
     
     # Check for comprehensive pre-panic analysis
-    if sys.argv[1] == "--analyze-all-pre-panic":
-        analyzer.analyze_all_pre_panic_patterns()
+    elif args[0] == "--analyze-all-pre-panic":
+        if len(args) != 1:
+            print("❌ Error: Usage: --analyze-all-pre-panic [--jobs N] [--verified]")
+            sys.exit(1)
+        try:
+            jobs = int(jobs) if jobs is not None else 1
+        except ValueError:
+            print("❌ Error: --jobs requires a number")
+            sys.exit(1)
+        
+        if verified:
+            panic_dates = VERIFIED_PANIC_DATES
+        else:
+            panic_dates = analyzer.detect_panic_dates(threshold=threshold, direction=direction, cluster_days=cluster_days)
+        analyzer.analyze_all_pre_panic_patterns(jobs=jobs, panic_dates=panic_dates)
+    
+    # Panic days detected from the VNINDEX change series, with their clusters
+    elif args[0] == "--panic-days":
+        start_date, end_date = _date_range_args(args, "--panic-days [YYYY-MM-DD YYYY-MM-DD] [--output FILE]")
+        table = analyzer.compute_panic_days(start_date, end_date, threshold, direction, cluster_days)
+        _write_table(table, output_format, output_file, quiet, "panic days", unit="panic days")
+        sys.exit(0)
+    
+    # Warning level, trailing drops and progression for every trading day
+    elif args[0] == "--warning-history":
+        start_date, end_date = _date_range_args(args, "--warning-history [YYYY-MM-DD YYYY-MM-DD] [--output FILE]")
+        history = analyzer.compute_warning_history(start_date, end_date)
+        _write_table(history, output_format, output_file, quiet, "warning history")
+        sys.exit(0)
+    
+    # Market-cap weighted indicators for every ticker_group.json sector
+    elif args[0] == "--sectors":
+        start_date, end_date = _date_range_args(args, "--sectors [YYYY-MM-DD YYYY-MM-DD] [--output FILE]")
+        indicators = analyzer.compute_sector_indicators(start_date, end_date)
+        _write_table(indicators, output_format, output_file, quiet, "sector indicators")
+        sys.exit(0)
+    
+    # Advance/decline, moving-average and 52-week-low breadth over every ticker in market_data
+    elif args[0] == "--breadth":
+        start_date, end_date = _date_range_args(args, "--breadth [YYYY-MM-DD YYYY-MM-DD] [--output FILE]")
+        breadth = analyzer.compute_breadth(start_date, end_date)
+        _write_table(breadth, output_format, output_file, quiet, "market breadth")
+        sys.exit(0)
+    
+    # Average VNINDEX and sector paths around panic days, by panic type
+    elif args[0] == "--event-study":
+        start_date, end_date = _date_range_args(args, "--event-study [YYYY-MM-DD YYYY-MM-DD] [--panic-type TYPE] [--window N]")
+        try:
+            window = int(window)
+        except ValueError:
+            window = -1
+        if window < 0:
+            print("❌ Error: --window requires a non-negative number")
+            sys.exit(1)
+        
+        try:
+            event_dates = VERIFIED_PANIC_DATES if verified else (
+                None if panic_type is not None else
+                analyzer.detect_panic_dates(threshold=threshold, direction=direction, cluster_days=cluster_days))
+            table = analyzer.compute_event_study(start_date, end_date, event_dates, panic_type, window, window)
+        except ValueError as e:
+            print(f"❌ Error: {e}")
+            sys.exit(1)
+        
+        _write_table(table, output_format, output_file, quiet, "event study paths", unit="group x offset rows")
+        sys.exit(0)
+    
+    # Precision/recall of the panic and warning classifiers over every trading day
+    elif args[0] == "--backtest":
+        start_date, end_date = _date_range_args(args, "--backtest [YYYY-MM-DD YYYY-MM-DD] [--horizon N]")
+        try:
+            horizon = int(horizon)
+        except ValueError:
+            horizon = 0
+        if horizon < 1:
+            print("❌ Error: --horizon requires a positive number")
+            sys.exit(1)
+        
+        analyzer.analyze_backtest(start_date, end_date, horizon=horizon, breadth=with_breadth)
+    
+    # Rank every combination of a threshold grid by backtest score
+    elif args[0] == "--sweep":
+        if len(args) < 2:
+            print("❌ Error: Usage: --sweep warning|panic [YYYY-MM-DD YYYY-MM-DD] [--grid NAME=VALUES ...]")
+            sys.exit(1)
+        
+        classifier = args[1]
+        start_date, end_date = _date_range_args(args[1:], "--sweep warning|panic [YYYY-MM-DD YYYY-MM-DD] [--grid NAME=VALUES ...]")
+        try:
+            horizon = int(horizon)
+        except ValueError:
+            horizon = 0
+        if horizon < 1:
+            print("❌ Error: --horizon requires a positive number")
+            sys.exit(1)
+        try:
+            top = int(top) if top is not None else None
+        except ValueError:
+            top = 0
+        if top is not None and top < 1:
+            print("❌ Error: --top requires a positive number")
+            sys.exit(1)
+        
+        try:
+            jobs = int(jobs) if jobs is not None else 1
+            grid = _parse_grid(grid_specs) if grid_specs else None
+            table = analyzer.compute_threshold_sweep(classifier, grid, start_date, end_date, horizon=horizon,
+                                                     level=level, rank_by=rank_by, jobs=jobs)
+        except ValueError as e:
+            print(f"❌ Error: {e}")
+            sys.exit(1)
+        
+        _write_table(table.head(top) if top is not None else table, output_format, output_file, quiet,
+                     f"{classifier} threshold sweep", unit="combinations")
+        sys.exit(0)
+    
+    # Whole computed panel to Parquet / Arrow IPC
+    elif args[0] == "--export-panel":
+        if len(args) < 2:
+            print("❌ Error: Usage: --export-panel FILE.parquet|FILE.arrow|DIR [YYYY-MM-DD YYYY-MM-DD]")
+            sys.exit(1)
+        
+        path = args[1]
+        start_date, end_date = _date_range_args(args[1:], "--export-panel FILE.parquet|FILE.arrow|DIR [YYYY-MM-DD YYYY-MM-DD]")
+        started = time.perf_counter()
+        panel = analyzer.compute_panel(start_date, end_date)
+        try:
+            write_panel(panel, path)
+        except (ImportError, ValueError) as e:
+            print(f"❌ Error: {e}")
+            sys.exit(1)
+        
+        if not quiet:
+            elapsed = (time.perf_counter() - started) * 1000
+            print(f"💾 Wrote panel of {len(panel)} trading days x {len(panel.columns)} columns to {path} in {elapsed:.1f} ms")
         sys.exit(0)
     
+    # Past days with the closest sector profile, and what VNINDEX did after them
+    elif args[0] == "--similar":
+        if len(args) != 2:
+            print("❌ Error: Usage: --similar YYYY-MM-DD [--top K]")
+            sys.exit(1)
+        
+        target_date = args[1]
+        try:
+            datetime.strptime(target_date, '%Y-%m-%d')
+        except ValueError:
+            print("❌ Error: Date must be in YYYY-MM-DD format")
+            sys.exit(1)
+        try:
+            k = int(top) if top is not None else 10
+        except ValueError:
+            k = 0
+        if k < 1:
+            print("❌ Error: --top requires a positive number")
+            sys.exit(1)
+        
+        analyzer.analyze_similar_days(target_date, k)
+    
     # Check for single pre-panic analysis
-    elif sys.argv[1] == "--pre-panic":
-        if len(sys.argv) != 3:
+    elif args[0] == "--pre-panic":
+        if len(args) != 2:
             print("❌ Error: Pre-panic analysis requires a panic date")
             sys.exit(1)
             
-        panic_date = sys.argv[2]
+        panic_date = args[1]
         
         # Validate date format
         try:
@@ -853,16 +4024,15 @@ def main():
             sys.exit(1)
         
         analyzer.analyze_pre_panic_pattern(panic_date)
-        sys.exit(0)
     
     # Check for cycle analysis
-    elif sys.argv[1] == "--cycle":
-        if len(sys.argv) != 4:
+    elif args[0] == "--cycle":
+        if len(args) != 3:
             print("❌ Error: Cycle analysis requires start and end dates")
             sys.exit(1)
         
-        start_date = sys.argv[2]
-        end_date = sys.argv[3]
+        start_date = args[1]
+        end_date = args[2]
         
         # Validate date formats
         try:
@@ -875,9 +4045,9 @@ def main():
         analyzer.analyze_complete_cycle(start_date, end_date)
     
     # Check for date range analysis
-    elif len(sys.argv) == 3:
-        start_date = sys.argv[1]
-        end_date = sys.argv[2]
+    elif len(args) == 2:
+        start_date = args[0]
+        end_date = args[1]
         
         # Validate date formats
         try:
@@ -890,8 +4060,8 @@ def main():
         analyzer.analyze_date_range(start_date, end_date)
     
     # Single date analysis
-    elif len(sys.argv) == 2:
-        target_date = sys.argv[1]
+    elif len(args) == 1:
+        target_date = args[0]
         
         # Validate date format
         try:
@@ -905,6 +4075,9 @@ def main():
     else:
         print("❌ Error: Invalid arguments")
         sys.exit(1)
+    
+    if output_format == "text" and not quiet:
+        print(f"\n📂 CSV files parsed this run: {analyzer.store.parse_count}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
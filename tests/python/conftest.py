@@ -0,0 +1,150 @@
+"""Fixtures for the panic_analyzer.py tests: a small synthetic market_data directory
+
+The market has VNINDEX, the 15 core tickers and a few others for breadth, over 320 trading days.
+It includes clustered panic days, ≥2% drops before them, panic-to-recovery cycles, a suspension,
+late listings and a ticker missing on a panic day.
+"""
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, os.pardir))
+
+import panic_analyzer  # noqa: E402
+
+TRADING_DAYS = 320
+PANIC_DAYS = (100, 101, 180, 260)  # 180 is a rally: a panic either way
+# (panic, banking stabilization, securities recovery) days; the first spans a weekend
+CYCLES = ((101, 105, 106), (260, 262, 263))
+
+# ticker -> rows it has no data on
+GAPS = {
+    'SHS': range(50, 56),   # suspended for a week
+    'NVL': range(0, 40),    # listed late
+    'BBB': range(0, 200),
+    'VPB': (101,)           # missing on a panic day
+}
+
+# ticker_group.json: a repeated ticker, one without a market cap, one with a zero cap, and a sector with none
+GROUPS = {
+    'BANKING': ['VCB', 'BID', 'TCB', 'CTG', 'VPB', 'VCB'],
+    'SECURITIES': ['SSI', 'VCI', 'HCM', 'MBS', 'SHS', 'ZZZ'],
+    'REAL_ESTATE': ['VIC', 'VHM', 'VRE', 'KDH', 'NVL'],
+    'SMALL_CAPS': ['AAA', 'BBB', 'CCC', 'SHS'],
+    'UNLISTED': ['ZZZ']
+}
+# stock_market_cap.csv in billion VND
+MARKET_CAPS = {
+    'VCB': 325300, 'BID': 252400, 'TCB': 243000, 'CTG': 225000, 'VPB': 146400,
+    'SSI': 48000, 'VCI': 25400, 'HCM': 15300, 'MBS': 15300, 'SHS': 10400,
+    'VIC': 370800, 'VHM': 313400, 'VRE': 57800, 'KDH': 29800, 'NVL': 29500,
+    'AAA': 0, 'BBB': 3200, 'CCC': 4100
+}
+
+
+def _market():
+    """{ticker: DataFrame of ticker,time,open,high,low,close,volume rows}, the same on every call"""
+    rng = np.random.default_rng(20240917)
+    dates = pd.bdate_range('2021-01-04', periods=TRADING_DAYS).strftime('%Y-%m-%d')
+    
+    index_change = rng.normal(0.05, 0.9, TRADING_DAYS)
+    for day, change in zip(PANIC_DAYS, (-4.2, -3.4, 3.6, -5.1)):
+        index_change[day] = change
+        index_change[day - 3] = -2.3
+        index_change[day - 9] = -2.1
+    for panic, stabilization, recovery in CYCLES:
+        index_change[[stabilization, recovery]] = 0.8, 0.6
+    
+    sector_betas = {
+        'VCB': 0.8, 'BID': 0.9, 'TCB': 1.1, 'CTG': 1.0, 'VPB': 1.2,
+        'SSI': 1.6, 'VCI': 1.5, 'HCM': 1.4, 'MBS': 1.7, 'SHS': 1.9,
+        'VIC': 1.3, 'VHM': 1.2, 'VRE': 1.4, 'KDH': 1.5, 'NVL': 1.8,
+        'AAA': 0.7, 'BBB': 1.0, 'CCC': 1.3
+    }
+    
+    market = {'VNINDEX': _prices('VNINDEX', dates, index_change, 1000.0, rng, scale=1e5)}
+    for ticker, beta in sector_betas.items():
+        change = beta * index_change + rng.normal(0, 1.0, TRADING_DAYS)
+        if ticker in ('VIC', 'VHM', 'VRE'):
+            change[[day - 3 for day in PANIC_DAYS]] -= 2.5  # real estate cracks first
+        for panic, stabilization, recovery in CYCLES:
+            if ticker in ('VCB', 'BID', 'TCB', 'CTG', 'VPB'):
+                change[panic + 1:stabilization] = 0.0   # banks hold...
+                change[stabilization] = 2.0             # ...then lead
+                change[recovery] = 0.0
+            elif ticker in ('SSI', 'VCI', 'HCM', 'MBS', 'SHS'):
+                change[recovery] = 3.0                  # securities follow
+        frame = _prices(ticker, dates, change, float(rng.uniform(10, 120)), rng)
+        gap = GAPS.get(ticker, ())
+        market[ticker] = frame.drop(index=list(gap)).reset_index(drop=True)
+    return market
+
+
+def _prices(ticker, dates, change, start, rng, scale=1.0):
+    close = np.round(start * np.cumprod(1 + change / 100), 2)
+    prev_close = np.concatenate([[start], close[:-1]])
+    open_ = np.round(prev_close * (1 + rng.normal(0, 0.002, len(close))), 2)
+    high = np.round(np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.006, len(close)))), 2)
+    low = np.round(np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.006, len(close)))), 2)
+    volume = (rng.lognormal(13, 0.4, len(close)) * scale / 1e3).astype(np.int64)
+    return pd.DataFrame({'ticker': ticker, 'time': dates, 'open': open_, 'high': high,
+                         'low': low, 'close': close, 'volume': volume})
+
+
+def write_csv(path, frame):
+    """Write rows in the market_data layout (prices with two decimals)"""
+    frame.to_csv(path, index=False, float_format='%.2f')
+
+
+@pytest.fixture(scope='session')
+def market():
+    return _market()
+
+
+@pytest.fixture
+def market_data(tmp_path, market):
+    """Path of a fresh market_data directory (its .cache included) for one test"""
+    directory = tmp_path / 'market_data'
+    directory.mkdir()
+    for ticker, frame in market.items():
+        write_csv(directory / f"{ticker}.csv", frame)
+    return str(directory)
+
+
+@pytest.fixture
+def sector_files(tmp_path, monkeypatch):
+    """Run the test from a directory holding ticker_group.json and stock_market_cap.csv"""
+    with open(tmp_path / 'ticker_group.json', 'w') as f:
+        json.dump(GROUPS, f)
+    with open(tmp_path / 'stock_market_cap.csv', 'w') as f:
+        f.write("ticker,market_cap\n")
+        f.writelines(f"{ticker},{cap}\n" for ticker, cap in MARKET_CAPS.items())
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def analyzer(market_data):
+    analyzer = panic_analyzer.VietnamesePanicAnalyzer(market_data)
+    analyzer.renderer = None
+    return analyzer
+
+
+@pytest.fixture
+def cli(market_data, monkeypatch, capsys):
+    """Run panic_analyzer.py's main() on the fixture market and return (exit status, stdout)"""
+    monkeypatch.chdir(os.path.dirname(market_data))
+    
+    def run(*args):
+        monkeypatch.setattr(sys, 'argv', ['panic_analyzer.py', *args])
+        try:
+            panic_analyzer.main()
+            status = 0
+        except SystemExit as e:
+            status = e.code
+        return status, capsys.readouterr().out
+    return run
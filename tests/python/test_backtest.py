@@ -0,0 +1,222 @@
+"""Backtest scoring against brute-force loops over the scalar classifiers"""
+import json
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from panic_analyzer import (PANIC_THRESHOLDS, PANIC_TYPES, WARNING_PRIORITY, WARNING_THRESHOLDS, classify_panic_codes,
+                            score_warnings)
+
+
+def none_if_nan(value):
+    return None if math.isnan(value) else float(value)
+
+
+def brute_warning_scores(alarms, panic, horizon, has_data):
+    """score_warnings for one row of alarms, one day at a time"""
+    n = len(panic)
+    upcoming = [panic[t + 1:t + horizon + 1].any() for t in range(n)]
+    leads = []
+    for p in np.flatnonzero(panic):
+        fired = [t for t in range(max(p - horizon, 0), p) if alarms[t]]
+        if fired:
+            leads.append(p - fired[0])
+    return {
+        'predictions': int(alarms.sum()),
+        'true_positives': sum(1 for t in range(n) if alarms[t] and upcoming[t]),
+        'false_positives': sum(1 for t in range(n) if alarms[t] and not upcoming[t]),
+        'negatives': sum(1 for t in range(n) if has_data[t] and not upcoming[t]),
+        'detected': len(leads),
+        'panics': int(panic.sum()),
+        'mean_lead_days': np.mean(leads) if leads else np.nan,
+        'median_lead_days': np.median(leads) if leads else np.nan
+    }
+
+
+def test_panic_codes_match_classify_panic_type(analyzer):
+    rng = np.random.default_rng(11)
+    values = np.concatenate([np.arange(-9.0, 1.5, 0.5), [np.nan]])
+    bsi, ssi, rsi = (rng.choice(values, 4000) for _ in range(3))
+    vnindex_change = rng.choice(np.arange(-6.0, 6.5, 0.5), 4000)
+    
+    codes = classify_panic_codes(bsi, ssi, rsi, vnindex_change)
+    for code, row in zip(codes, zip(bsi, ssi, rsi, vnindex_change)):
+        assert PANIC_TYPES[code] == analyzer.classify_panic_type(*map(none_if_nan, row[:3]), row[3]), row
+    
+    # No VNINDEX change at all is never a panic
+    assert classify_panic_codes(np.array([-9.0]), np.array([-9.0]), np.array([-9.0]), np.array([np.nan]))[0] == 0
+
+
+@pytest.mark.parametrize('horizon', [1, 5, 14])
+def test_score_warnings_matches_a_day_by_day_count(horizon):
+    rng = np.random.default_rng(horizon)
+    alarms = rng.random((4, 300)) < [[0.02], [0.1], [0.3], [0.0]]
+    panic = rng.random(300) < 0.03
+    panic[[0, 299]] = True  # a panic with no days before it, and one on the last day
+    has_data = rng.random(300) < 0.9
+    
+    scores = score_warnings(alarms, panic, horizon, has_data)
+    for k, row in enumerate(alarms):
+        expected = brute_warning_scores(row, panic, horizon, has_data)
+        for name, value in expected.items():
+            actual = scores[name] if name in ('negatives', 'panics') else scores[name][k]
+            np.testing.assert_equal(actual, value, err_msg=f"{name} (row {k})")
+    
+    # Without has_data every day counts as a negative
+    everyday = score_warnings(alarms, panic, horizon)
+    assert everyday['negatives'] == brute_warning_scores(alarms[0], panic, horizon, np.ones(300, dtype=bool))['negatives']
+
+
+def test_backtest_matches_scalar_classification(analyzer):
+    panic_dates = analyzer.detect_panic_dates() + ['2021-02-15']  # plus a quiet day labelled a panic
+    report = analyzer.compute_backtest(panic_dates=panic_dates, horizon=14)
+    labels = analyzer.calendar.labels
+    
+    # Classify every day the way analyze_date does
+    panic_types, warning_codes = [], []
+    for date in labels:
+        data = analyzer.get_date_data(date)
+        if data is None:
+            panic_types.append(None)
+            warning_codes.append(-2)
+            continue
+        panic_types.append(data.panic_type)
+        warning_codes.append(WARNING_PRIORITY[analyzer.classify_pre_panic_signal(data.bsi, data.ssi, data.rsi, data.vnindex_change)])
+    has_data = np.array([t is not None for t in panic_types])
+    panic = np.isin(labels, panic_dates)
+    
+    assert report.trading_days == has_data.sum()
+    assert report.panic_dates == sorted(panic_dates)
+    
+    negatives = (has_data & ~panic).sum()
+    for score in report.panic_classifier:
+        if score.rule == 'ANY_PANIC':
+            predicted = np.array([t not in (None, 'NO_PANIC') for t in panic_types])
+        else:
+            predicted = np.array([t == score.rule for t in panic_types])
+        true_positives = (predicted & panic).sum()
+        false_positives = (predicted & ~panic).sum()
+        assert (score.predictions, score.true_positives, score.false_positives) == (predicted.sum(), true_positives, false_positives)
+        assert score.false_negatives == panic.sum() - true_positives
+        assert score.false_positive_rate == pytest.approx(false_positives / negatives)
+    
+    codes = np.array(warning_codes)
+    for score in report.warning_classifier:
+        alarms = codes >= WARNING_PRIORITY[score.rule[:-1]]
+        expected = brute_warning_scores(alarms, panic, 14, has_data)
+        assert score.true_positives == expected['true_positives']
+        assert score.false_positives == expected['false_positives']
+        assert score.false_negatives == expected['panics'] - expected['detected']
+        assert score.recall == pytest.approx(expected['detected'] / expected['panics'])
+        assert score.false_positive_rate == pytest.approx(expected['false_positives'] / expected['negatives'])
+        assert score.mean_lead_days == pytest.approx(expected['mean_lead_days'])
+        missed = [labels[p] for p in np.flatnonzero(panic) if not alarms[max(p - 14, 0):p].any()]
+        assert report.missed_panics[score.rule] == missed
+
+
+def test_backtest_range(analyzer):
+    report = analyzer.compute_backtest('2021-05-01', '2021-06-30', panic_dates=analyzer.detect_panic_dates())
+    assert (report.start_date, report.end_date) == ('2021-05-03', '2021-06-30')
+    assert report.panic_dates == ['2021-05-24']
+    assert report.trading_days == len(analyzer.calendar.between('2021-05-01', '2021-06-30'))
+
+
+WARNING_GRID = {
+    'strong_rsi': [-3.0, -2.0],
+    'early_sector': [-2.5, -2.0, -1.5],
+    'early_vnindex': [-1.5, -1.0]
+}
+
+
+def test_sweep_rows_match_backtests_at_those_thresholds(analyzer, monkeypatch):
+    panic_dates = analyzer.detect_panic_dates()
+    table = analyzer.compute_threshold_sweep('warning', WARNING_GRID, panic_dates=panic_dates)
+    assert len(table) == 12
+    
+    for _, row in table.iterrows():
+        for name in WARNING_GRID:
+            monkeypatch.setitem(WARNING_THRESHOLDS, name, row[name])
+        score = next(s for s in analyzer.compute_backtest(panic_dates=panic_dates).warning_classifier
+                     if s.rule == 'EARLY_WARNING+')
+        assert (row['true_positives'], row['false_positives']) == (score.true_positives, score.false_positives)
+        assert row['false_negatives'] == score.false_negatives
+        for metric in ('precision', 'recall', 'false_positive_rate', 'mean_lead_days'):
+            assert row[metric] == pytest.approx(score[metric], nan_ok=True), metric
+
+
+def test_panic_sweep_scores_typed_panics(analyzer):
+    panic_dates = analyzer.detect_panic_dates()
+    table = analyzer.compute_threshold_sweep('panic', {'vnindex': [PANIC_THRESHOLDS['vnindex']]}, panic_dates=panic_dates)
+    scores = {s.rule: s for s in analyzer.compute_backtest(panic_dates=panic_dates).panic_classifier}
+    typed = [scores[name] for name in PANIC_TYPES[2:]]
+    
+    row = table.iloc[0]
+    assert row['true_positives'] == sum(s.true_positives for s in typed)
+    assert row['false_positives'] == sum(s.false_positives for s in typed)
+    assert 'mean_lead_days' not in table
+
+
+def test_sweep_is_ranked(analyzer):
+    table = analyzer.compute_threshold_sweep('warning', WARNING_GRID, rank_by='recall')
+    recall = table['recall'].to_numpy()
+    assert (np.diff(recall[~np.isnan(recall)]) <= 0).all()
+    assert list(table.index) == list(range(1, 13))
+
+
+def test_parallel_sweep_matches_serial(analyzer):
+    serial = analyzer.compute_threshold_sweep('warning', WARNING_GRID, chunk_size=5)
+    parallel = analyzer.compute_threshold_sweep('warning', WARNING_GRID, jobs=2, chunk_size=5)
+    pd.testing.assert_frame_equal(parallel, serial)
+
+
+@pytest.mark.parametrize('classifier, grid, message', [
+    ('warning', {}, 'grid is empty'),
+    ('warning', {'strong_rsi': []}, 'No values to sweep for: strong_rsi'),
+    ('warning', {'vnindex': [3.0]}, 'Unknown warning thresholds: vnindex'),
+    ('other', None, 'Unknown classifier')
+])
+def test_sweep_rejects_bad_grids(analyzer, classifier, grid, message):
+    with pytest.raises(ValueError, match=message):
+        analyzer.compute_threshold_sweep(classifier, grid)
+
+
+@pytest.mark.parametrize('horizon', [0, -3])
+def test_backtest_rejects_a_horizon_below_one_day(analyzer, horizon):
+    with pytest.raises(ValueError, match='at least 1 trading day'):
+        analyzer.compute_backtest(horizon=horizon)
+    with pytest.raises(ValueError, match='at least 1 trading day'):
+        score_warnings(np.zeros((1, 10), dtype=bool), np.zeros(10, dtype=bool), horizon)
+
+
+@pytest.mark.parametrize('horizon', ['0', '-3', 'x'])
+def test_backtest_cli_rejects_a_bad_horizon(cli, horizon):
+    assert cli('--backtest', '--horizon', horizon, '--quiet') == (1, "❌ Error: --horizon requires a positive number\n")
+
+
+def test_backtest_cli(cli):
+    status, out = cli('--backtest', '--horizon', '5', '--format', 'json')
+    assert status == 0 and json.loads(out)['horizon'] == 5
+
+
+def test_sweep_rejects_a_horizon_below_one_day(analyzer):
+    with pytest.raises(ValueError, match='at least 1 trading day'):
+        analyzer.compute_threshold_sweep('warning', {'strong_rsi': [-2.0]}, horizon=0)
+
+
+@pytest.mark.parametrize('option, value', [('--horizon', '0'), ('--horizon', '-3'), ('--top', '0'), ('--top', '-2'),
+                                           ('--top', 'x')])
+def test_sweep_cli_rejects_bad_counts(cli, option, value):
+    status, out = cli('--sweep', 'warning', '--grid', 'strong_rsi=-3,-2', option, value)
+    assert (status, out) == (1, f"❌ Error: {option} requires a positive number\n")
+
+
+def test_sweep_cli_top(cli, analyzer):
+    grid = {'strong_rsi': [-3.0, -2.5, -2.0], 'early_vnindex': [-1.5, -1.0]}
+    status, out = cli('--sweep', 'warning', '--grid', 'strong_rsi=-3,-2.5,-2', '--grid', 'early_vnindex=-1.5,-1',
+                      '--top', '2', '--format', 'json')
+    assert status == 0
+    expected = analyzer.compute_threshold_sweep('warning', grid).head(2)
+    assert [(row['strong_rsi'], row['early_vnindex']) for row in json.loads(out)] == \
+        list(zip(expected['strong_rsi'], expected['early_vnindex']))
@@ -0,0 +1,23 @@
+"""Parallel pre-panic batches against the serial computation"""
+import pytest
+
+
+def as_dicts(pairs):
+    return [(result.to_dict() if result is not None else None, error) for result, error in pairs]
+
+
+@pytest.mark.parametrize('jobs', [2, 3])
+def test_parallel_batch_matches_serial(analyzer, jobs):
+    dates = analyzer.calendar.labels[90:130] + ['not-a-date']
+    serial = analyzer.compute_pre_panic_batch(dates)
+    parallel = analyzer.compute_pre_panic_batch(dates, jobs=jobs)
+    assert as_dicts(parallel) == as_dicts(serial)
+    assert serial[-1][0] is None and serial[-1][1]  # a bad date is reported, not raised
+
+
+def test_all_pre_panic_patterns_in_parallel(analyzer):
+    serial = analyzer.compute_all_pre_panic_patterns()
+    parallel = analyzer.compute_all_pre_panic_patterns(jobs=2)
+    assert parallel.to_dict() == serial.to_dict()
+    assert serial.panic_dates == list(serial.results) == analyzer.detect_panic_dates()
+    assert serial.errors == {}
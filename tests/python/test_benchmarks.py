@@ -0,0 +1,50 @@
+"""Regression rules of the benchmark suite's baseline comparison"""
+import importlib.util
+import json
+import os
+
+import pytest
+
+BENCHMARKS = os.path.join(os.path.dirname(__file__), os.pardir, os.pardir, 'benchmarks')
+
+
+@pytest.fixture(scope='module')
+def bench():
+    spec = importlib.util.spec_from_file_location('bench_panic_analyzer',
+                                                  os.path.join(BENCHMARKS, 'bench_panic_analyzer.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+BASE = {'wall_ms': 100.0, 'peak_rss_mb': 80.0, 'csv_parses': 16}
+
+
+@pytest.mark.parametrize('result, regressed', [
+    ({'wall_ms': 60.0, 'peak_rss_mb': 70.0, 'csv_parses': 0}, False),
+    ({'wall_ms': 124.0, 'peak_rss_mb': 80.0, 'csv_parses': 16}, False),    # within tolerance
+    ({'wall_ms': 130.0, 'peak_rss_mb': 80.0, 'csv_parses': 16}, True),
+    ({'wall_ms': 100.0, 'peak_rss_mb': 101.0, 'csv_parses': 16}, True),
+    ({'wall_ms': 100.0, 'peak_rss_mb': 80.0, 'csv_parses': 17}, True),
+    ({'wall_ms': 100.0, 'peak_rss_mb': 80.0}, False)                      # parses not reported
+])
+def test_regressions(bench, capsys, result, regressed):
+    assert bench.compare({'case': result}, {'case': BASE}, tolerance=25) == (['case'] if regressed else [])
+    assert ('REGRESSION' in capsys.readouterr().out) == regressed
+
+
+def test_small_slowdowns_are_timer_noise(bench, capsys):
+    base = {'fast': {'wall_ms': 0.5, 'peak_rss_mb': 80.0}, 'zero': {'wall_ms': 0.0, 'peak_rss_mb': 80.0}}
+    results = {'fast': {'wall_ms': 1.2, 'peak_rss_mb': 80.0}, 'zero': {'wall_ms': 0.9, 'peak_rss_mb': 80.0}}
+    assert bench.compare(results, base, tolerance=25) == []
+
+
+def test_new_cases_are_not_regressions(bench, capsys):
+    assert bench.compare({'new_case': {'wall_ms': 1e6, 'peak_rss_mb': 1e6}}, {}, tolerance=25) == []
+    assert 'new' in capsys.readouterr().out
+
+
+def test_baseline_covers_every_case(bench):
+    with open(bench.DEFAULT_BASELINE) as f:
+        baseline = json.load(f)
+    assert set(baseline) == set(bench.CASES)
@@ -0,0 +1,109 @@
+"""Market breadth against a ticker-by-ticker count, and breadth as a warning classifier input"""
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+from panic_analyzer import (BREADTH_LOW_WINDOW, WARNING_PRIORITY, classify_pre_panic_codes,
+                            market_breadth)
+
+
+def brute_breadth(analyzer, drop=-2.0):
+    """market_breadth's columns, one ticker and one day at a time from the raw frames"""
+    dates = analyzer.calendar.dates
+    tickers = sorted(name[:-4] for name in os.listdir(analyzer.data_dir)
+                     if name.endswith('.csv') and name != 'VNINDEX.csv')
+    frames = {t: analyzer.load_ticker_data(t) for t in tickers}
+    filled = {t: (frames[t]['close'].reindex(dates).ffill().tolist(), frames[t]['low'].reindex(dates).ffill().tolist())
+              for t in tickers}
+    
+    rows = []
+    for i, date in enumerate(dates):
+        row = dict.fromkeys(('advances', 'declines', 'unchanged', 'traded', 'down', 'new_52w_lows'), 0)
+        eligible = {20: 0, 50: 0, 'low': 0}
+        below = {20: 0, 50: 0}
+        ties = {20: 0, 50: 0}
+        for t in tickers:
+            change = analyzer.get_price_change(frames[t], date)
+            if change is None:
+                continue
+            row['traded'] += 1
+            row['advances'] += change.change > 0
+            row['declines'] += change.change < 0
+            row['unchanged'] += change.change == 0
+            row['down'] += change.change <= drop
+            
+            closes, lows = filled[t]
+            for window in (20, 50):
+                history = closes[i - window + 1:i + 1] if i + 1 >= window else []
+                if history and not any(math.isnan(c) for c in history):
+                    average = math.fsum(history) / window
+                    eligible[window] += 1
+                    below[window] += change.target_close < average
+                    ties[window] += math.isclose(change.target_close, average, rel_tol=1e-12)
+            prior = lows[i - BREADTH_LOW_WINDOW:i] if i >= BREADTH_LOW_WINDOW else []
+            if prior and not any(math.isnan(v) for v in prior):
+                eligible['low'] += 1
+                row['new_52w_lows'] += change.target_low < min(prior)
+        
+        def pct(count, total):
+            return count * 100.0 / total if total else np.nan
+        
+        row['pct_down'] = pct(row.pop('down'), row['traded'])
+        for window in (20, 50):
+            row[f"pct_below_ma{window}"] = pct(below[window], eligible[window])
+            # A close on its average may land either side of a rolling mean's rounding
+            row[f"tie_pct_ma{window}"] = pct(ties[window], eligible[window])
+        row['pct_new_52w_lows'] = pct(row['new_52w_lows'], eligible['low'])
+        rows.append(row)
+    return pd.DataFrame(rows, index=dates.rename('date'))
+
+
+def test_breadth_matches_a_brute_force_count(analyzer):
+    breadth = analyzer.compute_breadth()
+    expected = brute_breadth(analyzer)
+    for window in (20, 50):
+        column = f"pct_below_ma{window}"
+        ties = expected.pop(f"tie_pct_ma{window}")
+        tied = (ties > 0).to_numpy()
+        assert (breadth[column][tied] - expected[column][tied]).between(-1e-9, ties[tied] + 1e-9).all()
+        expected.loc[tied, column] = breadth[column][tied]
+    for column in expected:
+        np.testing.assert_allclose(breadth[column].to_numpy(dtype=float), expected[column].to_numpy(dtype=float),
+                                   rtol=1e-9, equal_nan=True, err_msg=column)
+    assert breadth['new_52w_lows'].sum() > 0
+    assert breadth['pct_below_ma50'].notna().sum() > 0
+
+
+def test_breadth_drop_cutoff(analyzer):
+    engine = analyzer.universe_engine
+    columns = [engine.columns[t] for t in engine.sector_weights['EQUAL_WEIGHT']]
+    breadth = market_breadth(engine.close[:, columns], engine.low[:, columns],
+                             engine.change[:, columns], engine.valid[:, columns], drop=-3.0)
+    np.testing.assert_allclose(breadth['pct_down'], brute_breadth(analyzer, drop=-3.0)['pct_down'], equal_nan=True)
+
+
+def test_breadth_range(analyzer):
+    breadth = analyzer.compute_breadth('2021-05-01', '2021-05-31')
+    assert list(breadth.index.strftime('%Y-%m-%d')) == analyzer.calendar.between('2021-05-01', '2021-05-31')
+
+
+def test_breadth_codes_match_the_scalar_rule(analyzer):
+    labels, vnindex_change, bsi, ssi, rsi, _ = analyzer.backtest_arrays()
+    breadth = analyzer.compute_breadth()
+    codes = classify_pre_panic_codes(bsi, ssi, rsi, vnindex_change, breadth=breadth)
+    raised = 0
+    for i, date in enumerate(labels[1:], 1):
+        row = breadth.iloc[i]
+        signal = analyzer.classify_pre_panic_signal(bsi[i], ssi[i], rsi[i], vnindex_change[i], breadth=row)
+        assert codes[i] == WARNING_PRIORITY[signal], date
+        raised += signal != analyzer.classify_pre_panic_signal(bsi[i], ssi[i], rsi[i], vnindex_change[i])
+    assert raised > 0  # breadth changed some days' level
+
+
+def test_breadth_backtest_only_raises_warnings(analyzer):
+    report = analyzer.compute_backtest(panic_dates=analyzer.detect_panic_dates(), breadth=True)
+    plain = analyzer.compute_backtest(panic_dates=analyzer.detect_panic_dates())
+    for with_breadth, without in zip(report.warning_classifier, plain.warning_classifier):
+        assert with_breadth.predictions >= without.predictions
@@ -0,0 +1,47 @@
+"""TradingCalendar lookups against a plain scan of the trading days"""
+import pandas as pd
+import pytest
+
+from panic_analyzer import TradingCalendar
+
+
+@pytest.fixture
+def calendar(market):
+    return TradingCalendar(pd.to_datetime(market['VNINDEX']['time']))
+
+
+def days_before(labels, date):
+    """Trading days strictly before a date, oldest first"""
+    return [label for label in labels if label < date]
+
+
+@pytest.mark.parametrize('date', ['2021-01-04', '2021-01-05', '2021-03-06', '2021-03-08', '2021-05-24', '2022-06-30'])
+def test_lookups_match_a_scan(calendar, date):
+    before = days_before(calendar.labels, date)
+    assert calendar.count_before(date) == len(before)
+    assert calendar.window(date, 14) == before[::-1][:14]
+    for n in (1, 7, 14):
+        assert calendar.shift(date, n) == (before[-n] if len(before) >= n else None)
+    assert calendar.previous(date) == (before[-1] if before else None)
+
+
+def test_ordinal(calendar):
+    assert calendar.ordinal('2021-01-04') == 0
+    assert calendar.ordinal(pd.Timestamp('2021-01-05')) == 1
+    assert calendar.ordinal('2021-01-09') is None  # a Saturday
+
+
+def test_between_and_span(calendar):
+    # Weekend bounds fall back to the trading days inside them
+    assert calendar.between('2021-01-09', '2021-01-17') == ['2021-01-11', '2021-01-12', '2021-01-13', '2021-01-14', '2021-01-15']
+    assert calendar.span('2021-01-09', '2021-01-17') == (5, 10)
+    assert calendar.between('2021-01-16', '2021-01-17') == []
+
+
+def test_extend(calendar, market):
+    labels = list(calendar.labels)
+    extended = TradingCalendar(pd.to_datetime(market['VNINDEX']['time'][:100]))
+    extended.extend(calendar.dates[100:])
+    assert extended.labels == labels
+    assert extended.ordinal(labels[-1]) == len(labels) - 1
+    assert extended.window(labels[-1], 3) == labels[-4:-1][::-1]
@@ -0,0 +1,84 @@
+"""Vectorized warning classification and the warning history against their scalar versions"""
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from panic_analyzer import WARNING_PRIORITY, WARNING_THRESHOLDS, classify_pre_panic_codes
+
+
+def none_if_nan(value):
+    return None if math.isnan(value) else float(value)
+
+
+def label(value):
+    """A warning history label, None where the column holds a missing value"""
+    return None if pd.isna(value) else value
+
+
+@pytest.fixture(scope='module')
+def indicator_grid():
+    """bsi, ssi, rsi, vnindex_change arrays landing on and around every threshold, with some NaN"""
+    rng = np.random.default_rng(7)
+    values = np.concatenate([np.arange(-8.0, 2.5, 0.5), [np.nan]])
+    return tuple(rng.choice(values, 4000) for _ in range(4))
+
+
+def test_warning_codes_match_classify_pre_panic_signal(analyzer, indicator_grid):
+    codes = classify_pre_panic_codes(*indicator_grid)
+    for code, row in zip(codes, zip(*indicator_grid)):
+        signal = analyzer.classify_pre_panic_signal(*map(none_if_nan, row))
+        assert code == WARNING_PRIORITY[signal], row
+
+
+def test_warning_codes_take_threshold_arrays(indicator_grid):
+    """A (combinations, 1) threshold broadcasts to one row of codes per combination"""
+    strong_rsi = np.array([-3.0, -2.0, -1.0])
+    thresholds = dict(WARNING_THRESHOLDS, strong_rsi=strong_rsi[:, None])
+    codes = classify_pre_panic_codes(*indicator_grid, thresholds)
+    assert codes.shape == (3, len(indicator_grid[0]))
+    for row, value in zip(codes, strong_rsi):
+        np.testing.assert_array_equal(row, classify_pre_panic_codes(*indicator_grid, dict(WARNING_THRESHOLDS, strong_rsi=value)))
+
+
+def test_warning_history_matches_compute_pre_panic_pattern(analyzer):
+    history = analyzer.compute_warning_history()
+    for date in analyzer.calendar.labels:
+        result = analyzer.compute_pre_panic_pattern(date)
+        row = history.loc[date]
+        
+        assert row['strongest_warning'] == result.strongest_warning, date
+        assert row['pattern_analysis'] == result.pattern_analysis, date
+        assert row['drops_14d'] == len(result.significant_drops), date
+        for timeframe, column in (('T-1', 'signal_t1'), ('T-7', 'signal_t7'), ('T-14', 'signal_t14')):
+            signal = result.pre_panic_signals.get(timeframe)
+            assert label(row[column]) == (signal.signal if signal else None), (date, timeframe)
+        if len(result.pre_panic_signals) >= 2:
+            assert row['warning_progression'] == analyzer.analyze_warning_progression(result.pre_panic_signals), date
+
+
+def test_warning_history_signal_is_the_day_itself(analyzer):
+    history = analyzer.compute_warning_history('2021-05-01', '2021-06-30')
+    assert history.index[0].strftime('%Y-%m-%d') == '2021-05-03'
+    for date, row in history.iterrows():
+        data = analyzer.get_date_data(date)
+        assert row['signal'] == analyzer.classify_pre_panic_signal(data.bsi, data.ssi, data.rsi, data.vnindex_change)
+
+
+def test_significant_drops_are_labelled_with_their_offset(analyzer):
+    labels = analyzer.calendar.labels
+    # Day 100 starts a two-day panic cluster; both days had ≥2% drops 3 and 9 days before them
+    result = analyzer.compute_pre_panic_pattern(labels[100])
+    assert [(drop.date, drop.days_before) for drop in result.significant_drops] == [
+        (labels[91], 9), (labels[92], 8), (labels[97], 3), (labels[98], 2)
+    ]
+    assert result.pattern_analysis == 'MULTIPLE_WEAKNESS_EVENTS'
+
+
+def test_days_without_data_have_no_signal(analyzer):
+    history = analyzer.compute_warning_history()
+    assert np.isnan(history['vnindex_change'].iat[0])
+    assert label(history['signal'].iat[0]) is None
+    assert label(history['signal_t1'].iat[1]) is None  # T-1 is the first day, which has no change
+    assert label(history['signal_t1'].iat[2]) is not None
@@ -0,0 +1,111 @@
+"""Date range and cycle analysis against a day-by-day scan of the calendar, and the DateTable it returns"""
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def scan_date_range(analyzer, start_date, end_date):
+    """The original analyze_date_range loop: probe every calendar day, look back over earlier results"""
+    results, panic_days, stabilization, recovery = [], [], [], []
+    for date in pd.date_range(start_date, end_date).strftime('%Y-%m-%d'):
+        data = analyzer.get_date_data(date)
+        if not data:
+            continue
+        results.append(data)
+        if abs(data.vnindex_change) >= 3.0:
+            panic_days.append(date)
+        elif data.bsi is not None and data.bsi > 1.0:
+            if any(abs(r.vnindex_change) >= 3.0 for r in results[-5:-1]):
+                stabilization.append(date)
+        elif data.ssi is not None and data.vnindex_change > 0 and data.ssi > data.vnindex_change + 1.0:
+            if any(r.bsi is not None and r.bsi > 1.0 for r in results[-3:-1]):
+                recovery.append(date)
+    return [r.date for r in results], panic_days, stabilization, recovery
+
+
+@pytest.mark.parametrize('start_date, end_date', [
+    ('2021-01-01', '2022-03-31'),
+    ('2021-05-22', '2021-06-13'),   # weekend bounds
+    ('2021-05-25', '2021-05-28')    # starts the day after a panic
+])
+def test_date_range_matches_a_calendar_scan(analyzer, start_date, end_date):
+    result = analyzer.compute_date_range(start_date, end_date)
+    dates, panic_days, stabilization, recovery = scan_date_range(analyzer, start_date, end_date)
+    
+    assert result.all_results.dates == dates
+    assert [d.date for d in result.panic_days] == panic_days
+    assert [d.date for d in result.banking_stabilization] == stabilization
+    assert [d.date for d in result.securities_recovery] == recovery
+
+
+def test_date_range_finds_the_seeded_panics(analyzer):
+    result = analyzer.compute_date_range('2021-01-01', '2022-03-31')
+    labels = analyzer.calendar.labels
+    assert [d.date for d in result.panic_days] == [labels[i] for i in (100, 101, 180, 260)]
+
+
+def test_empty_range(analyzer):
+    result = analyzer.compute_date_range('2021-01-09', '2021-01-10')
+    assert len(result.all_results) == 0
+    assert result.panic_days == []
+
+
+def scan_cycles(analyzer, range_analysis, stabilization_days=5, recovery_days=3):
+    """The original analyze_complete_cycle loop, with its windows counted in trading days"""
+    ordinal = analyzer.calendar.ordinal
+    cycles = []
+    for panic in range_analysis.panic_days:
+        p = ordinal(panic.date)
+        stabilization = next((s for s in range_analysis.banking_stabilization
+                              if p < ordinal(s.date) <= p + stabilization_days), None)
+        if stabilization is None:
+            continue
+        s = ordinal(stabilization.date)
+        recovery = [r.date for r in range_analysis.securities_recovery if s < ordinal(r.date) <= s + recovery_days]
+        if recovery:
+            cycles.append((panic.date, stabilization.date, recovery))
+    return cycles
+
+
+@pytest.mark.parametrize('stabilization_days, recovery_days', [(5, 3), (2, 1), (10, 10)])
+def test_cycles_match_a_scan(analyzer, stabilization_days, recovery_days):
+    result = analyzer.compute_complete_cycle('2021-01-01', '2022-03-31', stabilization_days, recovery_days)
+    found = [(c.panic.date, c.banking_stabilization.date, [r.date for r in c.securities_recovery]) for c in result.cycles]
+    assert found == scan_cycles(analyzer, result.range_analysis, stabilization_days, recovery_days)
+
+
+def test_cycles_count_trading_days(analyzer):
+    labels = analyzer.calendar.labels
+    result = analyzer.compute_complete_cycle('2021-01-01', '2022-03-31')
+    found = [(c.panic.date, c.banking_stabilization.date, [r.date for r in c.securities_recovery]) for c in result.cycles]
+    # Both days of the first panic cluster lead to a stabilization 6 and 7 calendar days later
+    assert found == [
+        (labels[100], labels[105], [labels[106]]),
+        (labels[101], labels[105], [labels[106]]),
+        (labels[260], labels[262], [labels[263]])
+    ]
+
+
+def test_date_table_rows_match_get_date_data(analyzer):
+    labels = analyzer.calendar.labels
+    table = analyzer.compute_date_range(labels[0], labels[-1]).all_results
+    assert table.dates == labels[1:]  # the first day has no previous close
+    for k in (0, 1, 100, -1):
+        data = table[k]
+        assert data.to_dict() == analyzer.get_date_data(table.dates[k]).to_dict()
+        for name in ('vnindex_change', 'bsi', 'ssi', 'rsi'):
+            value = getattr(data, name)
+            assert (math.isnan(getattr(table, name)[k]) if value is None else getattr(table, name)[k] == value)
+    assert table.to_dicts()[100] == table[100].to_dict()
+
+
+def test_date_table_slices_are_views(analyzer):
+    labels = analyzer.calendar.labels
+    table = analyzer.compute_date_range(labels[0], labels[-1]).all_results
+    tail = table[-5:]
+    assert tail.dates == labels[-5:]
+    assert np.shares_memory(tail.bsi, table.bsi)
+    assert [data.date for data in tail] == labels[-5:]
+    assert len(table[10:10]) == 0
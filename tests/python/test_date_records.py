@@ -0,0 +1,62 @@
+"""DateRecordCache: single-date answers from dates.bin against the engine"""
+import json
+import os
+
+import pytest
+
+from panic_analyzer import DateRecordCache, VietnamesePanicAnalyzer
+
+
+def answer(data):
+    """A date's analysis as comparable JSON (NaN risk features included)"""
+    return json.dumps(data.to_dict() if data is not None else None, sort_keys=True)
+
+
+@pytest.fixture
+def cold(analyzer, market_data):
+    """A second analyzer that has not built its engine, after the first one wrote the date cache"""
+    analyzer.engine
+    cold = VietnamesePanicAnalyzer(market_data)
+    cold.renderer = None
+    assert cold.date_records is not None
+    return cold
+
+
+def test_records_match_the_engine_on_every_date(analyzer, cold):
+    for date in analyzer.calendar.labels:
+        assert answer(cold.get_date_data(date)) == answer(analyzer.get_date_data(date)), date
+    assert cold._engine is None  # every answer came from dates.bin
+
+
+def test_closed_days_and_other_date_formats(analyzer, cold):
+    assert cold.get_date_data('2021-01-09') is None
+    assert cold._engine is None
+    
+    # Not YYYY-MM-DD: the engine parses it instead
+    assert answer(cold.get_date_data('2021/05/24')) == answer(analyzer.get_date_data('2021/05/24'))
+
+
+def test_changed_csv_invalidates_the_records(analyzer, market_data):
+    analyzer.engine
+    records = DateRecordCache(market_data)
+    assert records.load(analyzer._core_weights())
+    
+    path = os.path.join(market_data, 'VCB.csv')
+    with open(path, 'a') as f:
+        f.write("VCB,2022-03-28,30.00,30.00,30.00,30.00,1000\n")
+    assert not DateRecordCache(market_data).load(analyzer._core_weights())
+
+
+def test_other_weights_invalidate_the_records(analyzer, market_data):
+    analyzer.engine
+    weights = analyzer._core_weights()
+    weights['bsi'] = dict(reversed(list(weights['bsi'].items())))  # same weights, other summation order
+    assert not DateRecordCache(market_data).load(weights)
+
+
+def test_truncated_rows_are_ignored(analyzer, market_data):
+    analyzer.engine
+    rows_path = os.path.join(market_data, '.cache', 'dates.bin')
+    with open(rows_path, 'r+b') as f:
+        f.truncate(os.path.getsize(rows_path) - 8)
+    assert not DateRecordCache(market_data).load(analyzer._core_weights())
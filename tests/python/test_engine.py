@@ -0,0 +1,82 @@
+"""SectorIndicatorEngine against the per-date scalar path (get_price_change, calculate_sector_indicator)"""
+import numpy as np
+import pandas as pd
+
+from panic_analyzer import GroupIndicatorEngine, TickerChange
+
+
+def scalar_date_data(analyzer, date):
+    """What get_date_data computed per date before the engine: one lookup per ticker"""
+    changes = {}
+    for ticker in analyzer.all_tickers:
+        change = analyzer.get_price_change(analyzer.load_ticker_data(ticker), date)
+        if change is not None:
+            changes[ticker] = change
+    indicators = {
+        name: analyzer.calculate_sector_indicator(changes, weights)[0]
+        for name, weights in analyzer._core_weights().items()
+    }
+    return changes, indicators
+
+
+def test_engine_matches_get_price_change_on_every_date(analyzer):
+    engine = analyzer.engine
+    for i, date in enumerate(analyzer.calendar.labels):
+        changes, indicators = scalar_date_data(analyzer, date)
+        
+        for ticker in analyzer.all_tickers:
+            engine_change = engine.ticker_data(i, ticker)
+            if ticker not in changes:
+                assert engine_change is None, (date, ticker)
+                continue
+            assert isinstance(engine_change, TickerChange)
+            assert engine_change.to_dict() == changes[ticker].to_dict(), (date, ticker)
+        
+        # Same summation order, so the indicators agree exactly
+        for name, value in indicators.items():
+            assert engine.indicator(i, name) == value, (date, name)
+
+
+def test_get_date_data_matches_scalar_path(analyzer):
+    for date in analyzer.calendar.labels[1:]:
+        data = analyzer.get_date_data(date)
+        changes, indicators = scalar_date_data(analyzer, date)
+        
+        assert data.all_data == changes
+        assert (data.bsi, data.ssi, data.rsi) == (indicators['bsi'], indicators['ssi'], indicators['rsi'])
+        assert data.panic_type == analyzer.classify_panic_type(data.bsi, data.ssi, data.rsi, changes['VNINDEX'].change)
+        assert data.banking_valid == [t for t in analyzer.banking_weights if t in changes]
+
+
+def test_gaps_and_listing_days(analyzer):
+    engine = analyzer.engine
+    labels = analyzer.calendar.labels
+    
+    # No previous row on the first day of the history or of a listing
+    assert analyzer.get_date_data(labels[0]) is None
+    assert engine.ticker_data(40, 'NVL') is None
+    assert engine.ticker_data(41, 'NVL') is not None
+    
+    # After a suspension the previous close is the last close before it
+    shs = analyzer.load_ticker_data('SHS')
+    resumed = engine.ticker_data(56, 'SHS')
+    assert resumed.prev_close == shs['close'].loc[:labels[49]].iat[-1]
+    
+    # A ticker missing on the day drops out of its sector's weights
+    data = analyzer.get_date_data(labels[101])
+    assert 'VPB' not in data.all_data
+    assert 'VPB' not in data.banking_valid
+    assert engine.indicators['bsi_count'].iat[101] == 4
+
+
+def test_non_trading_day(analyzer):
+    assert analyzer.get_date_data('2021-01-09') is None  # a Saturday
+    assert analyzer.engine.row('2021-01-09') is None
+
+
+def test_group_engine_matches_sector_engine(analyzer):
+    group = GroupIndicatorEngine(analyzer.store, analyzer.calendar, analyzer._core_weights())
+    for name in ('bsi', 'ssi', 'rsi'):
+        np.testing.assert_allclose(group.indicators[name], analyzer.engine.indicators[name], rtol=1e-12, atol=1e-12)
+        pd.testing.assert_series_equal(group.indicators[f"{name}_count"], analyzer.engine.indicators[f"{name}_count"])
+
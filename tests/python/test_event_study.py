@@ -0,0 +1,95 @@
+"""Event study paths against per-event loops over the calendar"""
+import math
+
+import numpy as np
+import pytest
+
+from panic_analyzer import PANIC_TYPES, event_windows
+
+
+def event_paths(series, events, before, after):
+    """(daily, cumulative) event x offset arrays for one series, one event and day at a time"""
+    daily = np.full((len(events), before + after + 1), np.nan)
+    cumulative = np.full_like(daily, np.nan)
+    for e, day in enumerate(events):
+        def change(offset):
+            i = day + offset
+            return series[i] if 0 <= i < len(series) else math.nan
+        
+        for k, offset in enumerate(range(-before, after + 1)):
+            value = change(offset)
+            if math.isnan(value):
+                continue
+            daily[e, k] = value
+            # Compounded from the close before the event day; days without data are unchanged
+            if offset >= 0:
+                factors = [change(o) for o in range(0, offset + 1)]
+                level = np.prod([1 + f / 100 for f in np.nan_to_num(factors)])
+            else:
+                factors = [change(o) for o in range(offset + 1, 0)]
+                level = 1 / np.prod([1 + f / 100 for f in np.nan_to_num(factors)])
+            cumulative[e, k] = (level - 1) * 100
+    return daily, cumulative
+
+
+def test_event_windows_pad_with_nan():
+    values = np.arange(10, dtype=float)[:, None]
+    windows = event_windows(values, [1, 8], before=2, after=2)
+    assert np.array_equal(windows[:, :, 0], [[np.nan, 0, 1, 2, 3], [6, 7, 8, 9, np.nan]], equal_nan=True)
+
+
+def test_paths_match_per_event_loops(analyzer):
+    before, after = 5, 10
+    study = analyzer.compute_event_study(before=before, after=after)
+    engine = analyzer.engine
+    j = engine.columns['VNINDEX']
+    events = [analyzer.calendar.ordinal(date) for date in analyzer.detect_panic_dates()]
+    series = {
+        'vnindex': np.where(engine.valid[:, j], engine.change[:, j], np.nan),
+        'bsi': engine.indicators['bsi'].to_numpy(),
+        'rsi': engine.indicators['rsi'].to_numpy()
+    }
+    
+    everything = study.loc['ALL']
+    assert (everything['events'] == len(events)).all()
+    assert list(everything.index) == list(range(-before, after + 1))
+    for name, values in series.items():
+        daily, cumulative = event_paths(values, events, before, after)
+        np.testing.assert_allclose(everything[f"{name}_mean"], np.nanmean(daily, axis=0), rtol=1e-9)
+        np.testing.assert_allclose(everything[f"{name}_median"], np.nanmedian(daily, axis=0), rtol=1e-9)
+        np.testing.assert_allclose(everything[f"{name}_std"], np.nanstd(daily, axis=0, ddof=1), rtol=1e-9)
+        np.testing.assert_allclose(everything[f"{name}_cum_mean"], np.nanmean(cumulative, axis=0), rtol=1e-9, atol=1e-12)
+    assert (everything.loc[-1, ['vnindex_cum_mean', 'bsi_cum_mean']] == 0).all()
+
+
+def test_events_are_grouped_by_panic_type(analyzer):
+    study = analyzer.compute_event_study(before=2, after=2)
+    types = {}
+    for date in analyzer.detect_panic_dates():
+        panic_type = analyzer.get_date_data(date).panic_type
+        types[panic_type] = types.get(panic_type, 0) + 1
+    groups = study.index.get_level_values('panic_type').unique().tolist()
+    assert groups == ['ALL'] + [t for t in PANIC_TYPES if t in types]
+    for panic_type, count in types.items():
+        assert (study.loc[panic_type, 'events'] == count).all()
+
+
+def test_event_selection(analyzer):
+    labels = analyzer.calendar.labels
+    by_date = analyzer.compute_event_study(event_dates=[labels[1], labels[-1], '2021-01-09'], before=3, after=3)
+    assert (by_date.loc['ALL', 'events'] == 2).all()  # the Saturday is not a trading day
+    
+    # Windows running off either end of the history only average the event that has the day
+    vnindex = analyzer.engine.change[:, analyzer.engine.columns['VNINDEX']]
+    assert by_date.loc[('ALL', -3), 'vnindex_mean'] == pytest.approx(vnindex[len(labels) - 4])
+    assert by_date.loc[('ALL', 3), 'vnindex_mean'] == pytest.approx(vnindex[4])
+    
+    in_range = analyzer.compute_event_study(start_date=labels[150], before=1, after=1)
+    assert (in_range.loc['ALL', 'events'] == 2).all()
+    
+    typed = analyzer.compute_event_study(panic_type='UNCLEAR_PATTERN', before=1, after=1)
+    expected = sum(analyzer.get_date_data(d).panic_type == 'UNCLEAR_PATTERN' for d in labels[1:])
+    assert (typed.loc['ALL', 'events'] == expected).all()
+    
+    with pytest.raises(ValueError, match='Unknown panic type'):
+        analyzer.compute_event_study(panic_type='MILD_PANIC')
@@ -0,0 +1,85 @@
+"""The exported panel against the per-date analysis it flattens"""
+import math
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from panic_analyzer import write_panel
+
+
+def value(x):
+    return math.nan if x is None else x
+
+
+def test_panel_rows_match_get_date_data(sector_files, analyzer):
+    panel = analyzer.compute_panel()
+    assert list(panel.index.strftime('%Y-%m-%d')) == analyzer.calendar.labels
+    assert (panel['year'] == panel.index.year).all()
+    sectors = analyzer.compute_sector_indicators()
+    
+    for i, date in enumerate(analyzer.calendar.labels):
+        row = panel.iloc[i]
+        data = analyzer.get_date_data(date)
+        if data is None:
+            assert math.isnan(row['vnindex_change']) and pd.isna(row['pre_panic_signal'])
+            continue
+        np.testing.assert_equal([row['vnindex_change'], row['vnindex_intraday_drop'], row['bsi'], row['ssi'], row['rsi']],
+                                [data.vnindex_change, data.vnindex_data.intraday_drop,
+                                 value(data.bsi), value(data.ssi), value(data.rsi)])
+        assert row['panic_type'] == data.panic_type
+        assert row['pre_panic_signal'] == analyzer.classify_pre_panic_signal(
+            data.bsi, data.ssi, data.rsi, data.vnindex_change)
+        for name in analyzer.sector_weights:
+            np.testing.assert_equal(row[f"sector_{name}"], sectors[name].iat[i])
+        for ticker in ('VCB', 'SHS', 'BBB', 'CCC'):
+            change = data.all_data.get(ticker) or analyzer.get_price_change(analyzer.load_ticker_data(ticker), date)
+            np.testing.assert_allclose(row[f"{ticker}_change"], math.nan if change is None else change.change,
+                                       rtol=1e-12, err_msg=f"{date} {ticker}")
+
+
+def test_panel_covers_every_ticker(sector_files, analyzer, market):
+    panel = analyzer.compute_panel()
+    tickers = [t for t in market if t != 'VNINDEX']
+    assert [c for c in panel.columns if c.endswith('_change') and c != 'vnindex_change'] == \
+        [f"{t}_change" for t in sorted(tickers)]
+    assert panel['BBB_change'].iloc[:201].isna().all()  # listed on day 200
+
+
+def test_panel_range(sector_files, analyzer):
+    labels = analyzer.calendar.labels
+    panel = analyzer.compute_panel(labels[10], labels[20])
+    pd.testing.assert_frame_equal(panel, analyzer.compute_panel().loc[labels[10]:labels[20]])
+
+
+@pytest.mark.parametrize('name', ['panel.parquet', 'panel.arrow', 'panel'])
+def test_written_panel_reads_back(sector_files, analyzer, tmp_path, name):
+    pq = pytest.importorskip('pyarrow.parquet')
+    import pyarrow.dataset as ds
+    import pyarrow.feather as feather
+    
+    panel = analyzer.compute_panel()
+    path = str(tmp_path / name)
+    write_panel(panel, path)
+    if name.endswith('.parquet'):
+        table = pq.read_table(path)
+    elif name.endswith('.arrow'):
+        table = feather.read_table(path)
+    else:
+        table = ds.dataset(path, partitioning='hive').to_table()
+    read = table.to_pandas().set_index('date').sort_index()
+    assert len(read) == len(panel)
+    np.testing.assert_array_equal(read['bsi'].to_numpy(), panel['bsi'].to_numpy())
+
+
+def test_unknown_panel_format(sector_files, analyzer, tmp_path):
+    pytest.importorskip('pyarrow')
+    with pytest.raises(ValueError, match='Unknown panel format'):
+        write_panel(analyzer.compute_panel(), str(tmp_path / 'panel.csv'))
+
+
+def test_export_without_pyarrow(sector_files, analyzer, tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, 'pyarrow', None)
+    with pytest.raises(ImportError, match='pip install pyarrow'):
+        write_panel(analyzer.compute_panel(), str(tmp_path / 'panel.parquet'))
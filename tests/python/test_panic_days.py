@@ -0,0 +1,51 @@
+"""Panic-day detection against a loop over the VNINDEX change series"""
+import numpy as np
+import pytest
+
+from panic_analyzer import detect_panic_days
+
+
+def brute_panic_days(change, threshold, direction, cluster_days):
+    days, onsets = [], []
+    for i, value in enumerate(change):
+        if np.isnan(value):
+            continue
+        if (direction == 'both' and abs(value) >= threshold or direction == 'down' and value <= -threshold or
+                direction == 'up' and value >= threshold):
+            onsets.append(onsets[-1] if days and i - days[-1] <= cluster_days else i)
+            days.append(i)
+    return days, onsets
+
+
+@pytest.mark.parametrize('direction', ['both', 'down', 'up'])
+@pytest.mark.parametrize('cluster_days', [0, 1, 3])
+def test_detect_panic_days_matches_a_loop(direction, cluster_days):
+    rng = np.random.default_rng(cluster_days)
+    change = rng.normal(0, 2.0, 500)
+    change[rng.random(500) < 0.05] = np.nan
+    change[[10, 11, 12, 20]] = [-3.0, 3.0, -3.0, -2.99]  # on and just under the threshold
+    
+    days, onsets = detect_panic_days(change, 3.0, direction, cluster_days)
+    assert (days.tolist(), onsets.tolist()) == brute_panic_days(change, 3.0, direction, cluster_days)
+
+
+def test_unknown_direction():
+    with pytest.raises(ValueError, match='Unknown panic direction'):
+        detect_panic_days(np.zeros(3), direction='sideways')
+
+
+def test_panic_days_on_the_fixture(analyzer):
+    labels = analyzer.calendar.labels
+    table = analyzer.compute_panic_days()
+    assert list(table.index.strftime('%Y-%m-%d')) == [labels[i] for i in (100, 101, 180, 260)]
+    assert table['cluster_start'].tolist() == [labels[i] for i in (100, 100, 180, 260)]
+    assert table['cluster_day'].tolist() == [1, 2, 1, 1]
+    assert table['cluster_size'].tolist() == [2, 2, 1, 1]
+    
+    assert analyzer.detect_panic_dates() == [labels[i] for i in (100, 180, 260)]
+    assert analyzer.detect_panic_dates(direction='down') == [labels[i] for i in (100, 260)]
+    assert analyzer.detect_panic_dates(cluster_days=0) == [labels[i] for i in (100, 101, 180, 260)]
+    
+    # A cluster that started before the range keeps its start
+    assert analyzer.compute_panic_days(start_date=labels[101])['cluster_start'].iat[0] == labels[100]
+    assert analyzer.detect_panic_dates(start_date=labels[101]) == [labels[i] for i in (180, 260)]
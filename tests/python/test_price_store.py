@@ -0,0 +1,192 @@
+"""PriceStore: one shared store per directory, the columnar cache and its invalidation"""
+import os
+
+import pandas as pd
+
+from panic_analyzer import PriceStore, VietnamesePanicAnalyzer
+
+
+def full_parse(market_data, ticker):
+    return PriceStore(market_data, use_cache=False).get(ticker)
+
+
+def rewrite(path, old, new):
+    """Replace text in a CSV in place and move its mtime on, as an editor saving it would"""
+    with open(path) as f:
+        text = f.read()
+    assert text.count(old) == 1
+    stat = os.stat(path)
+    with open(path, 'w') as f:
+        f.write(text.replace(old, new))
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_cache_is_read_instead_of_parsing(market_data):
+    first = PriceStore(market_data)
+    frame = first.get('VCB')
+    assert (first.parse_count, first.cache_reads) == (1, 0)
+    
+    second = PriceStore(market_data)
+    cached = second.get('VCB')
+    assert (second.parse_count, second.cache_reads) == (0, 1)
+    pd.testing.assert_frame_equal(cached, frame, check_freq=False)
+
+
+def test_frames_are_parsed_once_per_store(market_data):
+    store = PriceStore(market_data, use_cache=False)
+    assert store.get('VCB') is store.get('VCB')
+    assert store.parse_count == 1
+
+
+def test_analyzers_share_one_store_per_directory(market_data, tmp_path, monkeypatch):
+    monkeypatch.setattr(PriceStore, '_shared', {})
+    first = VietnamesePanicAnalyzer(market_data)
+    second = VietnamesePanicAnalyzer(os.path.join(market_data, '..', 'market_data'))
+    assert first.store is second.store is PriceStore.shared(market_data)
+    assert PriceStore.shared(str(tmp_path)) is not first.store
+    
+    frame = first.load_ticker_data('VCB')
+    assert second.load_ticker_data('VCB') is frame
+    assert first.store.parse_count + first.store.cache_reads == 1
+
+
+def test_missing_ticker_is_empty(market_data):
+    assert PriceStore(market_data).get('XYZ').empty
+
+
+def test_edited_csv_invalidates_the_cache(market_data, market):
+    PriceStore(market_data).get('VCB')
+    
+    path = os.path.join(market_data, 'VCB.csv')
+    row = market['VCB'].iloc[10]
+    rewrite(path, f"{row['time']},{row['open']:.2f}", f"{row['time']},{row['open'] + 1:.2f}")
+    
+    store = PriceStore(market_data)
+    frame = store.get('VCB')
+    assert store.parse_count == 1
+    assert frame['open'].iat[10] == round(row['open'] + 1, 2)
+
+
+def test_unreadable_cache_entry_is_rebuilt(market_data):
+    PriceStore(market_data).get('VCB')
+    with open(os.path.join(market_data, '.cache', 'VCB', 'close.npy'), 'wb') as f:
+        f.write(b'not an array')
+    
+    store = PriceStore(market_data)
+    pd.testing.assert_frame_equal(store.get('VCB'), full_parse(market_data, 'VCB'), check_freq=False)
+    assert store.parse_count == 1
+    
+    rebuilt = PriceStore(market_data)
+    rebuilt.get('VCB')
+    assert (rebuilt.parse_count, rebuilt.cache_reads) == (0, 1)
+
+
+def append(market_data, ticker, rows):
+    """Append (date, close) rows to a ticker's CSV"""
+    with open(os.path.join(market_data, f"{ticker}.csv"), 'a') as f:
+        for date, close in rows:
+            f.write(f"{ticker},{date},{close:.2f},{close * 1.01:.2f},{close * 0.98:.2f},{close:.2f},1000\n")
+
+
+def csv_line(market_data, ticker, date):
+    with open(os.path.join(market_data, f"{ticker}.csv")) as f:
+        return next(line.rstrip('\n') for line in f if f",{date}," in line)
+
+
+def same_size_edit(line):
+    """The line with the last digit of its close changed, so the file keeps its size"""
+    fields = line.split(',')
+    fields[5] = fields[5][:-1] + str((int(fields[5][-1]) + 1) % 10)
+    return ','.join(fields)
+
+
+NEW_DAYS = [('2022-03-28', 31.5), ('2022-03-29', 29.75)]
+
+
+def test_appended_rows_are_parsed_alone_on_load(market_data):
+    PriceStore(market_data).get('VCB')
+    append(market_data, 'VCB', NEW_DAYS)
+    
+    store = PriceStore(market_data)
+    frame = store.get('VCB')
+    assert (store.parse_count, store.append_count, store.appended_rows) == (0, 1, 2)
+    pd.testing.assert_frame_equal(frame, full_parse(market_data, 'VCB'), check_freq=False)
+    
+    # The extended frame was cached in turn
+    cached = PriceStore(market_data)
+    cached.get('VCB')
+    assert (cached.parse_count, cached.cache_reads) == (0, 1)
+
+
+def test_refresh_appends_rows(market_data):
+    store = PriceStore(market_data)
+    store.get('VCB')
+    store.get('BID')
+    append(market_data, 'VCB', NEW_DAYS)
+    
+    assert store.refresh() == {'VCB': pd.Timestamp('2022-03-28')}
+    assert store.parse_count == 2
+    pd.testing.assert_frame_equal(store.get('VCB'), full_parse(market_data, 'VCB'), check_freq=False)
+    assert store.refresh() == {}
+
+
+def test_same_size_rewrite_is_reparsed(market_data):
+    store = PriceStore(market_data)
+    store.get('VCB')
+    line = csv_line(market_data, 'VCB', '2021-02-01')
+    rewrite(os.path.join(market_data, 'VCB.csv'), line, same_size_edit(line))
+    
+    assert store.refresh() == {'VCB': None}
+    expected = full_parse(market_data, 'VCB')
+    assert expected.loc['2021-02-01', 'close'] == float(same_size_edit(line).split(',')[5])
+    pd.testing.assert_frame_equal(store.get('VCB'), expected, check_freq=False)
+    
+    reloaded = PriceStore(market_data)
+    pd.testing.assert_frame_equal(reloaded.get('VCB'), expected, check_freq=False)
+    assert reloaded.cache_reads == 1
+
+
+def test_same_size_rewrite_is_reparsed_on_load(market_data):
+    PriceStore(market_data).get('VCB')
+    line = csv_line(market_data, 'VCB', '2021-02-01')
+    rewrite(os.path.join(market_data, 'VCB.csv'), line, same_size_edit(line))
+    
+    store = PriceStore(market_data)
+    pd.testing.assert_frame_equal(store.get('VCB'), full_parse(market_data, 'VCB'), check_freq=False)
+    assert (store.parse_count, store.append_count) == (1, 0)
+
+
+def test_edited_last_row_with_appended_rows_is_reparsed(market_data, market):
+    store = PriceStore(market_data)
+    store.get('VCB')
+    last = market['VCB']['time'].iat[-1]
+    line = csv_line(market_data, 'VCB', last)
+    rewrite(os.path.join(market_data, 'VCB.csv'), line, same_size_edit(line))
+    append(market_data, 'VCB', NEW_DAYS)
+    
+    assert store.refresh() == {'VCB': None}
+    frame = store.get('VCB')
+    pd.testing.assert_frame_equal(frame, full_parse(market_data, 'VCB'), check_freq=False)
+    assert frame.loc[last, 'close'] == float(same_size_edit(line).split(',')[5])
+
+
+def test_truncated_csv_is_reparsed(market_data, market):
+    store = PriceStore(market_data)
+    store.get('VCB')
+    path = os.path.join(market_data, 'VCB.csv')
+    with open(path) as f:
+        lines = f.readlines()
+    with open(path, 'w') as f:
+        f.writelines(lines[:-5])
+    
+    assert store.refresh() == {'VCB': None}
+    assert len(store.get('VCB')) == len(market['VCB']) - 5
+
+
+def test_rows_out_of_order_are_reparsed(market_data, market):
+    store = PriceStore(market_data)
+    store.get('VCB')
+    append(market_data, 'VCB', [(market['VCB']['time'].iat[-3], 30.0)])
+    
+    assert store.refresh() == {'VCB': None}
+    pd.testing.assert_frame_equal(store.get('VCB'), full_parse(market_data, 'VCB'), check_freq=False)
@@ -0,0 +1,86 @@
+"""Per-stage profiling: nesting, counters, the JSON trace, and staying out of the way while disabled"""
+import json
+import threading
+
+import panic_analyzer
+from panic_analyzer import Profiler, VietnamesePanicAnalyzer
+
+
+def test_disabled_profiler_records_nothing():
+    profiler = Profiler()
+    with profiler.stage('load'):
+        profiler.count('hits')
+    assert profiler.stage('load') is profiler.stage('parse')  # the shared no-op stage
+    assert profiler.stages == {} and profiler.counters == {} and profiler.events == []
+
+
+def test_nested_stages_split_self_time():
+    profiler = Profiler()
+    profiler.enable()
+    with profiler.stage('outer'):
+        for _ in range(3):
+            with profiler.stage('inner'):
+                sum(range(10000))
+    profiler.count('rows', 5)
+    profiler.count('rows')
+    
+    outer_calls, outer_total, outer_self, _ = profiler.stages['outer']
+    inner_calls, inner_total, inner_self, inner_max = profiler.stages['inner']
+    assert (outer_calls, inner_calls) == (1, 3)
+    assert inner_self == inner_total and inner_max <= inner_total
+    assert abs(outer_self - (outer_total - inner_total)) < 1e-9
+    assert profiler.counters == {'rows': 6}
+    
+    summary = profiler.summary()
+    assert list(summary['stages']['inner']) == ['calls', 'total_ms', 'self_ms', 'mean_ms', 'max_ms']
+    assert summary['counters'] == {'rows': 6}
+    assert 'inner' in profiler.format_table()
+
+
+def test_threads_keep_their_own_stage_stack():
+    profiler = Profiler()
+    profiler.enable()
+    barrier = threading.Barrier(4)
+    
+    def work():
+        with profiler.stage('thread'):
+            barrier.wait()
+            with profiler.stage('child'):
+                pass
+    
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert profiler.stages['thread'][0] == 4 and profiler.stages['child'][0] == 4
+    assert len({tid for *_, tid in profiler.events}) == 4
+
+
+def test_trace_file_and_event_cap(tmp_path, monkeypatch):
+    profiler = Profiler()
+    profiler.enable()
+    monkeypatch.setattr(Profiler, 'MAX_EVENTS', 2)
+    for _ in range(3):
+        with profiler.stage('step'):
+            pass
+    
+    destination = str(tmp_path / 'trace.json')
+    profiler.report(destination)
+    with open(destination) as f:
+        trace = json.load(f)
+    assert [event['name'] for event in trace['traceEvents']] == ['step', 'step']
+    assert trace['droppedEvents'] == 1
+    assert trace['summary']['stages']['step']['calls'] == 3
+
+
+def test_analysis_stages_are_profiled(market_data, monkeypatch):
+    profiler = Profiler()
+    profiler.enable()
+    monkeypatch.setattr(panic_analyzer, 'PROFILER', profiler)
+    analyzer = VietnamesePanicAnalyzer(market_data)
+    analyzer.renderer = None
+    labels = analyzer.calendar.labels
+    analyzer.compute_date_range(labels[0], labels[-1])
+    analyzer.get_date_data(labels[100])
+    assert {'load', 'lookup'} <= set(profiler.stages)
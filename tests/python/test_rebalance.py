@@ -0,0 +1,89 @@
+"""Market-cap weights that follow prices, against caps looked up from each ticker's own price history"""
+import math
+
+import numpy as np
+import pytest
+
+from panic_analyzer import REBALANCE_SCHEDULES, VietnamesePanicAnalyzer, estimate_shares, load_market_caps
+
+
+def rebalanced(market_data, rebalance):
+    analyzer = VietnamesePanicAnalyzer(market_data, rebalance=rebalance)
+    analyzer.renderer = None
+    return analyzer
+
+
+def held_caps(analyzer, tickers, i):
+    """{ticker: cap} on row i: shares x the last close before the day its rebalance period started"""
+    dates = analyzer.calendar.dates
+    freq = REBALANCE_SCHEDULES[analyzer.rebalance]
+    start = i
+    if freq is not None:
+        periods = dates.to_period(freq)
+        while start > 0 and periods[start - 1] == periods[i]:
+            start -= 1
+    
+    shares = estimate_shares(analyzer.store, load_market_caps())
+    caps = {}
+    for ticker in tickers:
+        closes = analyzer.load_ticker_data(ticker)['close']
+        before = closes[closes.index < dates[start]]
+        caps[ticker] = shares[ticker] * before.iat[-1] if ticker in shares and len(before) else 0.0
+    return caps
+
+
+def scan_indicator(analyzer, caps, date):
+    """Cap-weighted average change of the tickers with data on a date"""
+    total = weighted = 0.0
+    for ticker, cap in caps.items():
+        change = analyzer.get_price_change(analyzer.load_ticker_data(ticker), date)
+        if change is not None:
+            total += cap
+            weighted += change.change * cap
+    return weighted / total if total > 0 else math.nan
+
+
+@pytest.mark.parametrize('rebalance', ['daily', 'monthly', 'quarterly'])
+def test_core_indicators_match_held_caps(sector_files, market_data, rebalance):
+    analyzer = rebalanced(market_data, rebalance)
+    engine = analyzer.engine
+    labels = analyzer.calendar.labels
+    # Around the SHS suspension (days 50-55), the panics and a quarter end
+    for i in [*range(45, 60), 62, 100, 101, 180, 181, 260, len(labels) - 1]:
+        for name, weights in analyzer._core_weights().items():
+            caps = held_caps(analyzer, weights, i)
+            np.testing.assert_allclose(engine.indicators[name].iat[i], scan_indicator(analyzer, caps, labels[i]),
+                                       rtol=1e-9, err_msg=f"{labels[i]} {name}")
+            
+            total = sum(caps.values())
+            expected = {t: cap / total for t, cap in caps.items()} if total else {t: 0.0 for t in caps}
+            assert analyzer.weights_on(labels[i])[name] == pytest.approx(expected, rel=1e-9)
+
+
+def test_group_indicators_match_held_caps(sector_files, market_data):
+    analyzer = rebalanced(market_data, 'monthly')
+    table = analyzer.compute_sector_indicators()
+    labels = analyzer.calendar.labels
+    for i in (52, 100, 200, 201, 260):
+        for name, weights in analyzer.sector_weights.items():
+            caps = held_caps(analyzer, weights, i)
+            np.testing.assert_allclose(table[name].iat[i], scan_indicator(analyzer, caps, labels[i]),
+                                       rtol=1e-9, err_msg=f"{labels[i]} {name}")
+
+
+def test_weights_are_held_within_a_period(sector_files, market_data):
+    analyzer = rebalanced(market_data, 'monthly')
+    dates = analyzer.calendar.dates
+    in_march = [d.strftime('%Y-%m-%d') for d in dates if (d.year, d.month) == (2021, 3)]
+    assert all(analyzer.weights_on(d) == analyzer.weights_on(in_march[0]) for d in in_march)
+    assert analyzer.weights_on('2021-04-01') != analyzer.weights_on(in_march[0])
+
+
+def test_fixed_weights_without_a_schedule(analyzer):
+    assert analyzer.weights_on(analyzer.calendar.labels[100]) == analyzer._core_weights()
+    assert analyzer.engine.market_caps is None
+
+
+def test_unknown_schedule(market_data):
+    with pytest.raises(ValueError, match='Unknown rebalance schedule'):
+        VietnamesePanicAnalyzer(market_data, rebalance='weekly')
@@ -0,0 +1,112 @@
+"""VietnamesePanicAnalyzer.refresh: extending the warm series equals rebuilding them from scratch"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from panic_analyzer import PriceStore, SimilarDayIndex, VietnamesePanicAnalyzer
+
+ENGINE_ARRAYS = ('prev_close', 'close', 'high', 'low', 'volume', 'valid', 'change', 'intraday_drop')
+
+
+def append_day(market_data, date, change, skip=()):
+    """Append one trading day to every CSV, each ticker moving by `change` percent from its last close"""
+    for name in sorted(os.listdir(market_data)):
+        ticker = name[:-4]
+        if not name.endswith('.csv') or ticker in skip:
+            continue
+        path = os.path.join(market_data, name)
+        with open(path) as f:
+            last_close = float(f.readlines()[-1].split(',')[5])
+        close = last_close * (1 + change / 100)
+        with open(path, 'a') as f:
+            f.write(f"{ticker},{date},{last_close:.2f},{max(last_close, close):.2f},{close * 0.99:.2f},{close:.2f},1500\n")
+
+
+def rebuilt(market_data):
+    """A new analyzer over a new store, so nothing is shared with the refreshed one"""
+    analyzer = VietnamesePanicAnalyzer(market_data)
+    analyzer.store = PriceStore(market_data, use_cache=False)
+    return analyzer
+
+
+def assert_engines_equal(engine, expected):
+    assert engine.calendar.labels == expected.calendar.labels
+    for name in ENGINE_ARRAYS:
+        np.testing.assert_array_equal(getattr(engine, name), getattr(expected, name), err_msg=name)
+    pd.testing.assert_frame_equal(engine.indicators, expected.indicators, check_freq=False)
+
+
+def warm(analyzer):
+    analyzer.engine.risk_features()
+    analyzer.universe_engine
+    analyzer.similarity_index
+
+
+def test_appended_days_extend_the_engines(analyzer, market_data):
+    warm(analyzer)
+    engine = analyzer.engine
+    parses = analyzer.store.parse_count
+    append_day(market_data, '2022-03-28', -3.5, skip=('VPB', 'AAA'))
+    append_day(market_data, '2022-03-29', 1.2, skip=('SHS',))
+    
+    changed = analyzer.refresh()
+    assert changed['VNINDEX'] == pd.Timestamp('2022-03-28')
+    assert changed['VPB'] == pd.Timestamp('2022-03-29')
+    assert analyzer.engine is engine  # extended in place, not rebuilt
+    assert analyzer.store.parse_count == parses  # only the new rows were read
+    
+    expected = rebuilt(market_data)
+    assert_engines_equal(analyzer.engine, expected.engine)
+    assert_engines_equal(analyzer.universe_engine, expected.universe_engine)
+    for ours, theirs in zip(analyzer.engine.risk_features(), expected.engine.risk_features()):
+        for field in ours:
+            np.testing.assert_allclose(ours[field], theirs[field], rtol=1e-9, equal_nan=True, err_msg=field)
+    
+    index, expected_index = analyzer.similarity_index, SimilarDayIndex(expected.engine)
+    np.testing.assert_allclose(index.scaled, expected_index.scaled, rtol=1e-9, equal_nan=True)
+    np.testing.assert_array_equal(index.forward, expected_index.forward)
+    
+    data = analyzer.get_date_data('2022-03-28')
+    assert data.all_data == expected.get_date_data('2022-03-28').all_data
+    assert 'VPB' not in data.all_data
+
+
+def test_appending_to_a_ticker_alone_extends_its_column(analyzer, market_data):
+    warm(analyzer)
+    path = os.path.join(market_data, 'NVL.csv')
+    with open(path) as f:
+        lines = f.readlines()
+    # Drop NVL's last two days, rebuild, then append them back
+    with open(path, 'w') as f:
+        f.writelines(lines[:-2])
+    assert analyzer.refresh() == {'NVL': None}
+    warm(analyzer)
+    with open(path, 'a') as f:
+        f.writelines(lines[-2:])
+    
+    assert analyzer.refresh() == {'NVL': pd.Timestamp(lines[-2].split(',')[1])}
+    assert_engines_equal(analyzer.engine, rebuilt(market_data).engine)
+
+
+def test_rewritten_csv_rebuilds_the_engines(analyzer, market_data, market):
+    warm(analyzer)
+    path = os.path.join(market_data, 'VCB.csv')
+    frame = market['VCB'].copy()
+    frame.loc[5, 'close'] += 1
+    frame.to_csv(path, index=False, float_format='%.2f')
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    
+    assert analyzer.refresh() == {'VCB': None}
+    assert_engines_equal(analyzer.engine, rebuilt(market_data).engine)
+
+
+def test_untracked_ticker_leaves_the_engine_alone(analyzer, market_data):
+    analyzer.engine
+    engine = analyzer.engine
+    append_day(market_data, '2022-03-28', -1.0, skip=[t for t in analyzer.all_tickers])
+    
+    # Unknown to the core engine and not loaded by the store: nothing to refresh
+    assert analyzer.refresh() == {}
+    assert analyzer.engine is engine
@@ -0,0 +1,65 @@
+"""compute_* return results silently; analyze_* print them through the configured renderer"""
+import json
+
+import pytest
+
+from panic_analyzer import RENDERERS
+
+
+def test_compute_does_not_print(analyzer, capsys):
+    labels = analyzer.calendar.labels
+    analyzer.renderer = RENDERERS['text'](analyzer)
+    analyzer.get_date_data(labels[100])
+    analyzer.compute_pre_panic_pattern(labels[100])
+    analyzer.compute_date_range(labels[90], labels[110])
+    analyzer.compute_complete_cycle(labels[90], labels[110])
+    analyzer.compute_backtest()
+    assert capsys.readouterr().out == ''
+
+
+def test_quiet_mode_prints_nothing(analyzer, capsys):
+    labels = analyzer.calendar.labels
+    data = analyzer.analyze_date(labels[100])
+    result = analyzer.analyze_date_range(labels[90], labels[110])
+    assert capsys.readouterr().out == ''
+    assert data.to_dict() == analyzer.get_date_data(labels[100]).to_dict()
+    assert result.to_dict() == analyzer.compute_date_range(labels[90], labels[110]).to_dict()
+
+
+@pytest.mark.parametrize('output_format', list(RENDERERS))
+def test_analyze_prints_the_rendered_result(analyzer, capsys, output_format):
+    renderer = analyzer.renderer = RENDERERS[output_format](analyzer)
+    labels = analyzer.calendar.labels
+    
+    data = analyzer.analyze_date(labels[100])
+    assert capsys.readouterr().out == renderer.render_date(labels[100], data) + "\n"
+    
+    result = analyzer.analyze_date_range(labels[90], labels[110])
+    assert capsys.readouterr().out == renderer.render_range(result) + "\n"
+    
+    report = analyzer.analyze_backtest()
+    assert capsys.readouterr().out == renderer.render_backtest(report) + "\n"
+
+
+def test_json_output_is_the_result_dict(analyzer):
+    renderer = RENDERERS['json'](analyzer)
+    labels = analyzer.calendar.labels
+    data = analyzer.get_date_data(labels[100])
+    assert json.loads(renderer.render_date(labels[100], data)) == json.loads(json.dumps(data.to_dict()))
+    assert json.loads(renderer.render_date('2021-01-09', None)) is None
+    
+    result = analyzer.compute_pre_panic_pattern(labels[100])
+    assert json.loads(renderer.render_pre_panic(result)) == json.loads(json.dumps(result.to_dict()))
+
+
+def test_text_and_markdown_reports(analyzer):
+    labels = analyzer.calendar.labels
+    data = analyzer.get_date_data(labels[100])
+    
+    text = RENDERERS['text'](analyzer).render_date(labels[100], data)
+    assert "WORKBOOK UPDATE DATA" in text
+    assert f"PANIC TYPE: {data.panic_type}" in text
+    
+    markdown = RENDERERS['markdown'](analyzer).render_date(labels[100], data)
+    assert markdown.startswith(f"### {labels[100]}\n")
+    assert RENDERERS['markdown'](analyzer).render_date('2021-01-09', None).endswith("No VNINDEX data for this date.")
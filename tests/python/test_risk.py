@@ -0,0 +1,79 @@
+"""Rolling risk features against a day-by-day recomputation"""
+import math
+import statistics
+
+import numpy as np
+
+from panic_analyzer import RISK_WINDOWS, RiskFeatures, rolling_risk_features
+
+
+def brute_risk(change, close=None, high=None, low=None, prev_close=None):
+    """rolling_risk_features for one series, recomputed from scratch at every day"""
+    n = len(change)
+    volatility, atr, drawdown = ([math.nan] * n for _ in range(3))
+    down_streak = [0] * n
+    window, period = RISK_WINDOWS['volatility'], RISK_WINDOWS['atr']
+    average, observed, level, peak = math.nan, 0, 1.0, math.nan
+    for t in range(n):
+        recent = change[max(t - window + 1, 0):t + 1]
+        if len(recent) == window and not any(math.isnan(c) for c in recent):
+            volatility[t] = statistics.stdev(recent)
+        
+        if not math.isnan(change[t]):
+            if close is None:
+                level *= 1 + change[t] / 100
+                value = level
+            else:
+                true_range = max(high[t], prev_close[t]) - min(low[t], prev_close[t])
+                average = true_range if observed == 0 else average + (true_range - average) / period
+                observed += 1
+                if observed >= period:
+                    atr[t] = average
+                value = close[t]
+            peak = value if math.isnan(peak) else max(peak, value)
+            drawdown[t] = (value / peak - 1) * 100
+        elif close is not None and not math.isnan(close[t]):
+            # No change (first row or listing day) but a price: it still sets the peak
+            peak = close[t] if math.isnan(peak) else max(peak, close[t])
+            drawdown[t] = (close[t] / peak - 1) * 100
+        
+        down_streak[t] = (down_streak[t - 1] if t else 0) + 1 if change[t] < 0 else 0
+    return {'volatility': volatility, 'atr': atr, 'drawdown': drawdown, 'down_streak': down_streak}
+
+
+def assert_features_equal(features, j, expected):
+    for field, values in expected.items():
+        np.testing.assert_allclose(features[field][:, j], values, rtol=1e-9, atol=1e-9, equal_nan=True, err_msg=field)
+
+
+def test_ticker_features_match_a_daily_recomputation(analyzer):
+    engine = analyzer.engine
+    tickers, _ = engine.risk_features()
+    for ticker in ('VNINDEX', 'VCB', 'SHS', 'NVL', 'VPB'):
+        j = engine.columns[ticker]
+        change = np.where(engine.valid[:, j], engine.change[:, j], np.nan)
+        expected = brute_risk(change.tolist(), *(a[:, j].tolist() for a in (engine.close, engine.high, engine.low, engine.prev_close)))
+        assert_features_equal(tickers, j, expected)
+
+
+def test_sector_features_match_a_daily_recomputation(analyzer):
+    engine = analyzer.engine
+    _, sectors = engine.risk_features()
+    for k, name in enumerate(engine.sector_weights):
+        expected = brute_risk(engine.indicators[name].tolist())
+        expected['atr'] = [math.nan] * len(engine.dates)
+        assert_features_equal(sectors, k, expected)
+
+
+def test_date_data_carries_the_features(analyzer):
+    engine = analyzer.engine
+    tickers, sectors = engine.risk_features()
+    i = analyzer.calendar.ordinal('2021-09-13')
+    risk = analyzer.get_date_data('2021-09-13').risk
+    assert risk['VCB'] == RiskFeatures.from_values(*(tickers[f][i, engine.columns['VCB']] for f in tickers))
+    assert risk['rsi'] == RiskFeatures.from_values(*(sectors[f][i, 2] for f in sectors))
+
+
+def test_down_streak_is_ended_by_missing_days():
+    change = np.array([[-1.0], [-2.0], [np.nan], [-1.0], [-0.5], [0.0], [-3.0]])
+    assert rolling_risk_features(change)['down_streak'][:, 0].tolist() == [1, 2, 0, 1, 2, 0, 1]
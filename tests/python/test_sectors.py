@@ -0,0 +1,57 @@
+"""Indicators for every ticker_group.json sector against a per-date weighted average"""
+import math
+
+import numpy as np
+import pytest
+
+from conftest import MARKET_CAPS
+from panic_analyzer import load_market_caps, load_sector_weights
+
+
+def test_market_caps_skip_the_header(sector_files):
+    assert load_market_caps() == {ticker: float(cap) for ticker, cap in MARKET_CAPS.items()}
+
+
+def test_sector_weights_are_cap_shares(sector_files):
+    weights = load_sector_weights()
+    assert list(weights) == ['BANKING', 'SECURITIES', 'REAL_ESTATE', 'SMALL_CAPS']  # UNLISTED has no caps
+    assert list(weights['BANKING']) == ['VCB', 'BID', 'TCB', 'CTG', 'VPB']
+    assert 'ZZZ' not in weights['SECURITIES'] and 'AAA' not in weights['SMALL_CAPS']
+    for sector in weights.values():
+        assert math.isclose(sum(sector.values()), 1.0)
+    assert weights['SMALL_CAPS']['CCC'] == pytest.approx(4100 / (3200 + 4100 + 10400))
+
+
+def scan_sector(analyzer, weights, date):
+    """(value, count) for one sector on one date from get_price_change, as the original loop did"""
+    total = weighted = 0.0
+    count = 0
+    for ticker, weight in weights.items():
+        change = analyzer.get_price_change(analyzer.load_ticker_data(ticker), date)
+        if change is None:
+            continue
+        count += 1
+        total += weight
+        weighted += change.change * weight
+    return (weighted / total if total > 0 else math.nan), count
+
+
+def test_sector_indicators_match_a_scan(sector_files, analyzer):
+    table = analyzer.compute_sector_indicators()
+    weights = analyzer.sector_weights
+    assert sorted(table.columns) == sorted([*weights, *(f"{name}_count" for name in weights)])
+    assert list(table.index.strftime('%Y-%m-%d')) == analyzer.calendar.labels
+    
+    for i, date in enumerate(analyzer.calendar.labels):
+        for name, sector in weights.items():
+            value, count = scan_sector(analyzer, sector, date)
+            assert table[f"{name}_count"].iat[i] == count, (date, name)
+            np.testing.assert_allclose(table[name].iat[i], value, rtol=1e-9, atol=1e-12, err_msg=f"{date} {name}")
+
+
+def test_sector_indicators_in_a_range(sector_files, analyzer):
+    labels = analyzer.calendar.labels
+    table = analyzer.compute_sector_indicators(labels[195], labels[205])
+    assert list(table.index.strftime('%Y-%m-%d')) == labels[195:206]
+    # BBB lists on day 200, so its first change is the day after
+    assert table['SMALL_CAPS_count'].tolist() == [2] * 6 + [3] * 5
@@ -0,0 +1,149 @@
+"""PanicQueryServer.handle: routing, caching across refreshes, errors and concurrent queries"""
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from panic_analyzer import LRUCache, PanicQueryServer, ReadWriteLock
+
+
+@pytest.fixture
+def server(analyzer):
+    return PanicQueryServer(analyzer)
+
+
+def get(server, path, method='GET', **query):
+    status, body = server.handle(path, {name: [value] for name, value in query.items()}, method)
+    return status, json.loads(body)
+
+
+def append_index_day(market_data, date, close):
+    with open(os.path.join(market_data, 'VNINDEX.csv'), 'a') as f:
+        f.write(f"VNINDEX,{date},{close:.2f},{close:.2f},{close:.2f},{close:.2f},100000\n")
+
+
+def test_date_query_is_cached(server, analyzer):
+    status, body = get(server, '/date/2021-05-24')
+    assert status == 200
+    assert body['panic_type'] == analyzer.get_date_data('2021-05-24').panic_type
+    
+    assert server.handle('/date/2021-05-24', {}) == (200, server._encode(body))
+    assert (server.cache.hits, server.cache.misses) == (1, 1)
+
+
+@pytest.mark.parametrize('path, method, status', [
+    ('/refresh', 'GET', 405),
+    ('/date/2021-05-24', 'POST', 405),
+    ('/date/24-05-2021', 'GET', 400),
+    ('/nowhere', 'GET', 404),
+    ('/date/2021-05-22', 'GET', 200)  # a Saturday: no data, but not an error
+])
+def test_routing(server, path, method, status):
+    assert get(server, path, method)[0] == status
+
+
+@pytest.mark.parametrize('k', ['x', '0', '-2'])
+def test_bad_similar_count(server, k):
+    status, body = get(server, '/similar/2021-05-24', k=k)
+    assert status == 400
+    assert body['error'] == f"k must be a positive number, got '{k}'"
+
+
+def test_exceptions_become_500(server, analyzer, monkeypatch):
+    def broken(date):
+        raise RuntimeError('disk on fire')
+    monkeypatch.setattr(analyzer, 'get_date_data', broken)
+    
+    status, body = get(server, '/date/2021-05-24')
+    assert status == 500
+    assert body == {'error': 'RuntimeError: disk on fire'}
+    assert get(server, '/health')[0] == 200
+
+
+def test_refresh_bumps_the_generation_and_drops_cached_answers(server, analyzer, market_data):
+    get(server, '/date/2021-05-24')
+    status, body = get(server, '/refresh', 'POST')
+    assert (status, body['generation'], body['changed']) == (200, 0, {})
+    assert len(server.cache) == 1
+    
+    last_close = analyzer.store.get('VNINDEX')['close'].iat[-1]
+    append_index_day(market_data, '2022-03-28', last_close * 0.95)
+    status, body = get(server, '/refresh', 'POST')
+    assert body['changed'] == {'VNINDEX': '2022-03-28'}
+    assert body['generation'] == 1
+    assert len(server.cache) == 0
+    
+    status, body = get(server, '/date/2022-03-28')
+    assert status == 200
+    assert body['vnindex_change'] == pytest.approx(-5.0, abs=0.01)
+    assert get(server, '/health')[1]['generation'] == 1
+
+
+def test_queries_during_refresh(server, analyzer, market_data):
+    dates = analyzer.calendar.labels[200:260]
+    expected = {date: server.handle(f"/date/{date}", {}) for date in dates}
+    server.cache.clear()
+    errors = []
+    
+    def query():
+        for date in dates * 3:
+            status, body = server.handle(f"/date/{date}", {})
+            if (status, body) != expected[date]:
+                errors.append((date, status))
+    
+    threads = [threading.Thread(target=query) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    close = analyzer.store.get('VNINDEX')['close'].iat[-1]
+    for k, date in enumerate(('2022-03-28', '2022-03-29', '2022-03-30')):
+        append_index_day(market_data, date, close * (1 + k / 100))
+        assert server.refresh()['changed'] == {'VNINDEX': date}
+    for thread in threads:
+        thread.join()
+    
+    assert errors == []
+    assert server.generation == 3
+    assert len(analyzer.calendar) == 323
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert (cache.get('a'), cache.get('b'), cache.get('c')) == (1, None, 3)
+
+
+def test_waiting_writer_holds_off_new_readers():
+    lock = ReadWriteLock()
+    events = []
+    reading = threading.Event()
+    release = threading.Event()
+    
+    def reader(name, hold):
+        with lock.reading():
+            events.append(name)
+            if hold:
+                reading.set()
+                release.wait()
+    
+    def writer():
+        with lock.writing():
+            events.append('writer')
+    
+    first = threading.Thread(target=reader, args=('first', True))
+    first.start()
+    reading.wait()
+    write = threading.Thread(target=writer)
+    write.start()
+    while not lock._writers_waiting:
+        time.sleep(0.001)
+    second = threading.Thread(target=reader, args=('second', False))
+    second.start()
+    release.set()
+    for thread in (first, write, second):
+        thread.join()
+    assert events == ['first', 'writer', 'second']
@@ -0,0 +1,72 @@
+"""Similar-day search against a full scan of the standardized feature rows"""
+import json
+import math
+
+import numpy as np
+import pytest
+
+from panic_analyzer import FORWARD_HORIZONS, SIMILARITY_FEATURES, VOLUME_RATIO_WINDOW
+
+
+def feature_rows(analyzer):
+    """SIMILARITY_FEATURES for every day, computed one day at a time from get_date_data"""
+    volume = analyzer.load_ticker_data('VNINDEX')['volume']
+    rows = []
+    for i, date in enumerate(analyzer.calendar.labels):
+        data = analyzer.get_date_data(date)
+        if data is None:
+            rows.append([math.nan] * len(SIMILARITY_FEATURES))
+            continue
+        # The average needs VOLUME_RATIO_WINDOW earlier days with data, and the first day has none
+        volume_ratio = math.nan
+        if i > VOLUME_RATIO_WINDOW:
+            volume_ratio = data.vnindex_data.volume / volume.iloc[i - VOLUME_RATIO_WINDOW:i].mean()
+        rows.append([data.vnindex_change, data.bsi, data.ssi, data.rsi, data.vnindex_data.intraday_drop, volume_ratio])
+    return np.array(rows, dtype=float)
+
+
+def test_features_match_get_date_data(analyzer):
+    index = analyzer.similarity_index
+    np.testing.assert_allclose(index.features, feature_rows(analyzer), rtol=1e-9, equal_nan=True)
+
+
+def test_query_matches_a_full_scan(analyzer):
+    features = feature_rows(analyzer)
+    complete = ~np.isnan(features).any(axis=1)
+    scaled = (features - features[complete].mean(axis=0)) / features[complete].std(axis=0)
+    close = analyzer.load_ticker_data('VNINDEX')['close']
+    
+    for date in ('2021-05-24', '2021-09-13', '2022-01-03'):
+        i = analyzer.calendar.ordinal(date)
+        distances = {row: float(np.sqrt(((scaled[row] - scaled[i]) ** 2).sum()))
+                     for row in range(i - FORWARD_HORIZONS[-1] + 1) if complete[row]}
+        nearest = sorted(distances, key=distances.get)[:5]
+        
+        result = analyzer.compute_similar_days(date, k=5)
+        assert [day.date for day in result.analogues] == [analyzer.calendar.labels[row] for row in nearest]
+        for day, row in zip(result.analogues, nearest):
+            assert math.isclose(day.distance, distances[row], rel_tol=1e-9)
+            for horizon in FORWARD_HORIZONS:
+                assert math.isclose(day.forward_returns[f"{horizon}d"], (close.iat[row + horizon] / close.iat[row] - 1) * 100)
+
+
+def test_forward_returns_past_the_data_are_unknown(analyzer):
+    last = analyzer.calendar.labels[-1]
+    result = analyzer.compute_similar_days(last, k=3)
+    assert result.forward_returns == {f"{horizon}d": None for horizon in FORWARD_HORIZONS}
+    assert len(result.analogues) == 3
+
+
+def test_days_without_features(analyzer):
+    assert analyzer.compute_similar_days(analyzer.calendar.labels[0]) is None
+    assert analyzer.compute_similar_days('2021-01-09') is None
+
+
+@pytest.mark.parametrize('top', ['0', '-2', 'x'])
+def test_cli_rejects_a_bad_count(cli, top):
+    assert cli('--similar', '2021-09-13', '--top', top) == (1, "❌ Error: --top requires a positive number\n")
+
+
+def test_cli_top(cli):
+    status, out = cli('--similar', '2021-09-13', '--top', '3', '--format', 'json')
+    assert status == 0 and len(json.loads(out)['analogues']) == 3